@@ -0,0 +1,84 @@
+"""lookup by sha256: state_hash, code_hash, access_token_hash
+
+Revision ID: 5b8d2e4c1f60
+Revises: c3e1f0b7a9d2
+Create Date: 2026-10-18 14:03:27.118406
+
+Lookups use fixed-width SHA-256 digests instead of raw (multi-KB) strings.
+Digests are backfilled in batches, indexes are built CONCURRENTLY,
+indexes on raw strings are dropped.
+Deploy the new app version right after the migration: rows inserted
+by the previous version in between have no digest yet. Fill them with
+the same UPDATE as in backfill(): it only touches rows without digest.
+Postgres 11+ is required: sha256() is used.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8d2e4c1f60'
+down_revision = 'c3e1f0b7a9d2'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+# table, raw column, digest column, unique, raw column index
+LOOKUP_COLUMNS = [
+    ('states', 'state', 'state_hash', True, 'ix_states_state'),
+    ('grants', 'code', 'code_hash', False, 'ix_grants_code'),
+    ('tokens', 'access_token', 'access_token_hash', True, 'ix_tokens_access_token'),
+]
+
+
+def backfill(table, column, hash_column):
+    update = (
+        f"UPDATE {table} SET {hash_column} = sha256(convert_to({column}, 'UTF8')) "
+        f"WHERE id IN (SELECT id FROM {table} "
+        f"WHERE {hash_column} IS NULL AND {column} IS NOT NULL LIMIT {BATCH_SIZE})"
+    )
+    if context.is_offline_mode():
+        # static SQL: repeat the statement until no rows are updated
+        op.execute(update)
+        return
+    connection = op.get_bind()
+    while connection.execute(sa.text(update)).rowcount:
+        pass
+
+
+def upgrade() -> None:
+    for table, _, hash_column, _, _ in LOOKUP_COLUMNS:
+        op.add_column(table, sa.Column(hash_column, sa.LargeBinary(32), nullable=True))
+
+    # short transactions: each batch is committed at once
+    with op.get_context().autocommit_block():
+        for table, column, hash_column, unique, raw_index in LOOKUP_COLUMNS:
+            backfill(table, column, hash_column)
+            op.create_index(
+                f'ix_{table}_{hash_column}',
+                table,
+                [hash_column],
+                unique=unique,
+                postgresql_concurrently=True,
+            )
+            op.drop_index(raw_index, table_name=table, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, column, hash_column, unique, raw_index in reversed(LOOKUP_COLUMNS):
+            op.create_index(
+                raw_index,
+                table,
+                [column],
+                unique=unique,
+                postgresql_concurrently=True,
+            )
+            op.drop_index(
+                f'ix_{table}_{hash_column}',
+                table_name=table,
+                postgresql_concurrently=True,
+            )
+    for table, _, hash_column, _, _ in reversed(LOOKUP_COLUMNS):
+        op.drop_column(table, hash_column)
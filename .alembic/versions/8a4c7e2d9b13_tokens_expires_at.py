@@ -0,0 +1,72 @@
+"""tokens.expires_at, active tokens and grants indexes
+
+Revision ID: 8a4c7e2d9b13
+Revises: 5b8d2e4c1f60
+Create Date: 2026-10-18 17:45:09.402733
+
+Token expiry is stored as an absolute timestamp: active unexpired tokens
+are selected by index (auth_id, is_active, expires_at), active grants -
+by (auth_id, is_active). Both indexes start with auth_id,
+so the plain auth_id indexes are dropped.
+expires_at is backfilled in batches, indexes are built CONCURRENTLY.
+Rows inserted by the previous app version in between have no expires_at:
+run backfill() UPDATE again after deploy, it only touches such rows.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4c7e2d9b13'
+down_revision = '5b8d2e4c1f60'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+# name, table, columns, index it replaces
+INDEXES = [
+    (
+        'ix_tokens_auth_id_is_active_expires_at',
+        'tokens',
+        ['auth_id', 'is_active', 'expires_at'],
+        'ix_tokens_auth_id',
+    ),
+    ('ix_grants_auth_id_is_active', 'grants', ['auth_id', 'is_active'], 'ix_grants_auth_id'),
+]
+
+
+def backfill():
+    update = (
+        "UPDATE tokens SET expires_at = created + expires_in "
+        "WHERE id IN (SELECT id FROM tokens WHERE expires_at IS NULL "
+        f"AND created IS NOT NULL AND expires_in IS NOT NULL LIMIT {BATCH_SIZE})"
+    )
+    if context.is_offline_mode():
+        # static SQL: repeat the statement until no rows are updated
+        op.execute(update)
+        return
+    connection = op.get_bind()
+    while connection.execute(sa.text(update)).rowcount:
+        pass
+
+
+def upgrade() -> None:
+    op.add_column('tokens', sa.Column('expires_at', sa.DateTime(), nullable=True))
+
+    # short transactions: each batch is committed at once
+    with op.get_context().autocommit_block():
+        backfill()
+        for name, table, columns, replaced_index in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+            op.drop_index(replaced_index, table_name=table, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, replaced_index in reversed(INDEXES):
+            op.create_index(
+                replaced_index, table, ['auth_id'], postgresql_concurrently=True
+            )
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    op.drop_column('tokens', 'expires_at')
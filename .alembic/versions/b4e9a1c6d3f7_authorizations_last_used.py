@@ -0,0 +1,27 @@
+"""authorizations.last_used
+
+Revision ID: b4e9a1c6d3f7
+Revises: d71f3a5c2e84
+Create Date: 2026-10-18 21:05:43.118527
+
+Last time authorization's access token was looked up: tokens of
+authorizations in use are refreshed in advance, see service_layer/refresher.py.
+Nullable, no backfill: created is taken instead until the first lookup.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e9a1c6d3f7'
+down_revision = 'd71f3a5c2e84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('authorizations', sa.Column('last_used', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('authorizations', 'last_used')
@@ -0,0 +1,45 @@
+"""lookup indexes: states.state, grants.code, tokens.access_token, auth_id foreign keys
+
+Revision ID: c3e1f0b7a9d2
+Revises: 488fbd84fb1f
+Create Date: 2026-10-18 10:12:41.305112
+
+Indexes are built CONCURRENTLY, so the migration could run on a live database:
+tables are not locked for writes while indexes are being built.
+If a build fails, postgres leaves an INVALID index:
+drop it and run the migration again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e1f0b7a9d2'
+down_revision = '488fbd84fb1f'
+branch_labels = None
+depends_on = None
+
+# name, table, columns, unique
+INDEXES = [
+    ('ix_states_state', 'states', ['state'], True),
+    ('ix_states_auth_id', 'states', ['auth_id'], False),
+    ('ix_grants_code', 'grants', ['code'], False),
+    ('ix_grants_auth_id', 'grants', ['auth_id'], False),
+    ('ix_tokens_access_token', 'tokens', ['access_token'], True),
+    ('ix_tokens_auth_id', 'tokens', ['auth_id'], False),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(
+                name, table, columns, unique=unique, postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
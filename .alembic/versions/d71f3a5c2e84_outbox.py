@@ -0,0 +1,42 @@
+"""outbox table
+
+Revision ID: d71f3a5c2e84
+Revises: 8a4c7e2d9b13
+Create Date: 2026-10-18 19:12:37.518204
+
+Messages written in the same transaction as the aggregate,
+processed by outbox workers, see service_layer/outbox.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd71f3a5c2e84'
+down_revision = '8a4c7e2d9b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('message_type', sa.String(), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('created', sa.DateTime(), nullable=True),
+        sa.Column('available_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_outbox_status_available_at', 'outbox', ['status', 'available_at']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_outbox_status_available_at', table_name='outbox')
+    op.drop_table('outbox')
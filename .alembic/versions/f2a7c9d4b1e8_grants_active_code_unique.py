@@ -0,0 +1,43 @@
+"""unique code_hash of active grants
+
+Revision ID: f2a7c9d4b1e8
+Revises: b4e9a1c6d3f7
+Create Date: 2026-10-18 23:41:08.502913
+
+A code leads to one authorization: codes of active grants are unique.
+Inactive ones are not: the provider could return the same refresh token
+again, it's saved as a new grant and the old one is deactivated.
+code_hash is backfilled by 5b8d2e4c1f60, the index is built CONCURRENTLY.
+If active duplicates exist, postgres leaves an INVALID index:
+drop it, deactivate the duplicates and run the migration again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c9d4b1e8'
+down_revision = 'b4e9a1c6d3f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ux_grants_code_hash_active',
+            'grants',
+            ['code_hash'],
+            unique=True,
+            postgresql_where=sa.text('is_active'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ux_grants_code_hash_active',
+            table_name='grants',
+            postgresql_concurrently=True,
+        )
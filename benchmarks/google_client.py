@@ -0,0 +1,77 @@
+"""Google client: per-request construction vs cached GoogleClient
+
+Run from the repo root (config.yaml is read from CWD):
+
+    python benchmarks/google_client.py [iterations]
+
+Old path: Flow.from_client_secrets_file on every call.
+New path: GoogleClient with a prebuilt flow.
+No network calls are made: only authorization URL building is timed.
+"""
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import google_auth_oauthlib.flow
+
+from oauth_client_lib.adapters.secrets_store import OAuthSecretsStore
+from oauth_client_lib.service_layer.oauth.google_client import GoogleClient
+
+SCOPES = ["https://www.googleapis.com/auth/userinfo.email", "openid"]
+REDIRECT_URI = "https://example.com/api/oauth/callback"
+
+
+def per_request(secrets_file):
+    flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
+        secrets_file, scopes=" ".join(SCOPES)
+    )
+    flow.redirect_uri = REDIRECT_URI
+    flow.authorization_url(
+        access_type="offline", include_granted_scopes="true", state="state"
+    )
+
+
+def cached(client: GoogleClient):
+    client.get_authorization_url(SCOPES, REDIRECT_URI, state="state")
+
+
+def measure(fn, iterations):
+    fn()  # warm up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main(iterations=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        secrets_file = str(Path(tmp) / "client_secret_google.json")
+        with open(secrets_file, "w") as f:
+            json.dump(
+                {
+                    "web": {
+                        "client_id": "bench-client-id",
+                        "client_secret": "bench-client-secret",
+                        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                        "token_uri": "https://oauth2.googleapis.com/token",
+                    }
+                },
+                f,
+            )
+        client = GoogleClient(
+            secrets=OAuthSecretsStore(
+                path_template=str(Path(tmp) / "client_secret_{provider}.json")
+            )
+        )
+        old = measure(lambda: per_request(secrets_file), iterations)
+        new = measure(lambda: cached(client), iterations)
+
+    print(f"per-request flow:    {old:8.3f} ms/call")
+    print(f"cached GoogleClient: {new:8.3f} ms/call")
+    print(f"speedup:             {old / new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,76 @@
+"""Import time of the package and the app module
+
+Run from anywhere (nothing is read on import):
+
+    python benchmarks/importtime.py [budget_scale]
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+cumulative time is compared to its budget, and modules that must be loaded
+lazily (Google SDK, YAML settings) must not show up at all.
+Exits with 1 if any check fails, so CI can run it as is;
+budget_scale multiplies the budgets for slow runners.
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+# module -> cumulative import time budget, ms
+BUDGETS = {
+    "oauth_client_lib": 50,
+    "oauth_client_lib.entrypoints.fastapi_app": 3000,
+}
+FORBIDDEN = ("google_auth_oauthlib", "googleapiclient", "yaml")
+
+LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_times(module: str):
+    """Cumulative import time (µs) of every module imported along with module"""
+    with tempfile.TemporaryDirectory() as cwd:
+        # no config.yaml in CWD: import must not need it
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=cwd,
+            # the same packages as here, wherever they come from
+            env=dict(
+                os.environ, PYTHONPATH=os.pathsep.join(map(os.path.abspath, sys.path))
+            ),
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            times[match.group(3)] = int(match.group(1))
+    return times
+
+
+def check(module: str, budget: float):
+    """Failure messages, empty if the module is within budget"""
+    times = import_times(module)
+    took = times[module] / 1000
+    print(f"{module:45} {took:8.1f} ms (budget {budget:.0f} ms)")
+    failures = []
+    if took > budget:
+        failures.append(f"{module}: {took:.1f} ms is over budget {budget:.0f} ms")
+    loaded = sorted(name for name in times if name.split(".")[0] in FORBIDDEN)
+    if loaded:
+        failures.append(f"{module}: imports {', '.join(loaded)}")
+    return failures
+
+
+def main(budget_scale=1.0):
+    failures = []
+    for module, budget in BUDGETS.items():
+        failures.extend(check(module, budget * budget_scale))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(float, sys.argv[1:])))
@@ -0,0 +1,97 @@
+"""Repository lookups as the row count grows
+
+Run from the repo root (config.yaml is read from CWD):
+
+    python benchmarks/repository_lookup.py [rows ...] [--no-indexes]
+
+Fills a SQLite database with N authorizations (each with a state, a grant
+and a token) and times SQLAlchemyRepository lookups by state, grant code and
+access token. With lookup indexes the time per lookup stays flat as N grows;
+--no-indexes drops them to show the sequential scan it replaces.
+"""
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from oauth_client_lib.adapters import orm, repository
+from oauth_client_lib.adapters.hashing import lookup_key
+
+LOOKUPS = 200
+BATCH = 50_000
+
+
+def fill(engine, rows):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(1, rows + 1, BATCH):
+            ids = range(start, min(start + BATCH, rows + 1))
+            conn.execute(
+                insert(orm.authorizations),
+                [dict(id=i, provider="bench", created=now, is_active=True) for i in ids],
+            )
+            for table, values in (
+                (orm.states, lambda i: dict(state_hash=lookup_key(f"state_{i}"))),
+                (orm.grants, lambda i: dict(code_hash=lookup_key(f"code_{i}"))),
+                (orm.tokens, lambda i: dict(access_token_hash=lookup_key(f"token_{i}"))),
+            ):
+                conn.execute(
+                    insert(table),
+                    [
+                        dict(auth_id=i, created=now, is_active=True, **values(i))
+                        for i in ids
+                    ],
+                )
+
+
+def measure(session_factory, rows):
+    ids = [random.randint(1, rows) for _ in range(LOOKUPS)]
+    timings = {}
+    for param, prefix in (
+        ("state_code", "state"),
+        ("grant_code", "code"),
+        ("token", "token"),
+    ):
+        session = session_factory()
+        repo = repository.SQLAlchemyRepository(session)
+        started = time.perf_counter()
+        for i in ids:
+            assert repo.get(**{param: f"{prefix}_{i}"})
+        timings[param] = (time.perf_counter() - started) / LOOKUPS * 1000
+        session.close()
+    return timings
+
+
+def main(args):
+    with_indexes = "--no-indexes" not in args
+    sizes = [int(arg) for arg in args if not arg.startswith("--")] or [
+        10_000,
+        100_000,
+        1_000_000,
+    ]
+    print(f"indexes: {'on' if with_indexes else 'off'}, ms per lookup")
+    print(f"{'rows':>10} {'state':>8} {'grant':>8} {'token':>8}")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+            orm.mapper_registry.metadata.create_all(engine)
+            if not with_indexes:
+                for table in orm.mapper_registry.metadata.tables.values():
+                    for index in list(table.indexes):
+                        index.drop(engine)
+            fill(engine, rows)
+            timings = measure(sessionmaker(bind=engine), rows)
+            engine.dispose()
+        print(
+            f"{rows:>10} {timings['state_code']:>8.3f} "
+            f"{timings['grant_code']:>8.3f} {timings['token']:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -28,14 +28,18 @@ setup(
         "requests==2.28.1",
         "alembic",
         "psycopg2==2.9.3",
+        "asyncpg",
+        "aiosqlite",
         "python-dotenv==0.21.0",
         "aiohttp==3.8.3",
         "aiofiles==23.1.0",
         "sqlalchemy_json",
-        "python-jose",
-        "google-api-python-client==2.82.0",
+        "python-jose[cryptography]",
         "google_auth_oauthlib==1.0.0",
     ],
+    extras_require={
+        "redis": ["redis>=4.2"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
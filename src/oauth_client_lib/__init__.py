@@ -1,3 +1,29 @@
-# from oauth_client_lib.service_layer.oauth_provider import OAuthProvider
-from .entrypoints.routers.oauth import oauth_router
-from .service_layer.oauth import OAuthProvider
+"""OAuth2 client library
+
+Nothing is loaded on import: settings (config.yaml, .env), database engine
+and provider modules are loaded on first use, or explicitly by configure()."""
+
+__all__ = ["configure", "oauth_router", "OAuthProvider"]
+
+
+def configure(path="config.yaml", values: dict = None):
+    """Load settings (file, or values as is) and map domain model to tables"""
+    # pylint: disable=import-outside-toplevel
+    from .adapters import orm
+    from .entrypoints import config
+
+    config.configure(path, values)
+    orm.start_mappers()
+
+
+def __getattr__(name):
+    # pylint: disable=import-outside-toplevel
+    if name == "oauth_router":
+        from .entrypoints.routers.oauth import oauth_router
+
+        return oauth_router
+    if name == "OAuthProvider":
+        from .service_layer.oauth import OAuthProvider
+
+        return OAuthProvider
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
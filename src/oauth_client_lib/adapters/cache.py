@@ -0,0 +1,178 @@
+"""Общий кэш
+
+Кэш, разделяемый воркерами и узлами: in-memory (один процесс, тесты)
+или Redis (любой клиент с протоколом redis.asyncio).
+Значения - строки, сериализация - забота вызывающего кода.
+
+Используется:
+- CachedRepository - снимки агрегата Authorization по токену доступа
+  и отрицательные ответы (ничего не найдено) по токену, коду и state;
+- TokenCache - userinfo по токену доступа;
+- StateStore - state-коды ещё не завершённых авторизаций.
+
+Адрес кэша задаётся переменной окружения OAUTH_CACHE_URL:
+- не задан - общего кэша нет;
+- memory:// - в памяти процесса;
+- redis://host:port/db - Redis, нужен пакет redis (extras "redis").
+
+Гонка cache-aside: читатель промахнулся и прочитал из БД старые данные,
+писатель закоммитил изменение и удалил ключ, читатель записал старое.
+Поэтому писатель не удаляет ключ, а ставит на его место надгробие
+(TOMBSTONE, см. bury) на время дольше любого чтения из БД,
+а читатель записывает прочитанное только через add (SET NX):
+поверх надгробия старые данные не лягут.
+Пока надгробие не истекло, ключ не кэшируется - читают из БД."""
+
+import abc
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from .hashing import lookup_key
+from ..entrypoints import config
+
+
+TOMBSTONE = "!"
+
+
+class AbstractCache(abc.ABC):
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: str, ttl: float):
+        """Set value for ttl seconds"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        """Set value only if the key is absent, return whether it was set"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def pop(self, key: str) -> Optional[str]:
+        """Get and delete value at once: only one of concurrent callers gets it"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+
+class InMemoryCache(AbstractCache):
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._values = {}  # type: Dict[str, Tuple[str, float]]
+
+    async def get(self, key: str) -> Optional[str]:
+        value, expires_at = self._values.get(key, (None, 0))
+        if value is not None and expires_at <= self._clock():
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._values[key] = (value, self._clock() + ttl)
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def pop(self, key: str) -> Optional[str]:
+        value = await self.get(key)
+        self._values.pop(key, None)
+        return value
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._values.pop(key, None)
+
+
+class RedisCache(AbstractCache):
+    """Redis (or any server speaking its protocol)
+
+    client - redis.asyncio.Redis or compatible, e.g. fakeredis in tests"""
+
+    def __init__(self, client, prefix: str = "oauth:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisCache":
+        import redis.asyncio
+
+        return cls(redis.asyncio.from_url(url, decode_responses=True), **kwargs)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode()
+        return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.client.set(self.prefix + key, value, px=_to_ms(ttl))
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        return bool(
+            await self.client.set(self.prefix + key, value, px=_to_ms(ttl), nx=True)
+        )
+
+    async def pop(self, key: str) -> Optional[str]:
+        # GETDEL: Redis 6.2+
+        value = await self.client.getdel(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode()
+        return value
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*[self.prefix + key for key in keys])
+
+    async def close(self):
+        await self.client.close()
+
+
+def make_key(namespace: str, value: str) -> str:
+    """Cache key: secrets (tokens, codes) are never stored as is"""
+    return f"{namespace}:{lookup_key(value).hex()}"
+
+
+async def bury(cache: AbstractCache, keys, ttl: float):
+    """Replace values with TOMBSTONE: readers that started before the change
+    can't put what they have read back, see module docstring"""
+    for key in keys:
+        await cache.set(key, TOMBSTONE, ttl)
+
+
+def _to_ms(ttl: float) -> int:
+    return max(1, int(ttl * 1000))
+
+
+def from_url(url: Optional[str]) -> Optional[AbstractCache]:
+    """Cache by its URL, see module docstring"""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return InMemoryCache()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache.from_url(url)
+    raise ValueError(f"Unknown cache URL scheme: {url}")
+
+
+_shared_cache = {}
+
+
+def get_shared_cache() -> Optional[AbstractCache]:
+    """Cache set by OAUTH_CACHE_URL, created on first use; None if it's not set"""
+    if "cache" not in _shared_cache:
+        _shared_cache["cache"] = from_url(config.get_cache_url())
+    return _shared_cache["cache"]
+
+
+def __getattr__(name):
+    # module attribute kept for compatibility
+    if name == "shared_cache":
+        return get_shared_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
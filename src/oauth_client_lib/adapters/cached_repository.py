@@ -0,0 +1,186 @@
+"""Кэширующий репозиторий
+
+Обёртка над асинхронным репозиторием, хранит в общем кэше (см. cache.py):
+- снимок агрегата Authorization, найденного по токену доступа
+  (путь /userinfo: чтение без изменений);
+- отрицательные ответы: по токену, коду и state ничего не найдено.
+
+Поиск по коду и state сам агрегат не кэширует: коды одноразовые,
+за поиском всегда следует изменение агрегата,
+и читать его надо из БД (REPEATABLE READ), а не из снимка.
+Так же читается агрегат, который собираются изменить (get(for_update=True)
+в обработчиках): кэш, включая отрицательные ответы, не используется.
+
+После commit ключи всех агрегатов, которых коснулась единица работы,
+заменяются надгробиями (см. cache.py), а прочитанное из БД кладётся в кэш
+только через add: деактивация и смена токена видны всем воркерам сразу,
+и снимок, прочитанный до commit, не вернётся в кэш."""
+
+import json
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict
+
+from sqlalchemy import DateTime, Interval, LargeBinary, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from . import repository
+from .cache import TOMBSTONE, AbstractCache, bury, make_key
+from ..domain import model
+
+NOT_FOUND = "-"
+
+
+def dumps(auth: model.Authorization) -> str:
+    """Authorization aggregate snapshot: mapped columns of it and its parts"""
+    snapshot = _dump_columns(auth)
+    snapshot["state"] = _dump_columns(auth.state) if auth.state else None
+    snapshot["grants"] = [_dump_columns(grant) for grant in auth.grants]
+    snapshot["tokens"] = [_dump_columns(token) for token in auth.tokens]
+    return json.dumps(snapshot)
+
+
+def loads(raw: str) -> model.Authorization:
+    """Detached Authorization aggregate from snapshot
+
+    Should be attached to session before use, see AbstractAsyncRepository._attach"""
+    snapshot = json.loads(raw)
+    auth = _load_columns(model.Authorization, snapshot)
+    state = snapshot["state"]
+    auth.state = _load_columns(model.State, state) if state else None
+    auth.grants = [_load_columns(model.Grant, grant) for grant in snapshot["grants"]]
+    auth.tokens = [_load_columns(model.Token, token) for token in snapshot["tokens"]]
+    for obj in [auth, auth.state, *auth.grants, *auth.tokens]:
+        if obj is not None:
+            # as if it was just loaded from db: no changes to flush
+            make_transient_to_detached(obj)
+    auth.events = []
+    return auth
+
+
+def _dump_columns(obj) -> Dict[str, object]:
+    values = {}
+    for attr in inspect(type(obj)).column_attrs:
+        value = getattr(obj, attr.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, timedelta):
+            value = value.total_seconds()
+        elif isinstance(value, bytes):
+            value = value.hex()
+        values[attr.key] = value
+    return values
+
+
+def _load_columns(cls, values: Dict[str, object]):
+    obj = inspect(cls).class_manager.new_instance()
+    for attr in inspect(cls).column_attrs:
+        value = values.get(attr.key)
+        column_type = attr.columns[0].type
+        if value is not None:
+            if isinstance(column_type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column_type, Interval):
+                value = timedelta(seconds=value)
+            elif isinstance(column_type, LargeBinary):
+                value = bytes.fromhex(value)
+        setattr(obj, attr.key, value)
+    return obj
+
+
+class CachedRepository(repository.RepositoryWrapper):
+    def __init__(
+        self,
+        repository: repository.AbstractAsyncRepository,
+        cache: AbstractCache,
+        ttl: float = 300,
+        negative_ttl: float = 30,
+        tombstone_ttl: float = 10,
+    ):
+        """ttl - how long aggregate snapshot is kept (never longer than the token),
+        negative_ttl - how long "not found" is kept,
+        tombstone_ttl - how long changed aggregate isn't cached,
+        longer than any lookup in the database"""
+        super().__init__(repository)
+        self.cache = cache
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.tombstone_ttl = tombstone_ttl
+
+    async def _attach(self, auth: model.Authorization) -> model.Authorization:
+        return await self.repository._attach(auth)
+
+    async def _get_not_validated(
+        self, token=None, grant_code=None, state_code=None, for_update=False
+    ) -> model.Authorization:
+        if for_update:
+            # about to be changed: the database, not a snapshot
+            return await self.repository._get_not_validated(
+                token, grant_code, state_code, for_update=True
+            )
+        return await super()._get_not_validated(token, grant_code, state_code)
+
+    async def _get_by_state(self, state) -> model.Authorization:
+        return await self._get_or_remember_missing(
+            make_key("auth:state", state),
+            lambda: self.repository._get_by_state(state),
+        )
+
+    async def _get_by_grant(self, code) -> model.Authorization:
+        return await self._get_or_remember_missing(
+            make_key("auth:grant", code),
+            lambda: self.repository._get_by_grant(code),
+        )
+
+    async def _get_by_grants(self, codes: list) -> Dict[str, model.Authorization]:
+        return await self.repository._get_by_grants(codes)
+
+    async def _get_by_token(self, token) -> model.Authorization:
+        key = make_key("auth:token", token)
+        cached = await self.cache.get(key)
+        if cached == NOT_FOUND:
+            return None
+        if cached and cached != TOMBSTONE:
+            return await self._attach(loads(cached))
+
+        auth = await self.repository._get_by_token(token)
+        if cached == TOMBSTONE:
+            # just changed: what we have read may be older than the change
+            return auth
+        if auth is None:
+            await self.cache.add(key, NOT_FOUND, self.negative_ttl)
+            return None
+        ttl = self._get_snapshot_ttl(auth, token)
+        if ttl:
+            await self.cache.add(key, dumps(auth), ttl)
+        return auth
+
+    async def _get_or_remember_missing(
+        self, key: str, lookup: Callable[[], Awaitable[model.Authorization]]
+    ) -> model.Authorization:
+        cached = await self.cache.get(key)
+        if cached == NOT_FOUND:
+            return None
+        auth = await lookup()
+        if auth is None and cached != TOMBSTONE:
+            await self.cache.add(key, NOT_FOUND, self.negative_ttl)
+        return auth
+
+    def _get_snapshot_ttl(self, auth: model.Authorization, access_token: str) -> float:
+        token = auth.get_token(access_token)
+        if token is None:
+            return 0
+        expires_in = (token.created + token.expires_in - datetime.utcnow()).total_seconds()
+        return max(0, min(self.ttl, expires_in))
+
+    async def flush(self):
+        await self.repository.flush()
+
+    async def committed(self):
+        keys = []
+        for auth in self.seen:
+            if auth.state:
+                keys.append(make_key("auth:state", auth.state.state))
+            keys.extend(make_key("auth:grant", grant.code) for grant in auth.grants)
+            keys.extend(make_key("auth:token", token.access_token) for token in auth.tokens)
+        await bury(self.cache, keys, self.tombstone_ttl)
+        await self.repository.committed()
@@ -0,0 +1,184 @@
+"""Движок БД: пул соединений и его метрики
+
+Параметры пула (pool_size, max_overflow, pool_timeout, pool_recycle,
+pool_pre_ping), уровень изоляции и statement_timeout берутся
+из config.yaml (database/engine) и переменных окружения OAUTH_DB_*,
+см. config.get_engine_params.
+
+statement_timeout (мс) передаётся Postgres при подключении:
+для psycopg2/psycopg - в options, для asyncpg - в server_settings.
+
+Пул (QueuePool) считает метрики, PoolMetrics.stats():
+- checkouts, checkout_time, max_checkout_time - выдача соединения
+  (ожидание свободного, подключение, pre-ping), секунды;
+- waits, wait_time, timeouts - выдачи, когда все соединения заняты
+  и новых открыть нельзя: ждали освобождения или не дождались;
+- in_use, max_in_use - соединения, выданные сейчас и в пике;
+- connects, invalidated - открытые и выброшенные соединения."""
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import create_engine as sa_create_engine
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import create_async_engine as sa_create_async_engine
+from sqlalchemy.pool import Pool, QueuePool
+
+POOL_PARAMS = (
+    "pool_size",
+    "max_overflow",
+    "pool_timeout",
+    "pool_recycle",
+    "pool_pre_ping",
+)
+DEFAULT_MAX_OVERFLOW = 10  # QueuePool's default
+
+
+class PoolMetrics:
+    def __init__(
+        self,
+        max_overflow: int = DEFAULT_MAX_OVERFLOW,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        """max_overflow - connections opened above pool size, -1 for no limit"""
+        self.max_overflow = max_overflow
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.counters = dict(
+            checkouts=0,
+            checkout_time=0.0,
+            max_checkout_time=0.0,
+            waits=0,
+            wait_time=0.0,
+            timeouts=0,
+            in_use=0,
+            max_in_use=0,
+            connects=0,
+            invalidated=0,
+        )
+
+    def is_exhausted(self, pool: QueuePool) -> bool:
+        """Checkout has to wait: nothing idle, and no more connections allowed"""
+        return (
+            self.max_overflow > -1
+            and pool.checkedin() == 0
+            and pool.overflow() >= self.max_overflow
+        )
+
+    def checked_out(self, took: float, waited: bool, timed_out: bool = False):
+        with self._lock:
+            if not timed_out:
+                self.counters["checkouts"] += 1
+                self.counters["checkout_time"] += took
+                self.counters["max_checkout_time"] = max(
+                    self.counters["max_checkout_time"], took
+                )
+            if waited:
+                self.counters["waits"] += 1
+                self.counters["wait_time"] += took
+            if timed_out:
+                self.counters["timeouts"] += 1
+
+    def count(self, name: str, delta: int = 1):
+        with self._lock:
+            self.counters[name] += delta
+            if name == "in_use":
+                self.counters["max_in_use"] = max(
+                    self.counters["max_in_use"], self.counters["in_use"]
+                )
+
+    def listen(self, pool: Pool):
+        """Count connections through pool events (kept by pool.recreate())"""
+        event.listen(pool, "connect", lambda *args: self.count("connects"))
+        event.listen(pool, "checkout", lambda *args: self.count("in_use"))
+        event.listen(pool, "checkin", lambda *args: self.count("in_use", -1))
+        event.listen(pool, "invalidate", lambda *args: self.count("invalidated"))
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return dict(self.counters)
+
+
+class _TimedCheckout:
+    """Pool mixin: checkout time goes to metrics, see instrumented_pool_class"""
+
+    metrics = None  # type: PoolMetrics
+
+    def connect(self):
+        metrics = self.metrics
+        waited = metrics.is_exhausted(self)
+        started = metrics.clock()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            metrics.checked_out(metrics.clock() - started, waited, timed_out=True)
+            raise
+        metrics.checked_out(metrics.clock() - started, waited)
+        return connection
+
+
+def instrumented_pool_class(poolclass, metrics: PoolMetrics):
+    # metrics is a class attribute: the pool recreated on engine.dispose() keeps it
+    return type(
+        f"Instrumented{poolclass.__name__}",
+        (_TimedCheckout, poolclass),
+        {"metrics": metrics},
+    )
+
+
+def engine_options(url: str, params: dict = None) -> dict:
+    """create_engine keyword arguments from engine params
+
+    Pool params and metrics apply to queue pools only:
+    in-memory SQLite (tests) keeps its own single connection pool"""
+    params = dict(params or {})
+    url = make_url(url)
+    options = {}
+    if params.get("isolation_level"):
+        options["isolation_level"] = params["isolation_level"]
+    connect_args = _statement_timeout_args(url, params.get("statement_timeout"))
+    if connect_args:
+        options["connect_args"] = connect_args
+
+    poolclass = url.get_dialect().get_pool_class(url)
+    if issubclass(poolclass, QueuePool):
+        options.update(
+            {name: params[name] for name in POOL_PARAMS if params.get(name) is not None}
+        )
+        metrics = PoolMetrics(options.get("max_overflow", DEFAULT_MAX_OVERFLOW))
+        options["poolclass"] = instrumented_pool_class(poolclass, metrics)
+    return options
+
+
+def _statement_timeout_args(url, timeout) -> dict:
+    if not timeout or url.get_backend_name() != "postgresql":
+        return {}
+    if url.get_driver_name() == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(int(timeout))}}
+    return {"options": f"-c statement_timeout={int(timeout)}"}
+
+
+def create_engine(url: str, params: dict = None) -> Engine:
+    engine = sa_create_engine(url, **engine_options(url, params))
+    _listen(engine.pool)
+    return engine
+
+
+def create_async_engine(url: str, params: dict = None) -> AsyncEngine:
+    engine = sa_create_async_engine(url, **engine_options(url, params))
+    _listen(engine.pool)
+    return engine
+
+
+def _listen(pool: Pool):
+    metrics = get_pool_metrics(pool)
+    if metrics:
+        metrics.listen(pool)
+
+
+def get_pool_metrics(pool: Pool) -> Optional[PoolMetrics]:
+    """Metrics of engine's pool, None if it isn't instrumented"""
+    return getattr(pool, "metrics", None)
@@ -0,0 +1,14 @@
+"""Ключи поиска
+
+В базе индексируются и ищутся не сами state, коды и токены
+(строки до нескольких КБ), а их SHA-256: 32 байта, индексы остаются маленькими.
+Сами значения по-прежнему хранятся: с ними идут к провайдеру."""
+
+import hashlib
+from typing import Optional
+
+
+def lookup_key(value: Optional[str]) -> Optional[bytes]:
+    if value is None:
+        return None
+    return hashlib.sha256(value.encode("utf-8")).digest()
@@ -0,0 +1,62 @@
+"""Пул HTTP-клиентов
+
+Одна aiohttp-сессия на провайдера на всё время жизни приложения:
+keep-alive соединения, кэш DNS, лимиты и таймауты берутся из config.yaml
+(секция http, переопределяется в oauth/providers/<provider>/http)"""
+
+import asyncio
+from typing import Callable, Dict, Iterable, Tuple
+
+import aiohttp
+
+from ..entrypoints import config
+
+
+class HTTPClientPool:
+    """Долгоживущие aiohttp-сессии, по одной на провайдера
+
+    Открывается и закрывается в lifespan приложения,
+    см. entrypoints/fastapi_app.py"""
+
+    def __init__(self, get_params: Callable[[str], dict] = config.get_http_params):
+        self._get_params = get_params
+        self._sessions = (
+            {}
+        )  # type: Dict[str, Tuple[aiohttp.ClientSession, asyncio.AbstractEventLoop]]
+
+    async def open(self, providers: Iterable[str]):
+        """Create sessions for providers in advance"""
+        for provider in providers:
+            self.get_session(provider)
+
+    def get_session(self, provider: str) -> aiohttp.ClientSession:
+        """Get provider's pooled session
+
+        Session is created on first use,
+        if the pool was not opened by the app lifespan"""
+        loop = asyncio.get_running_loop()
+        session, session_loop = self._sessions.get(provider, (None, None))
+        if session is None or session.closed or session_loop is not loop:
+            session = self._create_session(provider)
+            self._sessions[provider] = (session, loop)
+        return session
+
+    def _create_session(self, provider: str) -> aiohttp.ClientSession:
+        params = self._get_params(provider)
+        connector = aiohttp.TCPConnector(**params.get("connector", {}))
+        timeout = aiohttp.ClientTimeout(**params.get("timeout", {}))
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        sessions, self._sessions = self._sessions, {}
+        await asyncio.gather(
+            *(
+                session.close()
+                for session, session_loop in sessions.values()
+                if session_loop is loop and not session.closed
+            )
+        )
+
+
+http_clients = HTTPClientPool()
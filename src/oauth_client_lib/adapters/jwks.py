@@ -0,0 +1,113 @@
+"""Кэш открытых ключей провайдеров (JWKS)
+
+Ключи, которыми провайдер подписывает id_token, загружаются по адресу
+urls/public_keys провайдера и хранятся в памяти процесса:
+- столько, сколько разрешает Cache-Control: max-age ответа
+  (без него - default_max_age);
+- раньше - если пришёл токен с неизвестным kid (провайдер сменил ключи),
+  но не чаще раза в min_refresh_interval секунд:
+  токены с выдуманным kid не заставляют ходить к провайдеру.
+Неудачная загрузка тоже повторяется не чаще раза в min_refresh_interval
+секунд, до тех пор используются уже известные ключи.
+
+Одновременные обновления одного адреса объединяются в одну загрузку."""
+
+import asyncio
+import re
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from . import http_client
+from ..service_layer.resilience import raise_for_transient_status
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+async def fetch_jwks(
+    url: str, http_clients: http_client.HTTPClientPool = None
+) -> Tuple[dict, Optional[float]]:
+    """JWKS and its max-age (seconds), if the response has it"""
+    session = (http_clients or http_client.http_clients).get_session("jwks")
+    async with session.get(url) as resp:
+        raise_for_transient_status(resp.status)
+        resp.raise_for_status()
+        max_age = MAX_AGE.search(resp.headers.get("Cache-Control", ""))
+        return await resp.json(), float(max_age.group(1)) if max_age else None
+
+
+class JWKSCache:
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Tuple[dict, Optional[float]]]] = fetch_jwks,
+        default_max_age: float = 3600,
+        min_refresh_interval: float = 60,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._fetch = fetch
+        self.default_max_age = default_max_age
+        self.min_refresh_interval = min_refresh_interval
+        self._clock = clock
+        # url -> (kid -> key, expires at, fetched at)
+        self._keys = {}  # type: Dict[str, Tuple[Dict[str, dict], float, float]]
+        # url -> time of the last failed fetch
+        self._failed_at = {}  # type: Dict[str, float]
+        self._locks = {}  # type: Dict[str, asyncio.Lock]
+        self.fetches = 0
+        self.failures = 0
+
+    async def get_key(
+        self,
+        url: str,
+        kid: str,
+        call: Callable[[Callable[[], Awaitable]], Awaitable] = None,
+    ) -> Optional[dict]:
+        """JWK by its kid, None if the provider has no such key
+
+        call - runs the fetch, e.g. ResiliencePolicy.call of the provider;
+        fetch errors are raised, known keys are used until the next attempt"""
+        keys, expires_at, fetched_at = self._keys.get(url, ({}, 0, None))
+        now = self._clock()
+        if kid in keys and now < expires_at:
+            return keys[kid]
+        may_refresh = fetched_at is None or now - fetched_at >= self.min_refresh_interval
+        if (now >= expires_at or may_refresh) and not self._failed_recently(url, now):
+            keys = await self._refresh(url, fetched_at, call)
+        return keys.get(kid)
+
+    def _failed_recently(self, url: str, now: float) -> bool:
+        failed_at = self._failed_at.get(url)
+        return failed_at is not None and now - failed_at < self.min_refresh_interval
+
+    async def _refresh(self, url: str, seen_fetched_at, call) -> Dict[str, dict]:
+        lock = self._locks.setdefault(url, asyncio.Lock())
+        async with lock:
+            keys, _, fetched_at = self._keys.get(url, ({}, 0, None))
+            failed = self._failed_recently(url, self._clock())
+            if fetched_at != seen_fetched_at or failed:
+                # refreshed, or failed, while we were waiting
+                return keys
+            try:
+                jwks, max_age = await (call or _call)(lambda: self._fetch(url))
+            except Exception:
+                # provider is down: don't ask it on every token
+                self.failures += 1
+                self._failed_at[url] = self._clock()
+                raise
+            self.fetches += 1
+            self._failed_at.pop(url, None)
+            keys = {key["kid"]: key for key in jwks.get("keys", []) if "kid" in key}
+            now = self._clock()
+            max_age = self.default_max_age if max_age is None else max_age
+            self._keys[url] = (keys, now + max_age, now)
+            return keys
+
+    def clear(self):
+        self._keys.clear()
+        self._failed_at.clear()
+
+
+async def _call(fetch):
+    return await fetch()
+
+
+jwks_cache = JWKSCache()
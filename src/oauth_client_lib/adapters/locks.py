@@ -0,0 +1,112 @@
+"""Блокировки
+
+Ведущий узел (leader lock): фоновую работу, например упреждающее обновление
+токенов, выполняет только тот узел, который захватил блокировку.
+Взаимное исключение: обмен refresh-токена для одного гранта
+выполняет один процесс, остальные ждут (см. handlers.request_token).
+- LocalLock - в пределах процесса (один узел, тесты);
+- PostgresAdvisoryLock - advisory lock Postgres, общий для всех узлов.
+  Блокировка принадлежит соединению: пока она захвачена,
+  соединение удерживается."""
+
+import abc
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+
+def lock_key(name: str) -> int:
+    """Advisory lock key (signed bigint) by name"""
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True)
+
+
+class AbstractLock(abc.ABC):
+    @abc.abstractmethod
+    async def acquire(self, wait: bool = False) -> bool:
+        """Acquire: wait for it or just try, return whether acquired"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def release(self):
+        raise NotImplementedError
+
+    @asynccontextmanager
+    async def held(self, wait: bool = False):
+        """Yield whether the lock is acquired, release it at exit"""
+        acquired = await self.acquire(wait)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await self.release()
+
+
+class LocalLock(AbstractLock):
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, wait: bool = False) -> bool:
+        if self._lock.locked() and not wait:
+            return False
+        await self._lock.acquire()
+        return True
+
+    async def release(self):
+        self._lock.release()
+
+
+class PostgresAdvisoryLock(AbstractLock):
+    def __init__(self, engine: AsyncEngine, name: str, wait_timeout: float = 60):
+        """wait_timeout - seconds acquire(wait=True) waits for the lock
+        (lock_timeout), statement_timeout of the engine doesn't apply to it"""
+        self.engine = engine
+        self.key = lock_key(name)
+        self.wait_timeout = wait_timeout
+        self._connection = None  # type: AsyncConnection
+
+    async def acquire(self, wait: bool = False) -> bool:
+        connection = await self.engine.connect()
+        try:
+            acquired = await self._acquire(connection, wait)
+        except BaseException:
+            # failed, timed out or cancelled: the connection goes back to the pool
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    async def _acquire(self, connection: AsyncConnection, wait: bool) -> bool:
+        if wait:
+            # waiting is not a slow statement; reset when the transaction ends
+            await connection.execute(text("SET LOCAL statement_timeout = 0"))
+            await connection.execute(
+                text(f"SET LOCAL lock_timeout = {int(self.wait_timeout * 1000)}")
+            )
+            await connection.execute(
+                text("SELECT pg_advisory_lock(:key)"), {"key": self.key}
+            )
+            acquired = True
+        else:
+            acquired = await connection.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+            )
+        if acquired:
+            # session-level lock outlives the transaction
+            await connection.commit()
+        return acquired
+
+    async def release(self):
+        connection, self._connection = self._connection, None
+        try:
+            await connection.scalar(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": self.key}
+            )
+            await connection.commit()
+        finally:
+            await connection.close()
@@ -7,10 +7,15 @@ from sqlalchemy import (
     Interval,
     Boolean,
     ForeignKey,
-    FetchedValue
+    FetchedValue,
+    Index,
+    LargeBinary,
+    Text,
+    text,
 )
 
 from ..domain import model
+from .hashing import lookup_key
 from sqlalchemy import event
 
 from sqlalchemy.orm import registry, relationship
@@ -23,13 +28,16 @@ authorizations = Table(
     Column('provider', String),
     Column('created', DateTime),
     Column('is_active', Boolean),
+    # last time access token was looked up, see Authorization.mark_used
+    Column('last_used', DateTime),
 )
 
 states = Table(
     'states', mapper_registry.metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('auth_id', ForeignKey("authorizations.id")),
+    Column('auth_id', ForeignKey("authorizations.id"), index=True),
     Column('state', String),
+    Column('state_hash', LargeBinary(32), unique=True, index=True),
     Column('created', DateTime),
     Column('is_active', Boolean),
 )
@@ -40,8 +48,18 @@ grants = Table(
     Column('auth_id', ForeignKey("authorizations.id")),
     Column('grant_type', String),
     Column('code', String),
+    # not unique: provider could return the same refresh token again,
+    # the old grant is deactivated then
+    Column('code_hash', LargeBinary(32), index=True),
     Column('created', DateTime),
     Column('is_active', Boolean),
+    # active grants of authorization, see repository.get_load_options
+    Index('ix_grants_auth_id_is_active', 'auth_id', 'is_active'),
+    # code of active grant leads to one authorization
+    Index(
+        'ux_grants_code_hash_active', 'code_hash', unique=True,
+        postgresql_where=text('is_active'), sqlite_where=text('is_active'),
+    ),
 )
 
 tokens = Table(
@@ -49,16 +67,40 @@ tokens = Table(
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('auth_id', ForeignKey("authorizations.id")),
     Column('access_token', String),
+    Column('access_token_hash', LargeBinary(32), unique=True, index=True),
     Column('scope', String),
     Column('token_type', String),
     Column('id_token', String),
     Column('created', DateTime),
     Column('expires_in', Interval),
+    Column('expires_at', DateTime),
     Column('is_active', Boolean),
+    # active unexpired tokens of authorization, see repository.get_load_options
+    Index('ix_tokens_auth_id_is_active_expires_at', 'auth_id', 'is_active', 'expires_at'),
+)
+
+
+# Transactional outbox: messages are processed by workers,
+# see adapters/outbox.py
+outbox = Table(
+    'outbox', mapper_registry.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('message_type', String),
+    Column('payload', Text),
+    Column('status', String),  # pending, done, dead
+    Column('attempts', Integer),
+    Column('created', DateTime),
+    Column('available_at', DateTime),  # not claimed before
+    Column('processed_at', DateTime),
+    Column('last_error', Text),
+    Index('ix_outbox_status_available_at', 'status', 'available_at'),
 )
 
 
 def start_mappers():
+    """Map domain model to tables, once: repeated calls do nothing"""
+    if mapper_registry.mappers:
+        return
     states_mapper = mapper_registry.map_imperatively(model.State, states)
     grants_mapper = mapper_registry.map_imperatively(model.Grant, grants)
     tokens_mapper = mapper_registry.map_imperatively(model.Token, tokens)
@@ -76,3 +118,22 @@ def start_mappers():
 @event.listens_for(model.Authorization, "load")
 def receive_load(auth, _):
     auth.events = []
+
+
+# Lookup columns are filled with SHA-256 of the value, see hashing.py
+LOOKUP_COLUMNS = {
+    model.State: ("state", "state_hash"),
+    model.Grant: ("code", "code_hash"),
+    model.Token: ("access_token", "access_token_hash"),
+}
+
+
+def set_lookup_key(mapper, connection, target):
+    column, hash_column = LOOKUP_COLUMNS[mapper.class_]
+    setattr(target, hash_column, lookup_key(getattr(target, column)))
+
+
+for mapped_class in LOOKUP_COLUMNS:
+    event.listen(mapped_class, "before_insert", set_lookup_key)
+    # the value could be changed after insert
+    event.listen(mapped_class, "before_update", set_lookup_key)
@@ -0,0 +1,150 @@
+"""Транзакционный outbox
+
+Сообщения (события и команды агрегатов) записываются в таблицу outbox
+в той же транзакции, что и изменения агрегата (см. AsyncSqlAlchemyUnitOfWork),
+и обрабатываются позже воркерами (см. service_layer/outbox.py).
+
+Воркер захватывает пачку сообщений (SELECT ... FOR UPDATE SKIP LOCKED)
+и сдвигает их available_at на время аренды (lease): транзакция короткая,
+а другие воркеры захваченные сообщения не берут, пока аренда не истекла."""
+
+import json
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple, Union
+
+from sqlalchemy import func, insert, select, update
+
+from . import orm
+from ..domain import commands, events
+
+Message = Union[commands.Command, events.Event]
+
+PENDING, DONE, DEAD = "pending", "done", "dead"
+
+
+@dataclass
+class OutboxMessage:
+    id: int
+    message: Message
+    attempts: int
+    created: datetime
+
+
+def dumps(message: Message) -> Tuple[str, str]:
+    """Message type name and JSON payload"""
+    # provider is an object, it's taken by name from authorization
+    payload = {
+        f.name: getattr(message, f.name)
+        for f in fields(message)
+        if f.name != "provider"
+    }
+    return type(message).__name__, json.dumps(payload)
+
+
+def loads(message_type: str, payload: str) -> Message:
+    cls = getattr(commands, message_type, None) or getattr(events, message_type)
+    values = json.loads(payload)
+    return cls(**{f.name: values[f.name] for f in fields(cls) if f.name in values})
+
+
+async def add(session, messages: List[Message], now: datetime = None):
+    now = now or datetime.utcnow()
+    rows = []
+    for message in messages:
+        message_type, payload = dumps(message)
+        rows.append(
+            dict(
+                message_type=message_type,
+                payload=payload,
+                status=PENDING,
+                attempts=0,
+                created=now,
+                available_at=now,
+            )
+        )
+    if rows:
+        await session.execute(insert(orm.outbox), rows)
+
+
+async def claim(
+    session, limit: int, lease: float, now: datetime = None
+) -> List[OutboxMessage]:
+    """Claim available messages for lease seconds, commits"""
+    now = now or datetime.utcnow()
+    rows = (
+        await session.execute(
+            select(
+                orm.outbox.c.id,
+                orm.outbox.c.message_type,
+                orm.outbox.c.payload,
+                orm.outbox.c.attempts,
+                orm.outbox.c.created,
+            )
+            .where(
+                orm.outbox.c.status == PENDING,
+                orm.outbox.c.available_at <= now,
+            )
+            .order_by(orm.outbox.c.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+    ).all()
+    if rows:
+        await session.execute(
+            update(orm.outbox)
+            .where(orm.outbox.c.id.in_([row.id for row in rows]))
+            .values(
+                available_at=now + timedelta(seconds=lease),
+                attempts=orm.outbox.c.attempts + 1,
+            )
+        )
+    await session.commit()
+    return [
+        OutboxMessage(
+            id=row.id,
+            message=loads(row.message_type, row.payload),
+            attempts=row.attempts + 1,
+            created=row.created,
+        )
+        for row in rows
+    ]
+
+
+async def complete(session, message_id: int, now: datetime = None):
+    await _set(session, message_id, status=DONE, processed_at=now or datetime.utcnow())
+
+
+async def retry(session, message_id: int, error: str, available_at: datetime):
+    await _set(session, message_id, available_at=available_at, last_error=error)
+
+
+async def bury(session, message_id: int, error: str, now: datetime = None):
+    """Give up: too many attempts"""
+    await _set(
+        session,
+        message_id,
+        status=DEAD,
+        processed_at=now or datetime.utcnow(),
+        last_error=error,
+    )
+
+
+async def _set(session, message_id: int, **values):
+    await session.execute(
+        update(orm.outbox).where(orm.outbox.c.id == message_id).values(**values)
+    )
+    await session.commit()
+
+
+async def backlog(session, now: datetime = None) -> Tuple[int, Optional[float]]:
+    """Pending messages count and age of the oldest one, seconds"""
+    now = now or datetime.utcnow()
+    count, oldest = (
+        await session.execute(
+            select(func.count(), func.min(orm.outbox.c.created)).where(
+                orm.outbox.c.status == PENDING
+            )
+        )
+    ).one()
+    return count, (now - oldest).total_seconds() if oldest else None
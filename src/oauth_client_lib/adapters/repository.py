@@ -3,10 +3,49 @@
 Абстракция над хранилищем"""
 
 import abc
+from datetime import datetime
+from typing import Dict, Iterable, Union
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, lazyload, selectinload
+
 from . import orm
+from .hashing import lookup_key
 from ..domain import model
+from ..entrypoints import config
 from ..service_layer import exceptions
 
+LOADERS = {
+    "joined": joinedload,  # same SELECT, LEFT OUTER JOIN
+    "selectin": selectinload,  # one more SELECT ... WHERE auth_id IN (...)
+    "select": lazyload,  # SELECT on first access (sync session only)
+}
+
+
+def get_load_options(load_strategy: Dict[str, str] = None, now: datetime = None) -> list:
+    """Loader options for Authorization aggregate relationships
+
+    load_strategy: relationship name (state, grants, tokens) -> loader name,
+    see LOADERS and the database/load_strategy section of config.yaml.
+
+    Only active grants and active unexpired (at the moment "now") tokens are loaded:
+    long-lived authorization doesn't drag its whole refresh history along"""
+    load_strategy = load_strategy or config.get_load_strategy()
+    now = now or datetime.utcnow()
+    # mapped attributes, not table columns: joined loader aliases the tables
+    criteria = {
+        "grants": model.Grant.is_active,
+        "tokens": and_(model.Token.is_active, model.Token.expires_at > now),
+    }
+    options = []
+    for relationship, loader in load_strategy.items():
+        attribute = getattr(model.Authorization, relationship)
+        if relationship in criteria:
+            attribute = attribute.and_(criteria[relationship])
+        options.append(LOADERS[loader](attribute))
+    return options
+
 
 class AbstractRepository(abc.ABC):
     """Абстрактный репозиторий"""
@@ -61,9 +100,13 @@ class AbstractRepository(abc.ABC):
 
 
 class SQLAlchemyRepository(AbstractRepository):
-    def __init__(self, session):
+    """Authorization aggregate is loaded by load strategy,
+    so handlers make a known number of SELECTs, see get_load_options"""
+
+    def __init__(self, session, load_strategy: Dict[str, str] = None):
         super().__init__()
         self.session = session
+        self.load_strategy = load_strategy
 
     def _add(self, auth: model.Authorization):
         self.session.add(auth)
@@ -72,7 +115,8 @@ class SQLAlchemyRepository(AbstractRepository):
         return (
             self.session.query(model.Authorization)
             .join(model.State)
-            .filter(orm.states.c.state == state)
+            .filter(orm.states.c.state_hash == lookup_key(state))
+            .options(*get_load_options(self.load_strategy))
             .first()
         )
 
@@ -80,7 +124,8 @@ class SQLAlchemyRepository(AbstractRepository):
         return (
             self.session.query(model.Authorization)
             .join(model.Grant)
-            .filter(orm.grants.c.code == code)
+            .filter(orm.grants.c.code_hash == lookup_key(code))
+            .options(*get_load_options(self.load_strategy))
             .first()
         )
 
@@ -88,9 +133,196 @@ class SQLAlchemyRepository(AbstractRepository):
         return (
             self.session.query(model.Authorization)
             .join(model.Token)
-            .filter(orm.tokens.c.access_token == token)
+            .filter(orm.tokens.c.access_token_hash == lookup_key(token))
+            .options(*get_load_options(self.load_strategy))
             .first()
         )
 
     def cancel_authorization(self):
         return self.session.query(model.Authorization).join(model.State)
+
+
+class AbstractAsyncRepository(abc.ABC):
+    """Абстрактный асинхронный репозиторий
+
+    Тот же контракт, что у AbstractRepository, но get ожидается (await)"""
+
+    def __init__(self):
+        self.seen = set()
+
+    def add(self, auth: model.Authorization) -> model.Authorization:
+        self._add(auth)
+        self.seen.add(auth)
+
+    async def get(
+        self, token=None, grant_code=None, state_code=None, for_update=False
+    ) -> model.Authorization:
+        """Get validated authorization
+
+        for_update - authorization is about to be changed:
+        it's read from the database, never from a cache
+        """
+        assert token or grant_code or state_code, "One of params must be provided"
+        auth = await self._get_not_validated(
+            token, grant_code, state_code, for_update=for_update
+        )
+        if auth and auth.is_active:
+            self.seen.add(auth)
+            return auth
+
+    async def _get_not_validated(
+        self, token=None, grant_code=None, state_code=None, for_update=False
+    ) -> model.Authorization:
+        """Get non-validated authorization
+
+        Just get auth by one of provided params,
+        for_update matters to caching repositories only
+        """
+        if token:
+            return await self._get_by_token(token)
+        if grant_code:
+            return await self._get_by_grant(grant_code)
+        if state_code:
+            return await self._get_by_state(state_code)
+
+    async def get_by_grants(self, codes: Iterable[str]) -> Dict[str, model.Authorization]:
+        """Active authorizations by their active grant codes, at once
+
+        Codes without active grant (or authorization) are missing in the result"""
+        found = {}
+        for code, auth in (await self._get_by_grants(list(codes))).items():
+            active = any(g.is_active and g.code == code for g in auth.grants)
+            if auth.is_active and active:
+                self.seen.add(auth)
+                found[code] = auth
+        return found
+
+    async def _get_by_grants(self, codes: list) -> Dict[str, model.Authorization]:
+        """One lookup per code, unless the repository does better"""
+        found = {}
+        for code in codes:
+            auth = await self._get_by_grant(code)
+            if auth:
+                found[code] = auth
+        return found
+
+    async def flush(self):
+        """Unit of work is about to commit"""
+
+    async def committed(self):
+        """Unit of work has committed changes of seen authorizations"""
+
+    async def _attach(self, auth: model.Authorization) -> model.Authorization:
+        """Make detached authorization (e.g. cached one) part of the repository"""
+        return auth
+
+    @abc.abstractmethod
+    def _add(self, auth: model.Authorization):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def _get_by_state(self, state) -> model.Authorization:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def _get_by_grant(self, code) -> model.Authorization:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def _get_by_token(self, token) -> model.Authorization:
+        raise NotImplementedError
+
+
+class RepositoryWrapper(AbstractAsyncRepository):
+    """Репозиторий поверх другого репозитория
+
+    Добавляет в обёрнутый, seen - тоже его"""
+
+    def __init__(self, repository: Union[AbstractRepository, AbstractAsyncRepository]):
+        # no super().__init__(): seen is the wrapped repository's one
+        self.repository = repository
+
+    @property
+    def seen(self):
+        return self.repository.seen
+
+    def _add(self, auth: model.Authorization):
+        self.repository._add(auth)
+
+
+class SyncRepositoryAdapter(RepositoryWrapper):
+    """Синхронный репозиторий под асинхронным интерфейсом
+
+    Запросы выполняются синхронно, как и раньше"""
+
+    async def _get_by_state(self, state) -> model.Authorization:
+        return self.repository._get_by_state(state)
+
+    async def _get_by_grant(self, code) -> model.Authorization:
+        return self.repository._get_by_grant(code)
+
+    async def _get_by_token(self, token) -> model.Authorization:
+        return self.repository._get_by_token(token)
+
+
+class AsyncSQLAlchemyRepository(AbstractAsyncRepository):
+    """Authorization aggregate is loaded with its state, grants and tokens
+    at once: there is no lazy loading in async session,
+    so "select" loader must not be used here"""
+
+    def __init__(self, session: AsyncSession, load_strategy: Dict[str, str] = None):
+        super().__init__()
+        self.session = session
+        self.load_strategy = load_strategy
+
+    def _add(self, auth: model.Authorization):
+        self.session.add(auth)
+
+    async def _attach(self, auth: model.Authorization) -> model.Authorization:
+        # no SELECT: the authorization is taken as it is
+        auth = await self.session.merge(auth, load=False)
+        if not hasattr(auth, "events"):
+            auth.events = []
+        return auth
+
+    async def _get_by_state(self, state) -> model.Authorization:
+        return await self._get_first(
+            model.State, orm.states.c.state_hash == lookup_key(state)
+        )
+
+    async def _get_by_grant(self, code) -> model.Authorization:
+        return await self._get_first(
+            model.Grant, orm.grants.c.code_hash == lookup_key(code)
+        )
+
+    async def _get_by_token(self, token) -> model.Authorization:
+        return await self._get_first(
+            model.Token, orm.tokens.c.access_token_hash == lookup_key(token)
+        )
+
+    async def _get_by_grants(self, codes: list) -> Dict[str, model.Authorization]:
+        # one SELECT for all codes (plus selectin loads)
+        result = await self.session.execute(
+            select(model.Authorization)
+            .join(model.Grant)
+            .where(orm.grants.c.code_hash.in_([lookup_key(code) for code in codes]))
+            .options(*get_load_options(self.load_strategy))
+        )
+        codes = set(codes)
+        return {
+            grant.code: auth
+            for auth in result.unique().scalars()
+            for grant in auth.grants
+            if grant.code in codes
+        }
+
+    async def _get_first(self, entity, criterion) -> model.Authorization:
+        result = await self.session.execute(
+            select(model.Authorization)
+            .join(entity)
+            .where(criterion)
+            .options(*get_load_options(self.load_strategy))
+            .limit(1)
+        )
+        # joined collections repeat the parent row
+        return result.unique().scalars().first()
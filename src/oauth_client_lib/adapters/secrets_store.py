@@ -0,0 +1,121 @@
+"""Хранилище секретов OAuth-клиентов
+
+Секреты провайдера (секция "web" файла client_secret_<provider>.json)
+читаются один раз и хранятся в памяти.
+Файл перечитывается, только если он изменился (inode, mtime, размер),
+или по явному вызову reload().
+
+Секреты можно передать и через окружение, тогда файл не нужен:
+- OAUTH_<PROVIDER>_CLIENT_ID
+- OAUTH_<PROVIDER>_CLIENT_SECRET
+(<PROVIDER> - имя провайдера в верхнем регистре, "-" заменяется на "_")
+Значения из окружения перекрывают значения из файла."""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional, Tuple
+
+from ..service_layer import exceptions
+
+
+@dataclass
+class _Entry:
+    client_config: dict
+    signature: tuple
+    checked: float
+
+
+class OAuthSecretsStore:
+    def __init__(
+        self,
+        path_template: str = "client_secret_{provider}.json",
+        environ: Mapping[str, str] = os.environ,
+        check_interval: float = 1.0,
+    ):
+        """check_interval - how often (seconds) the file is checked for changes"""
+        self._path_template = path_template
+        self._environ = environ
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries = {}  # type: Dict[str, _Entry]
+
+    def get(self, provider: str) -> Tuple[str, str]:
+        """Get provider's client_id and client_secret"""
+        client_config = self.get_client_config(provider)
+        return client_config["client_id"], client_config["client_secret"]
+
+    def get_client_config(self, provider: str) -> dict:
+        """Get provider's client config (the "web" section of secrets file)"""
+        entry = self._entries.get(provider)
+        if entry and time.monotonic() - entry.checked < self._check_interval:
+            return entry.client_config
+
+        with self._lock:
+            signature = self._get_signature(provider)
+            entry = self._entries.get(provider)
+            if entry is None or entry.signature != signature:
+                entry = _Entry(self._load(provider, signature), signature, 0)
+                self._entries[provider] = entry
+            entry.checked = time.monotonic()
+            return entry.client_config
+
+    def reload(self, provider: str = None):
+        """Forget cached secrets: all of them or provider's only"""
+        with self._lock:
+            if provider:
+                self._entries.pop(provider, None)
+            else:
+                self._entries.clear()
+
+    def _get_path(self, provider: str) -> str:
+        return self._path_template.format(provider=provider)
+
+    def _get_env_secrets(self, provider: str) -> Tuple[Optional[str], Optional[str]]:
+        prefix = f"OAUTH_{provider.upper().replace('-', '_')}"
+        return (
+            self._environ.get(f"{prefix}_CLIENT_ID"),
+            self._environ.get(f"{prefix}_CLIENT_SECRET"),
+        )
+
+    def _get_signature(self, provider: str) -> tuple:
+        """File identity (inode, mtime, size) and environment values"""
+        try:
+            stat = os.stat(self._get_path(provider))
+            file_signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            file_signature = None
+        return file_signature, self._get_env_secrets(provider)
+
+    def _load(self, provider: str, signature: tuple) -> dict:
+        file_signature, (client_id, client_secret) = signature
+        client_config = {}
+        if file_signature:
+            with open(self._get_path(provider), encoding="utf-8") as f:
+                client_config = json.load(f)["web"]
+        if client_id:
+            client_config["client_id"] = client_id
+        if client_secret:
+            client_config["client_secret"] = client_secret
+
+        if not client_config.get("client_id") or not client_config.get("client_secret"):
+            raise exceptions.OAuthError(f"No client secrets for provider {provider}")
+        return client_config
+
+
+class StaticSecrets:
+    """Secrets given as is, e.g. for a provider created in code"""
+
+    def __init__(self, client_id: str, client_secret: str):
+        self._client_config = {"client_id": client_id, "client_secret": client_secret}
+
+    def get(self, provider: str) -> Tuple[str, str]:
+        return self._client_config["client_id"], self._client_config["client_secret"]
+
+    def get_client_config(self, provider: str) -> dict:
+        return dict(self._client_config)
+
+
+oauth_secrets = OAuthSecretsStore()
@@ -0,0 +1,260 @@
+"""Хранилище state-кодов
+
+Авторизация, начатая на /redirect, пока у неё есть только state,
+хранится не в БД, а в кэше (см. cache.py) с TTL.
+Большинство таких авторизаций брошены (пользователь не вернулся на /callback)
+и просто истекают, не оставляя строк в authorizations и states.
+
+Когда приходит код авторизации, state извлекается из хранилища
+(атомарно: получить его может только один запрос),
+и авторизация сохраняется в БД вместе с кодом.
+
+Повторное использование state по-прежнему деактивирует авторизацию:
+использованный state уже лежит в БД (неактивным) и находится там.
+
+Подписанные state (SignedStateStore): state-код - это сам токен
+с провайдером, временем создания и случайным nonce, подписанный HMAC
+(или зашифрованный JWE, если задан ключ шифрования).
+/redirect ничего не пишет, /callback проверяет подпись без чтения БД,
+однократность обеспечивает множество использованных nonce с TTL.
+
+Хранилище включается вместе с общим кэшем (OAUTH_CACHE_URL):
+кэш в памяти одного процесса не годится, если /redirect и /callback
+обслуживают разные воркеры. Без него state хранится в БД, как раньше.
+Подписанные state включаются секретом OAUTH_STATE_SECRET,
+шифрование - ключом OAUTH_STATE_ENCRYPTION_KEY."""
+
+import base64
+import calendar
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Union
+
+from jose import jwe
+from jose.exceptions import JOSEError
+
+from . import repository
+from .cache import AbstractCache, get_shared_cache, make_key
+from ..domain import model
+from ..entrypoints import config
+
+
+class StateStore:
+    def __init__(self, cache: AbstractCache, ttl: float = 600):
+        """ttl - how long user has to come back with authorization code"""
+        self.cache = cache
+        self.ttl = ttl
+
+    async def add(self, auth: model.Authorization):
+        pending = {
+            "provider": auth.provider,
+            "created": auth.created.isoformat(),
+            "state_created": auth.state.created.isoformat(),
+        }
+        await self.cache.set(
+            make_key("state", auth.state.state), json.dumps(pending), self.ttl
+        )
+
+    async def pop(self, state_code: str) -> Optional[model.Authorization]:
+        """Take pending authorization: it's not in the store anymore"""
+        pending = await self.cache.pop(make_key("state", state_code))
+        if not pending:
+            return None
+        pending = json.loads(pending)
+        state = model.State(state_code)
+        state.created = datetime.fromisoformat(pending["state_created"])
+        return model.Authorization(
+            state=state,
+            provider_name=pending["provider"],
+            created=datetime.fromisoformat(pending["created"]),
+        )
+
+
+class SignedStateStore:
+    """State code is the signed pending authorization itself"""
+
+    def __init__(
+        self,
+        secret: str,
+        nonces: AbstractCache,
+        ttl: float = 600,
+        encryption_key: str = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """nonces - cache for used nonces,
+        encryption_key - encrypt state code, so provider and time are not seen"""
+        self._secret = secret.encode()
+        self._encryption_key = (
+            hashlib.sha256(encryption_key.encode()).digest() if encryption_key else None
+        )
+        self.nonces = nonces
+        self.ttl = ttl
+        self._clock = clock
+
+    async def add(self, auth: model.Authorization):
+        # the random state becomes a nonce
+        auth.state.state = self.encode(auth.provider, auth.state.state, auth.created)
+
+    async def pop(self, state_code: str) -> Optional[model.Authorization]:
+        """Verify state code and take its nonce: it can't be used anymore"""
+        payload = self.decode(state_code)
+        if not payload or self._clock() - payload["t"] >= self.ttl:
+            return None
+        if not await self.nonces.add(make_key("nonce", payload["n"]), "", self.ttl):
+            # replay: used state is in the database
+            return None
+        created = datetime.utcfromtimestamp(payload["t"])
+        state = model.State(state_code)
+        state.created = created
+        return model.Authorization(
+            state=state, provider_name=payload["p"], created=created
+        )
+
+    def encode(self, provider: str, nonce: str, created: datetime) -> str:
+        payload = json.dumps(
+            {"p": provider, "t": calendar.timegm(created.utctimetuple()), "n": nonce},
+            separators=(",", ":"),
+        ).encode()
+        if self._encryption_key:
+            # authenticated encryption, no signature needed
+            return jwe.encrypt(
+                payload, self._encryption_key, algorithm="dir", encryption="A256GCM"
+            ).decode()
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(payload))}"
+
+    def decode(self, state_code: str) -> Optional[dict]:
+        """Payload of genuine state code, None otherwise"""
+        try:
+            if self._encryption_key:
+                payload = jwe.decrypt(state_code, self._encryption_key)
+            else:
+                payload, signature = map(_b64decode, state_code.split("."))
+                if not hmac.compare_digest(signature, self._sign(payload)):
+                    return None
+            return json.loads(payload)
+        except (ValueError, JOSEError):
+            return None
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()
+
+
+def _b64encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode()
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def is_pending(auth: model.Authorization) -> bool:
+    """Nothing but active state: authorization code isn't recieved yet"""
+    return (
+        auth.is_active
+        and auth.state is not None
+        and auth.state.is_active
+        and not auth.grants
+        and not auth.tokens
+    )
+
+
+class StateStoreRepository(repository.RepositoryWrapper):
+    """Pending authorizations are kept in the state store,
+    all the others - in the wrapped repository"""
+
+    def __init__(
+        self,
+        repository: repository.AbstractAsyncRepository,
+        store: Union[StateStore, SignedStateStore],
+    ):
+        super().__init__(repository)
+        self.store = store
+        self._pending = []
+
+    def _add(self, auth: model.Authorization):
+        if is_pending(auth):
+            self._pending.append(auth)
+        else:
+            self.repository._add(auth)
+
+    async def _attach(self, auth: model.Authorization) -> model.Authorization:
+        return await self.repository._attach(auth)
+
+    async def flush(self):
+        while self._pending:
+            auth = self._pending.pop(0)
+            if is_pending(auth):
+                await self.store.add(auth)
+            else:
+                # got its code in the same unit of work
+                self.repository._add(auth)
+        await self.repository.flush()
+
+    async def committed(self):
+        await self.repository.committed()
+
+    async def _get_not_validated(
+        self, token=None, grant_code=None, state_code=None, for_update=False
+    ) -> model.Authorization:
+        if token or grant_code:
+            # pending authorizations have neither
+            return await self.repository._get_not_validated(
+                token, grant_code, for_update=for_update
+            )
+        return await self._get_by_state(state_code, for_update)
+
+    async def _get_by_state(self, state, for_update=False) -> model.Authorization:
+        auth = await self.store.pop(state)
+        if auth:
+            # will be saved along with the code
+            self.repository._add(auth)
+            return auth
+        # used state (replay) is in the database
+        return await self.repository._get_not_validated(
+            state_code=state, for_update=for_update
+        )
+
+    async def _get_by_grant(self, code) -> model.Authorization:
+        return await self.repository._get_by_grant(code)
+
+    async def _get_by_grants(self, codes: list) -> Dict[str, model.Authorization]:
+        return await self.repository._get_by_grants(codes)
+
+    async def _get_by_token(self, token) -> model.Authorization:
+        return await self.repository._get_by_token(token)
+
+
+_default_state_store = {}
+
+
+def get_default_state_store() -> Optional[Union[StateStore, SignedStateStore]]:
+    """State store on the shared cache, created on first use;
+    None without shared cache"""
+    if "store" not in _default_state_store:
+        _default_state_store["store"] = _create_default_state_store()
+    return _default_state_store["store"]
+
+
+def _create_default_state_store():
+    shared_cache = get_shared_cache()
+    if not shared_cache:
+        return None
+    secret, encryption_key = config.get_state_secrets()
+    if secret or encryption_key:
+        return SignedStateStore(
+            secret or "",
+            shared_cache,
+            encryption_key=encryption_key,
+            **config.get_cache_params("states"),
+        )
+    return StateStore(shared_cache, **config.get_cache_params("states"))
+
+
+def __getattr__(name):
+    # module attribute kept for compatibility
+    if name == "state_store":
+        return get_default_state_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
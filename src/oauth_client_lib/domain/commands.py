@@ -2,7 +2,7 @@
 """
 
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, List
 from ..domain import model
 
 
@@ -33,3 +33,18 @@ class RequestToken(Command):
 
     grant_code: str = None
     token: str = None
+
+
+@dataclass
+class RefreshTokens(Command):
+    """Запросить токены по множеству грантов сразу
+
+    Авторизации ищутся пачками одним запросом,
+    обмены с провайдером идут параллельно (не больше concurrency),
+    гранты одной авторизации - по очереди; каждый грант запрашивается
+    как RequestToken (с объединением одновременных запросов)
+    и фиксируется своей транзакцией"""
+
+    grant_codes: List[str] = None
+    concurrency: int = 10
+    batch_size: int = 100
@@ -42,6 +42,16 @@ class RefreshTokenRecieved(GrantRecieved):
     pass
 
 
+@dataclass
+class AccessTokenRevoked(Event):
+    """Токен доступа больше не действует
+
+    Возникает, когда авторизация деактивирована
+    или токен заменён новым"""
+
+    access_token: str
+
+
 # @dataclass
 # class TokenRecieved(Event):
 #     """Получен токен доступа
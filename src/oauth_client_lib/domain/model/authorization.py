@@ -9,11 +9,12 @@
 """
 
 from typing import List
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from .state import State
 from .grant import Grant
 from .token import Token
+from .. import events
 
 
 class Authorization:
@@ -25,6 +26,7 @@ class Authorization:
         is_active: bool = True,
         created=None,
         provider_name: str = "Own",
+        last_used=None,
     ):
         self.state = state
         self.provider = provider_name
@@ -32,11 +34,27 @@ class Authorization:
         self.tokens = tokens if tokens else []
         self.is_active = is_active
         self.created = created if created else datetime.utcnow()
+        self.last_used = last_used if last_used else self.created
         self.events = []
 
+    def mark_used(self, now: datetime = None, resolution=timedelta(hours=1)) -> bool:
+        """Remember the authorization is in use, no more precisely than resolution:
+        True if it's changed and has to be saved"""
+        now = now or datetime.utcnow()
+        if self.last_used and now - self.last_used < resolution:
+            return False
+        self.last_used = now
+        return True
+
     def get_grant(self, code: str):
         return next(grant for grant in self.grants if grant.code == code)
 
+    def get_token(self, access_token: str):
+        return next(
+            (token for token in self.tokens if token.access_token == access_token),
+            None,
+        )
+
     def get_active_grant(self):
         return next(grant for grant in self.grants if grant.is_active)
 
@@ -61,4 +79,9 @@ class Authorization:
 
     def _deactivate_tokens(self):
         for token in [token for token in self.tokens if token.is_active]:
-            token.deactivate()
+            self.deactivate_token(token)
+
+    def deactivate_token(self, token: Token):
+        """Deactivate token, tell everyone it's no more valid"""
+        token.deactivate()
+        self.events.append(events.AccessTokenRevoked(access_token=token.access_token))
@@ -10,14 +10,16 @@ class Token:
         id_token: str = '',
         expires_in=3600,
         is_active: bool = True,
+        created: datetime = None,
         **kwargs
     ) -> None:
         self.access_token = access_token
         self.scope = scope
         self.token_type = token_type
         self.id_token = id_token
-        self.created = datetime.utcnow()
+        self.created = created if created else datetime.utcnow()
         self.expires_in = timedelta(seconds=expires_in)
+        self.expires_at = self.created + self.expires_in
         self.is_active = is_active
 
     def get_access_token(self):
@@ -30,7 +32,7 @@ class Token:
 
     @property
     def _is_expired(self) -> bool:
-        return self.created + self.expires_in < datetime.utcnow()
+        return self.expires_at < datetime.utcnow()
 
     @property
     def is_valid(self) -> bool:
@@ -1,43 +1,236 @@
+"""Настройки: config.yaml и переменные окружения (и файл .env)
+
+Читаются при первом обращении, а не при импорте пакета.
+configure() загружает их явно: другой файл или готовые значения (тесты);
+вызывается до того, как настройки понадобились (см. fastapi_app.create_app)."""
+
 import json
 import os
-import yaml
+import threading
+
+from ..adapters.secrets_store import oauth_secrets
+
+_config = None
+_lock = threading.Lock()
+_dotenv_loaded = False
+
+
+def configure(path="config.yaml", values: dict = None):
+    """Load settings from the file, or take values as is
+
+    Objects already built from previous settings (engine, caches) are kept"""
+    global _config
+    _load_dotenv()
+    if values is None:
+        import yaml  # pylint: disable=import-outside-toplevel
+
+        with open(path, mode="r", encoding="utf-8") as f:
+            values = yaml.safe_load(f)
+    _config = values
+    return _config
+
+
+def get_config() -> dict:
+    """Settings, config.yaml from the current directory is loaded on first use"""
+    if _config is None:
+        with _lock:
+            if _config is None:
+                configure()
+    return _config
+
+
+def _load_dotenv():
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv  # pylint: disable=import-outside-toplevel
+
+        load_dotenv()
+        _dotenv_loaded = True
 
-from dotenv import load_dotenv
 
-load_dotenv()
+def _getenv(name, default=None):
+    _load_dotenv()
+    return os.environ.get(name, default)
 
-config = yaml.safe_load(open("config.yaml", mode="r", encoding="utf-8"))
+
+def __getattr__(name):
+    # module attributes kept for compatibility, loaded on first access
+    if name == "config":
+        return get_config()
+    if name == "ERROR_LOG_FILENAME":
+        return get_config()["ERROR_LOG_FILENAME"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_postgres_uri():
-    oauth_db_uri = os.environ.get("OAUTH_DB_URI", "localhost")
+    oauth_db_uri = _getenv("OAUTH_DB_URI", "localhost")
     return oauth_db_uri
 
 
-# LOGGING
-ERROR_LOG_FILENAME = config["ERROR_LOG_FILENAME"]
+def get_postgres_async_uri():
+    """OAUTH_DB_ASYNC_URI, or OAUTH_DB_URI with asyncpg driver"""
+    oauth_db_uri = _getenv("OAUTH_DB_ASYNC_URI")
+    if oauth_db_uri:
+        return oauth_db_uri
+    scheme, separator, rest = get_postgres_uri().partition("://")
+    if scheme.split("+")[0] in ("postgresql", "postgres"):
+        scheme = "postgresql+asyncpg"
+    return f"{scheme}{separator}{rest}"
+
+
+# database/engine params, each can be overridden by OAUTH_DB_<PARAM> variable
+DEFAULT_ENGINE_PARAMS = {
+    "isolation_level": "REPEATABLE READ",
+    "read_isolation_level": None,
+    "pool_size": None,
+    "max_overflow": None,
+    "pool_timeout": None,
+    "pool_recycle": None,
+    "pool_pre_ping": None,
+    "statement_timeout": None,
+}
+
+
+def get_engine_params():
+    """database/engine section updated with OAUTH_DB_* variables:
+    pool, isolation levels, statement_timeout (ms)"""
+    params = dict(DEFAULT_ENGINE_PARAMS)
+    params.update(get_config().get("database", {}).get("engine") or {})
+    for name in DEFAULT_ENGINE_PARAMS:
+        value = _getenv(f"OAUTH_DB_{name.upper()}")
+        if value is not None:
+            params[name] = _parse_env_value(value)
+    return params
+
+
+def get_read_isolation_level():
+    """Isolation level of read-only lookups, engine's own if not set"""
+    return get_engine_params()["read_isolation_level"]
+
+
+def _parse_env_value(value: str):
+    """Number or boolean as in yaml, string otherwise"""
+    if value.lower() in ("true", "false"):
+        value = value.lower()
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+DEFAULT_LOAD_STRATEGY = {"state": "joined", "grants": "selectin", "tokens": "selectin"}
+
+
+def get_load_strategy():
+    """Authorization aggregate load strategy: relationship -> loader"""
+    load_strategy = dict(DEFAULT_LOAD_STRATEGY)
+    load_strategy.update(get_config().get("database", {}).get("load_strategy") or {})
+    return load_strategy
+
+
+def get_sweeper_params():
+    """maintenance/sweeper section: enabled, interval, retention..."""
+    return dict(get_config().get("maintenance", {}).get("sweeper") or {})
+
+
+def get_refresher_params():
+    """maintenance/refresher section: enabled, window, rate_limits..."""
+    return dict(get_config().get("maintenance", {}).get("refresher") or {})
+
+
+def get_messagebus_params():
+    """messagebus section: mode (sequential, concurrent), concurrency"""
+    return dict(get_config().get("messagebus") or {})
+
+
+def get_outbox_params():
+    """outbox section: enabled, messages, workers, max_attempts..."""
+    return dict(get_config().get("outbox") or {})
+
+
+def get_outbox_messages():
+    """Names of messages put into outbox, none if it's disabled"""
+    params = get_outbox_params()
+    return frozenset(params.get("messages") or []) if params.get("enabled") else frozenset()
+
+
+def get_cache_url():
+    """Shared cache, e.g. redis://localhost:6379/0, see adapters/cache.py"""
+    return _getenv("OAUTH_CACHE_URL")
+
+
+def get_state_secrets():
+    """Signed state codes: HMAC secret and optional encryption key"""
+    return (
+        _getenv("OAUTH_STATE_SECRET"),
+        _getenv("OAUTH_STATE_ENCRYPTION_KEY"),
+    )
+
+
+def get_token_request_lock():
+    """Cross-process lock of token requests: postgres or none"""
+    return get_config().get("database", {}).get("token_request_lock") or "none"
+
+
+def get_cache_params(name):
+    """Params of cache/<name> section: maxsize, ttl..."""
+    return dict(get_config().get("cache", {}).get(name) or {})
 
 
 def get_oauth_secrets(provider):
-    with open(f"client_secret_{provider}.json") as f:
-        secrets = json.load(f)["web"]
-        return secrets["client_id"], secrets["client_secret"]
+    return oauth_secrets.get(provider)
 
 
 def get_oauth_params(provider):
-    assert config["oauth"]["providers"][provider]["scopes"]
-    assert config["oauth"]["providers"][provider]["urls"]
-    provider = config["oauth"]["providers"][provider]
+    assert get_config()["oauth"]["providers"][provider]["scopes"]
+    assert get_config()["oauth"]["providers"][provider]["urls"]
+    provider = get_config()["oauth"]["providers"][provider]
     scopes = provider["scopes"]
     urls = provider["urls"]
     return scopes, urls
 
 
+def get_provider_names():
+    return list(get_config()["oauth"]["providers"])
+
+
+def get_http_params(provider=None):
+    """HTTP client params: common http section
+    updated with provider's own http section"""
+    params = {
+        section: dict(values) for section, values in get_config().get("http", {}).items()
+    }
+    if provider:
+        provider_params = get_config()["oauth"]["providers"].get(provider) or {}
+        for section, values in provider_params.get("http", {}).items():
+            params.setdefault(section, {}).update(values)
+    return params
+
+
+def get_resilience_params(provider=None):
+    """Provider calls protection: common resilience section
+    updated with provider's own resilience section"""
+    params = dict(get_config().get("resilience") or {})
+    if provider:
+        provider_params = get_config()["oauth"]["providers"].get(provider) or {}
+        params.update(provider_params.get("resilience") or {})
+    return params
+
+
+def get_id_token_params(provider):
+    """id_token verification: provider's id_token section and public keys URL"""
+    provider_params = get_config()["oauth"]["providers"].get(provider) or {}
+    params = dict(provider_params.get("id_token") or {})
+    params["public_keys"] = (provider_params.get("urls") or {}).get("public_keys")
+    return params
+
+
 def get_api_host():
+    _load_dotenv()
     return os.environ["API_HOST"]
 
 
 def get_oauth_callback_URL():
     base_url = get_api_host()
-    callback_path = config["oauth"]["callback"]
+    callback_path = get_config()["oauth"]["callback"]
     return f"{base_url}{callback_path}"
@@ -1,7 +1,58 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from .routers.oauth import oauth_router
+from . import config
+from ..adapters import orm
+from ..adapters.http_client import http_clients
+from ..service_layer.oauth import compile_settings
+from ..service_layer.outbox import get_outbox_worker
+from ..service_layer.refresher import get_refresh_scheduler
+from ..service_layer.sweeper import get_sweeper
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Compile provider settings (invalid config stops the app here)
+    and open pooled provider HTTP sessions on startup, close them on shutdown.
+    Run sweeper, token refresher and outbox workers in background, if enabled"""
+    compile_settings()
+    await http_clients.open(config.get_provider_names())
+    tasks = []
+    if config.get_sweeper_params().get("enabled"):
+        tasks.append(asyncio.create_task(get_sweeper().run_forever()))
+    if config.get_refresher_params().get("enabled"):
+        tasks.append(asyncio.create_task(get_refresh_scheduler().run_forever()))
+    if config.get_outbox_params().get("enabled"):
+        tasks.append(asyncio.create_task(get_outbox_worker().run_forever()))
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await http_clients.close()
+
+
+def create_app(config_path: str = None) -> FastAPI:
+    """App factory: settings are loaded from config_path, if given,
+    otherwise from config.yaml on first use"""
+    if config_path:
+        config.configure(config_path)
+    orm.start_mappers()
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(prefix="/api", router=oauth_router)
+    return app
+
 
+_app = {}
 
-app = FastAPI()
 
-app.include_router(prefix="/api", router=oauth_router)
+def __getattr__(name):
+    # uvicorn oauth_client_lib.entrypoints.fastapi_app:app - created on access;
+    # or uvicorn --factory oauth_client_lib.entrypoints.fastapi_app:create_app
+    if name == "app":
+        if "app" not in _app:
+            _app["app"] = create_app()
+        return _app["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
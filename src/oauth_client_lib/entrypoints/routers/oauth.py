@@ -1,15 +1,19 @@
-from fastapi import Depends
-from fastapi.responses import RedirectResponse
+from fastapi import Depends, Request
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.routing import APIRouter
 
+from .. import config
 from ...service_layer import messagebus
 from ...service_layer.messagebus import commands, events
-from ...adapters import orm
-from ...service_layer.dependencies import get_uow, get_provider, get_user_info
+from ...service_layer.dependencies import (
+    get_uow,
+    get_uow_factory,
+    get_provider,
+    get_token_by_code,
+    get_user_info,
+)
 from ...service_layer.oauth import schemas
-from typing import Annotated
-
-orm.start_mappers()
+from typing import Annotated, Optional
 
 
 oauth_router = APIRouter(
@@ -19,28 +23,68 @@ oauth_router = APIRouter(
 )
 
 
+async def handle(message, uow, uow_factory):
+    """Message bus in mode set by config"""
+    if config.get_messagebus_params().get("mode") == "concurrent":
+        return await messagebus.handle_concurrently(message, uow_factory)
+    return await messagebus.handle(message, uow)
+
+
 @oauth_router.get("/redirect")
 async def api_get_oauth_redirect_uri(
-    provider, p=Depends(get_provider), uow=Depends(get_uow)
+    provider,
+    p=Depends(get_provider),
+    uow=Depends(get_uow),
+    uow_factory=Depends(get_uow_factory),
 ):
     cmd = commands.CreateAuthorization(source_url="origin", provider=p)
-    [state_code] = await messagebus.handle(cmd, uow)
+    [state_code] = await handle(cmd, uow, uow_factory)
     url = await p.get_authorization_url(state_code)
     return RedirectResponse(url=url)
 
 
 @oauth_router.get("/callback")
-async def api_oauth_callback(state, code, uow=Depends(get_uow)):
+async def api_oauth_callback(
+    request: Request,
+    state,
+    code,
+    uow=Depends(get_uow),
+    uow_factory=Depends(get_uow_factory),
+):
     evt = events.AuthCodeRecieved(
         state_code=state,
         grant_code=code,
     )
-    results = await messagebus.handle(evt, uow)
+    results = await handle(evt, uow, uow_factory)
+    if not results and config.get_outbox_messages():
+        # token is requested by outbox worker, it's polled by the code
+        return pending_token(request, code)
     assert results, "You should request new authorization code!"
     [access_token] = results
     return {"access_token": access_token}
 
 
+@oauth_router.get("/token")
+async def api_get_token(
+    request: Request,
+    code,
+    access_token: Optional[str] = Depends(get_token_by_code),
+):
+    if not access_token:
+        return pending_token(request, code)
+    return {"access_token": access_token}
+
+
+def pending_token(request: Request, code) -> JSONResponse:
+    """202 with the URL to poll for the token"""
+    url = str(request.url_for("api_get_token").include_query_params(code=code))
+    return JSONResponse(
+        {"detail": "Token request is pending", "location": url},
+        status_code=202,
+        headers={"Location": url},
+    )
+
+
 @oauth_router.get("/userinfo")
 async def api_get_user_info(userinfo: schemas.UserInfo = Depends(get_user_info)):
     return userinfo
@@ -0,0 +1,38 @@
+"""Обслуживание таблиц авторизаций из командной строки
+
+    python -m oauth_client_lib.entrypoints.sweeper [--forever] [--retention DAYS]
+
+Для cron: без --forever выполняется один проход.
+Параметры по умолчанию - секция maintenance/sweeper в config.yaml"""
+
+import argparse
+import asyncio
+import logging
+from dataclasses import asdict
+
+from ..service_layer.sweeper import get_sweeper
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep authorization tables")
+    parser.add_argument("--forever", action="store_true", help="sweep every interval")
+    parser.add_argument("--interval", type=float, help="seconds between sweeps")
+    parser.add_argument("--retention", type=float, help="days inactive rows are kept")
+    parser.add_argument("--batch-size", type=int, help="rows deleted per transaction")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    params = {
+        "interval": args.interval,
+        "retention": args.retention,
+        "batch_size": args.batch_size,
+    }
+    sweeper = get_sweeper(**{k: v for k, v in params.items() if v is not None})
+    if args.forever:
+        asyncio.run(sweeper.run_forever())
+    else:
+        print(asdict(asyncio.run(sweeper.sweep())))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,79 @@
 from fastapi import Depends
-from .oauth import OAuthProvider, OAuthProviders
-from .unit_of_work import AbstractUnitOfWork, SqlAlchemyUnitOfWork
+from .oauth import OAuthProvider, providers
+from . import unit_of_work
+from .unit_of_work import AbstractAsyncUnitOfWork, AsyncSqlAlchemyUnitOfWork
 from .exceptions import OAuthError
+from .token_cache import get_token_cache
 from ..domain import model
+from ..entrypoints import config
 
-from typing import Annotated
+from typing import Annotated, Callable, Optional
 from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 def get_provider(provider) -> OAuthProvider:
-    if not provider in OAuthProviders:
-        raise OAuthError("Unknown provider name")
-    return OAuthProviders[provider]()
+    """Shared provider instance, OAuthError for unknown name"""
+    return providers.get(provider)
 
 
-def get_uow() -> AbstractUnitOfWork:
-    return SqlAlchemyUnitOfWork()
+def get_uow() -> AbstractAsyncUnitOfWork:
+    return AsyncSqlAlchemyUnitOfWork()
+
+
+def get_uow_factory() -> Callable[[], AbstractAsyncUnitOfWork]:
+    """Units of work for concurrent message bus: one per event handler"""
+    return get_uow
+
+
+def get_read_only_uow() -> AbstractAsyncUnitOfWork:
+    """Unit of work for lookups that change nothing:
+    read isolation level (database/engine section), e.g. READ COMMITTED"""
+    return AsyncSqlAlchemyUnitOfWork(isolation_level=config.get_read_isolation_level())
+
+
+async def get_token_by_code(
+    code: str,
+    uow: AbstractAsyncUnitOfWork = Depends(get_read_only_uow),
+) -> Optional[str]:
+    """Access token of authorization the code was recieved for,
+    None while it's requested in background (outbox)"""
+    async with unit_of_work.as_async(uow) as uow:
+        auth = await uow.authorizations.get(grant_code=code)
+        if not auth:
+            raise OAuthError("No active authorization found")
+        token = auth.get_active_token()
+        return token.access_token if token else None
 
 
 async def get_user_info(
-    token: str = Depends(oauth2_scheme), uow: AbstractUnitOfWork = Depends(get_uow)
+    token: str = Depends(oauth2_scheme),
+    uow: AbstractAsyncUnitOfWork = Depends(get_read_only_uow),
 ):
-    with uow:
-        auth = uow.authorizations.get(token=token)
+    token_cache = get_token_cache()
+    cached = await token_cache.lookup(token)
+    if cached:
+        return cached.user_info
+
+    generation = token_cache.generation
+    async with unit_of_work.as_async(uow) as uow:
+        auth = await uow.authorizations.get(token=token)
+        if not auth:
+            raise OAuthError("No active authorization found")
+        access_token = auth.get_token(token)
+        if not access_token or not access_token.is_valid:
+            raise OAuthError("Token is invalid")
+        if auth.mark_used():
+            # tokens of authorizations in use are refreshed in advance
+            await uow.commit()
         name = auth.provider
+        token_expires_at = access_token.created + access_token.expires_in
+        id_token = access_token.id_token
 
     p = get_provider(provider=name)
-    p.access_token = token
-    return await p.get_user_info()
+    user_info = await p.get_user_info(access_token=token, id_token=id_token)
+    await token_cache.store(
+        token, name, user_info, token_expires_at, generation=generation
+    )
+    return user_info
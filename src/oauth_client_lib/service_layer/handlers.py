@@ -2,29 +2,35 @@
 
 Команды и события генерируются в точках входа, см. /entrypoints
 """
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
 from urllib.parse import urlencode
 
-from .oauth import OAuthProviders
+from .oauth import providers
 
 from ..entrypoints import config
 
 from ..domain import commands, events, model
 from . import exceptions, unit_of_work
+from .single_flight import get_token_request_lock, token_requests
+from .token_cache import get_token_cache
 
 
 async def create_authorization(
-    cmd: commands.CreateAuthorization, uow: unit_of_work.AbstractUnitOfWork
+    cmd: commands.CreateAuthorization, uow: unit_of_work.UnitOfWork
 ) -> str:
-    with uow:
+    async with unit_of_work.as_async(uow) as uow:
         state = model.State()
         auth = model.Authorization(state=state, provider_name=cmd.provider.name)
         uow.authorizations.add(auth)
-        uow.commit()
+        await uow.commit()
         return state.state
 
 
 async def auth_code_recieved(
-    evt: events.AuthCodeRecieved, uow: unit_of_work.AbstractUnitOfWork
+    evt: events.AuthCodeRecieved, uow: unit_of_work.UnitOfWork
 ):
     """Process authorization code recieved
 
@@ -37,8 +43,8 @@ async def auth_code_recieved(
     At the end, handler appends command
     for the Authorization: 'Now go and get your token!'
     """
-    with uow:
-        auth = uow.authorizations.get(state_code=evt.state_code)
+    async with unit_of_work.as_async(uow) as uow:
+        auth = await uow.authorizations.get(state_code=evt.state_code, for_update=True)
         if not auth:
             raise exceptions.InvalidState("State is invalid")
         state = auth.state
@@ -47,59 +53,191 @@ async def auth_code_recieved(
         if not state.is_active:
             # if we are, then invoke authorization
             auth.deactivate()
-            uow.commit()
+            await uow.commit()
             raise exceptions.InactiveState("State is inactive")
         state.deactivate()
 
         # Authorization code is a grant to request token
         grant = model.Grant(grant_type="authorization_code", code=evt.grant_code)
         auth.grants.append(grant)
-        uow.commit()
         # Now, authorization must get access token using the auth code
+        # (appended before commit: it may be saved to outbox along with grant)
         auth.events.append(
             commands.RequestToken(grant_code=grant.code),
         )
+        await uow.commit()
         return grant.code
 
 
 async def request_token(
-    cmd: commands.RequestToken, uow: unit_of_work.AbstractUnitOfWork
+    cmd: commands.RequestToken, uow: unit_of_work.UnitOfWork
 ):
-    """Request token from OAuth2 provider"""
-    with uow:
-        auth = uow.authorizations.get(grant_code=cmd.grant_code, token=cmd.token)
+    """Request token from OAuth2 provider
+
+    Concurrent requests for the same grant (or token) are coalesced:
+    only one exchange is made, every caller gets its access token"""
+    key = f"token:{cmd.token}" if cmd.token else f"grant:{cmd.grant_code}"
+    return await token_requests.do(
+        key, lambda: _request_token_exclusively(cmd, uow, key)
+    )
+
+
+async def _request_token_exclusively(
+    cmd: commands.RequestToken, uow: unit_of_work.UnitOfWork, key: str
+):
+    """Other processes' requests for the grant are waited for, if lock is configured.
+    Token they've got while we were waiting is taken instead of a new exchange"""
+    lock = get_token_request_lock(key)
+    if not lock:
+        return await _request_token(cmd, uow)
+    started = datetime.utcnow()
+    async with lock.held(wait=True):
+        access_token = await _get_token_issued_since(cmd, uow, started)
+        return access_token or await _request_token(cmd, uow)
+
+
+async def _get_token_issued_since(
+    cmd: commands.RequestToken, uow: unit_of_work.UnitOfWork, since: datetime
+):
+    async with unit_of_work.as_async(uow) as uow:
+        auth = await uow.authorizations.get(
+            grant_code=cmd.grant_code, token=cmd.token, for_update=True
+        )
+        token = auth.get_active_token() if auth else None
+        if token and token.created >= since:
+            return token.access_token
+
+
+async def _request_token(cmd: commands.RequestToken, uow: unit_of_work.UnitOfWork):
+    async with unit_of_work.as_async(uow) as uow:
+        auth = await uow.authorizations.get(
+            grant_code=cmd.grant_code, token=cmd.token, for_update=True
+        )
         if not auth:
             raise exceptions.OAuthError("No active authorization found")
 
         old_grant = auth.get_active_grant()
         if not old_grant:
             raise exceptions.InvalidGrant("No active grant for token request")
-        old_grant.deactivate()
 
         old_token = auth.get_active_token()
         if old_token:
-            old_token.deactivate()
+            auth.deactivate_token(old_token)
 
         # We could pass custom oauth for test purposes
-        if cmd.provider:
-            p = cmd.provider
-        else:
-            p = OAuthProviders[auth.provider]()
+        p = cmd.provider or providers.get(auth.provider)
         result = await p.request_token(grant=old_grant)
         if not result:
             raise exceptions.OAuthError("Couldn't request token")
 
-        new_token = model.Token(**result)
-        auth.tokens.append(new_token)
+        new_token = _add_token(auth, old_grant, result)
+        await uow.commit()
+        return new_token.access_token
+
 
-        if "refresh_token" in result:
-            new_grant = model.Grant(
-                grant_type="refresh_token", code=result["refresh_token"]
-            )
-            auth.grants.append(new_grant)
+def _add_token(
+    auth: model.Authorization, old_grant: model.Grant, result: dict
+) -> model.Token:
+    new_token = model.Token(**result)
+    auth.tokens.append(new_token)
 
-        uow.commit()
-        return new_token.access_token
+    # refresh token stays valid, unless provider rotates it
+    if old_grant.grant_type != "refresh_token" or "refresh_token" in result:
+        old_grant.deactivate()
+    if "refresh_token" in result:
+        new_grant = model.Grant(grant_type="refresh_token", code=result["refresh_token"])
+        auth.grants.append(new_grant)
+    return new_token
+
+
+@dataclass
+class TokenRequestResult:
+    """Result of one of bulk token requests"""
+
+    grant_code: str
+    access_token: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def refresh_tokens(
+    cmd: commands.RefreshTokens, uow: unit_of_work.UnitOfWork
+) -> List[TokenRequestResult]:
+    """Request tokens for many grants
+
+    Failure of one request doesn't affect the others,
+    result is reported for every grant code, in order"""
+    results = {code: TokenRequestResult(code) for code in cmd.grant_codes}
+    spawn = getattr(uow, "spawn", None)
+    # unit of work can't be shared: without spawn() grants go one by one
+    semaphore = asyncio.Semaphore(cmd.concurrency if spawn else 1)
+    codes = list(results)
+    for start in range(0, len(codes), cmd.batch_size):
+        batch = [results[code] for code in codes[start : start + cmd.batch_size]]
+        try:
+            by_authorization = await _group_by_authorization(batch, uow)
+        except Exception as e:  # pylint: disable=broad-except
+            for result in batch:
+                result.error = repr(e)
+            continue
+        await asyncio.gather(
+            *[
+                _refresh_authorization_tokens(
+                    cmd, group, semaphore, spawn() if spawn else uow
+                )
+                for group in by_authorization
+            ]
+        )
+    return [results[code] for code in cmd.grant_codes]
+
+
+async def _group_by_authorization(
+    batch: List[TokenRequestResult], uow: unit_of_work.UnitOfWork
+) -> List[List[TokenRequestResult]]:
+    """One query for the batch: grants of unknown or inactive authorizations
+    are reported at once, the others are grouped by authorization"""
+    async with unit_of_work.as_async(uow) as uow:
+        found = await uow.authorizations.get_by_grants(r.grant_code for r in batch)
+        groups = {}  # type: Dict[int, List[TokenRequestResult]]
+        for result in batch:
+            auth = found.get(result.grant_code)
+            if auth:
+                groups.setdefault(auth.id, []).append(result)
+            else:
+                result.error = "No active authorization found"
+    return list(groups.values())
+
+
+async def _refresh_authorization_tokens(
+    cmd: commands.RefreshTokens,
+    group: List[TokenRequestResult],
+    semaphore: asyncio.Semaphore,
+    uow: unit_of_work.UnitOfWork,
+):
+    """Grants of one authorization one by one: each request replaces its token.
+    Every grant goes the way of RequestToken: coalesced with concurrent
+    requests for it (refresher, other nodes) and saved in its own transaction"""
+    async with semaphore:
+        for result in group:
+            try:
+                result.access_token = await request_token(
+                    commands.RequestToken(
+                        grant_code=result.grant_code, provider=cmd.provider
+                    ),
+                    uow,
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                result.error = repr(e)
+
+
+async def forget_revoked_token(
+    evt: events.AccessTokenRevoked, uow: unit_of_work.UnitOfWork
+):
+    """Revoked token must not be served from cache"""
+    await get_token_cache().forget(evt.access_token)
 
 
 async def get_oauth_uri(state_code):
@@ -2,15 +2,25 @@
 
 Запускает обработку команд и событий
 (Вызывает соответствующие обработчики)
+
+Два режима (секция messagebus в config.yaml):
+- handle - всё по очереди, в одной единице работы;
+- handle_concurrently - обработчики события запускаются параллельно
+  (не больше concurrency одновременно), у каждого своя единица работы,
+  ошибка одного не мешает остальным.
+  Команды по-прежнему выполняются по очереди, результаты - в порядке команд.
 """
 
 # pylint: disable=broad-except
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Callable, Dict, List, Type, Union
+from collections import deque
+from typing import Callable, Deque, Dict, List, Type, Union
 
 from ..domain import commands, events
+from ..entrypoints import config
 from . import handlers, unit_of_work
 
 
@@ -21,19 +31,22 @@ Message = Union[commands.Command, events.Event]
 
 async def handle(
     message: Message,
-    uow: unit_of_work.AbstractUnitOfWork,
+    uow: unit_of_work.UnitOfWork,
+    raise_event_errors: bool = False,
 ):
     """Обработать очередь сообщений
 
     Запускает обработчики для каждого сообщения из очереди
-    в зависимости от типа сообщения
+    в зависимости от типа сообщения.
+    raise_event_errors - ошибка обработчика события пробрасывается
+    (после остальных его обработчиков), иначе только логируется
     """
     results = []
-    queue = [message]
+    queue = deque([message])
     while queue:
-        message = queue.pop(0)
+        message = queue.popleft()
         if isinstance(message, events.Event):
-            await handle_event(message, queue, uow)
+            await handle_event(message, queue, uow, raise_event_errors)
         elif isinstance(message, commands.Command):
             cmd_result = await handle_command(message, queue, uow)
             results.append(cmd_result)
@@ -44,24 +57,31 @@ async def handle(
 
 async def handle_event(
     event: events.Event,
-    queue: List[Message],
-    uow: unit_of_work.AbstractUnitOfWork,
+    queue: Deque[Message],
+    uow: unit_of_work.UnitOfWork,
+    raise_errors: bool = False,
 ):
     """Обработать сообщение с типом Событие (event)"""
+    error = None
     for handler in EVENT_HANDLERS[type(event)]:
         try:
             logger.debug("handling event %s with handler %s", event, handler)
             await handler(event, uow=uow)
-            queue.extend(uow.collect_new_events())
-        except Exception:
+        except Exception as e:
             logger.exception("Exception handling event %s", event)
+            error = error or e
             continue
+        finally:
+            # handler could commit and then fail, e.g. revoke authorization
+            queue.extend(uow.collect_new_events())
+    if raise_errors and error:
+        raise error
 
 
 async def handle_command(
     command: commands.Command,
-    queue: List[Message],
-    uow: unit_of_work.AbstractUnitOfWork,
+    queue: Deque[Message],
+    uow: unit_of_work.UnitOfWork,
 ):
     """Обработать сообщение с типом Команда (command)"""
     logger.debug("handling command %s", command)
@@ -75,15 +95,67 @@ async def handle_command(
         raise
 
 
+async def handle_concurrently(
+    message: Message,
+    uow_factory: Callable[[], unit_of_work.UnitOfWork],
+    concurrency: int = None,
+):
+    """Обработать очередь сообщений, обработчики события - параллельно"""
+    semaphore = asyncio.Semaphore(
+        concurrency or config.get_messagebus_params().get("concurrency", 10)
+    )
+    results = []
+    queue = deque([message])
+    while queue:
+        message = queue.popleft()
+        if isinstance(message, events.Event):
+            await fan_out_event(message, queue, uow_factory, semaphore)
+        elif isinstance(message, commands.Command):
+            cmd_result = await handle_command(message, queue, uow_factory())
+            results.append(cmd_result)
+        else:
+            raise Exception(f"{message} was not an Event or Command")
+    return results
+
+
+async def fan_out_event(
+    event: events.Event,
+    queue: Deque[Message],
+    uow_factory: Callable[[], unit_of_work.UnitOfWork],
+    semaphore: asyncio.Semaphore,
+):
+    """Run event handlers concurrently, each in its own unit of work"""
+
+    async def run(handler) -> List[Message]:
+        uow = uow_factory()
+        async with semaphore:
+            try:
+                logger.debug("handling event %s with handler %s", event, handler)
+                await handler(event, uow=uow)
+            except Exception:
+                logger.exception("Exception handling event %s", event)
+            # handler could commit and then fail, e.g. revoke authorization
+            return list(uow.collect_new_events())
+
+    new_messages = await asyncio.gather(*[run(h) for h in EVENT_HANDLERS[type(event)]])
+    # handlers order, not completion order
+    for messages in new_messages:
+        queue.extend(messages)
+
+
 # events Dict
 EVENT_HANDLERS = {
     events.AuthCodeRecieved: [
         handlers.auth_code_recieved,
     ],
+    events.AccessTokenRevoked: [
+        handlers.forget_revoked_token,
+    ],
 }  # type: Dict[Type[events.Event], List[Callable]]
 
 # commands Dict
 COMMAND_HANDLERS = {
     commands.CreateAuthorization: handlers.create_authorization,
     commands.RequestToken: handlers.request_token,
+    commands.RefreshTokens: handlers.refresh_tokens,
 }  # type: Dict[Type[commands.Command], Callable]
@@ -1,10 +1,41 @@
+"""Провайдеры OAuth
+
+Модули провайдеров импортируются при первом обращении к провайдеру:
+развёртывание только с Яндексом не загружает Google SDK."""
+
 from .provider import OAuthProvider
-from .google import OAuthGoogleProvider
-from .google_api import OAuthGoogleAPIProvider
-from .yandex import OAuthYandexProvider
-
-OAuthProviders = {
-    "google": OAuthGoogleProvider,
-    "google-api": OAuthGoogleAPIProvider,
-    "yandex": OAuthYandexProvider,
+from .registry import ProviderRegistry, import_factory
+from .settings import provider_settings
+from ...entrypoints import config
+
+# built-in providers: name -> "module:class"
+BUILTIN_PROVIDERS = {
+    "google": f"{__name__}.google:OAuthGoogleProvider",
+    "google-api": f"{__name__}.google_api:OAuthGoogleAPIProvider",
+    "yandex": f"{__name__}.yandex:OAuthYandexProvider",
 }
+
+# shared provider instances: built-in ones and plugins, see registry.py
+providers = ProviderRegistry(BUILTIN_PROVIDERS)
+
+
+def compile_settings(names=None):
+    """Create configured providers and compile their settings:
+    unknown provider or invalid config fails here"""
+    names = names or config.get_provider_names()
+    providers.open(names)
+    provider_settings.compile(
+        {name: providers.get(name).required_urls for name in names}
+    )
+
+
+def __getattr__(name):
+    # provider classes are imported on first access
+    classes = {path.rpartition(":")[2]: path for path in BUILTIN_PROVIDERS.values()}
+    if name in classes:
+        return import_factory(classes[name])
+    if name == "OAuthProviders":
+        return {
+            provider: import_factory(path) for provider, path in BUILTIN_PROVIDERS.items()
+        }
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
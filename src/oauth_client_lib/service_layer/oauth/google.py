@@ -1,69 +1,45 @@
 from .provider import OAuthProvider
 from . import schemas
-
-import google.oauth2.credentials
-import google_auth_oauthlib.flow
-import google
-from googleapiclient.discovery import build
-from googleapiclient import errors
+from .google_client import GoogleClient, google_client as default_google_client
+from .. import exceptions
 
 
 class OAuthGoogleProvider(OAuthProvider):
+    """Google provider
+
+    Authorization URL is built by the cached google_auth_oauthlib flow.
+    Token and userinfo are requested through the pooled async HTTP client,
+    so the event loop never waits for Google"""
+
+    # code and token urls are taken from client secrets
+    required_urls = ("userinfo",)
+
     def __init__(
-        self,
+        self, http_clients=None, secrets=None, google_client: GoogleClient = None
     ):
-        super().__init__("google")
+        super().__init__("google", http_clients=http_clients, secrets=secrets)
+        if not google_client:
+            google_client = GoogleClient(secrets=secrets) if secrets else default_google_client
+        self.google_client = google_client
 
     async def _get_authorization_url(self, state_code):
-        # Use the client_secret.json file to identify the application requesting
-        # authorization. The client ID (from that file) and access scopes are required.
-        flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
-            "client_secret_google.json",
-            scopes=" ".join(self._get_scopes()),
-        )
-
+        # The client ID (from client secrets) and access scopes are required.
         # Indicate where the API server will redirect the user after the user completes
         # the authorization flow. The redirect URI is required. The value must exactly
         # match one of the authorized redirect URIs for the OAuth 2.0 client, which you
         # configured in the API Console. If this value doesn't match an authorized URI,
         # you will get a 'redirect_uri_mismatch' error.
-        flow.redirect_uri = self._get_oauth_callback_URL()
-
-        # Generate URL for request to Google's OAuth 2.0 server.
-        # Use kwargs to set optional request parameters.
-        authorization_url, state = flow.authorization_url(
-            # Enable offline access so that you can refresh an access token without
-            # re-prompting the user for permission. Recommended for web server apps.
-            access_type="offline",
-            # Enable incremental authorization. Recommended as a best practice.
-            include_granted_scopes="true",
+        return self.google_client.get_authorization_url(
+            scopes=self._get_scopes(),
+            redirect_uri=self._get_oauth_callback_URL(),
             state=state_code,
         )
-        return authorization_url
 
-    async def request_token(self, grant):
-        flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
-            "client_secret_google.json",
-            scopes=" ".join(self._get_scopes()),
-        )
-        flow.redirect_uri = self._get_oauth_callback_URL()
-        token = flow.fetch_token(code=grant.code)
-        return token
-
-    async def _get_user_info(self):
-        credentials = google.oauth2.credentials.Credentials(token=self.access_token)
-        user_info_service = build(
-            serviceName="oauth2", version="v2", credentials=credentials
-        )
-        user_info = None
-        try:
-            user_info = user_info_service.userinfo().get().execute()
-        except errors.HttpError as e:
-            # logging.error('An error occurred: %s', e)
-            assert 1 == 2, "Google API: couldn't request user info"
+    def _get_token_url(self):
+        return self.google_client.get_token_uri()
 
-        if user_info and user_info.get("id"):
-            return schemas.UserInfo(**user_info)
-        else:
-            raise Exception("No user id")
-        # return await super()._get_user_info()
+    async def _get_user_info(self, access_token):
+        user_info = await super()._get_user_info(access_token)
+        if not user_info or not user_info.get("id"):
+            raise exceptions.OAuthError("Google API: couldn't request user info")
+        return schemas.UserInfo(**user_info)
@@ -2,5 +2,5 @@ from .provider import OAuthProvider
 
 
 class OAuthGoogleAPIProvider(OAuthProvider):
-    def __init__(self):
-        super().__init__("google-api")
+    def __init__(self, http_clients=None):
+        super().__init__("google-api", http_clients=http_clients)
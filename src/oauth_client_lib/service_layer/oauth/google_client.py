@@ -0,0 +1,93 @@
+"""Кэшированный клиент Google
+
+Flow (google_auth_oauthlib) строится один раз на процесс,
+а не на каждый запрос: секреты берутся из хранилища секретов.
+
+Токен и userinfo запрашиваются асинхронно, через пул HTTP-клиентов,
+см. OAuthGoogleProvider"""
+
+import threading
+from typing import List
+
+import google_auth_oauthlib.flow
+
+from ...adapters import secrets_store
+
+# Used when secrets are provided by environment, without client_secret_google.json
+AUTH_URI = "https://accounts.google.com/o/oauth2/auth"
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+
+class GoogleClient:
+    """Reusable Google flow
+
+    Shared by all requests: the flow is used read-only
+    (state is passed explicitly, no PKCE verifier is kept in it),
+    so it is rebuilt only when the secrets, scopes or redirect URI change.
+    """
+
+    def __init__(
+        self,
+        provider: str = "google",
+        secrets: secrets_store.OAuthSecretsStore = None,
+    ):
+        self.provider = provider
+        self.secrets = secrets or secrets_store.oauth_secrets
+        self._lock = threading.Lock()
+        self._flow = None
+        self._flow_key = None
+
+    def get_client_config(self) -> dict:
+        client_config = {"auth_uri": AUTH_URI, "token_uri": TOKEN_URI}
+        client_config.update(self.secrets.get_client_config(self.provider))
+        return {"web": client_config}
+
+    def get_flow(
+        self, scopes: List[str], redirect_uri: str
+    ) -> google_auth_oauthlib.flow.Flow:
+        """Shared flow, do not store per-request data in it"""
+        # compared by value: secrets could return a new dict every call
+        client_config = self.secrets.get_client_config(self.provider)
+        key = (tuple(scopes), redirect_uri)
+        if not self._is_flow_actual(client_config, key):
+            with self._lock:
+                if not self._is_flow_actual(client_config, key):
+                    self._flow = self.new_flow(scopes, redirect_uri)
+                    self._flow_key = (dict(client_config), key)
+        return self._flow
+
+    def _is_flow_actual(self, client_config: dict, key: tuple) -> bool:
+        if self._flow_key is None:
+            return False
+        flow_client_config, flow_key = self._flow_key
+        return flow_client_config == client_config and flow_key == key
+
+    def get_token_uri(self) -> str:
+        return self.get_client_config()["web"]["token_uri"]
+
+    def new_flow(
+        self, scopes: List[str], redirect_uri: str
+    ) -> google_auth_oauthlib.flow.Flow:
+        return google_auth_oauthlib.flow.Flow.from_client_config(
+            self.get_client_config(),
+            scopes=scopes,
+            redirect_uri=redirect_uri,
+            autogenerate_code_verifier=False,
+        )
+
+    def get_authorization_url(
+        self, scopes: List[str], redirect_uri: str, state: str
+    ) -> str:
+        flow = self.get_flow(scopes, redirect_uri)
+        authorization_url, _ = flow.authorization_url(
+            # Enable offline access so that you can refresh an access token without
+            # re-prompting the user for permission. Recommended for web server apps.
+            access_type="offline",
+            # Enable incremental authorization. Recommended as a best practice.
+            include_granted_scopes="true",
+            state=state,
+        )
+        return authorization_url
+
+
+google_client = GoogleClient()
@@ -0,0 +1,92 @@
+"""Проверка id_token без обращения к провайдеру
+
+id_token (OpenID Connect), полученный вместе с токеном доступа,
+проверяется локально: подпись - ключом из кэша JWKS (см. adapters/jwks.py),
+утверждения - iss (issuers провайдера), aud (client_id), exp, iat,
+at_hash (id_token выдан вместе с этим токеном доступа).
+
+Личность пользователя (email) берётся из проверенного id_token,
+userinfo провайдера не запрашивается.
+Проверка включается адресом urls/public_keys провайдера в config.yaml,
+параметры - секция id_token провайдера."""
+
+import asyncio
+from typing import Callable, Optional
+
+import aiohttp
+from jose import jwt
+from jose.exceptions import JOSEError
+
+from ...adapters.jwks import JWKSCache, jwks_cache
+from ...entrypoints import config
+from ..exceptions import OAuthError
+from ..resilience import ResiliencePolicies, TransientHTTPError, resilience_policies
+
+# asymmetric only: token's own "alg" header is never trusted beyond this list
+ALGORITHMS = ["RS256", "RS384", "RS512", "ES256", "ES384"]
+
+
+class IdTokenVerifier:
+    def __init__(
+        self,
+        jwks: JWKSCache = None,
+        get_params: Callable[[str], dict] = config.get_id_token_params,
+        policies: ResiliencePolicies = None,
+    ):
+        """policies - public keys are fetched through provider's policy"""
+        self.jwks = jwks or jwks_cache
+        self._get_params = get_params
+        self.policies = policies or resilience_policies
+
+    def supports(self, provider: str) -> bool:
+        return bool(self._get_params(provider).get("public_keys"))
+
+    async def verify(
+        self,
+        provider: str,
+        id_token: str,
+        audience: str,
+        access_token: Optional[str] = None,
+    ) -> dict:
+        """Claims of genuine id_token, OAuthError otherwise
+
+        audience - client_id, access_token - checked against at_hash claim"""
+        params = self._get_params(provider)
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except JOSEError as e:
+            raise OAuthError("id_token is malformed") from e
+        algorithm = header.get("alg")
+        if algorithm not in ALGORITHMS:
+            raise OAuthError("id_token algorithm is not allowed")
+        try:
+            key = await self.jwks.get_key(
+                params["public_keys"],
+                header.get("kid"),
+                call=self.policies.get(provider).call,
+            )
+        except (
+            OAuthError,
+            asyncio.TimeoutError,
+            aiohttp.ClientError,
+            TransientHTTPError,
+            ValueError,
+        ) as e:
+            raise OAuthError(f"{provider} public keys are unavailable") from e
+        if key is None:
+            raise OAuthError("id_token is signed by unknown key")
+        try:
+            return jwt.decode(
+                id_token,
+                key,
+                algorithms=[algorithm],
+                audience=audience,
+                issuer=params.get("issuers"),
+                access_token=access_token,
+                options={"leeway": params.get("leeway", 0)},
+            )
+        except JOSEError as e:
+            raise OAuthError(f"id_token is invalid: {e}") from e
+
+
+id_token_verifier = IdTokenVerifier()
@@ -1,30 +1,108 @@
-from urllib.parse import urlencode
+import logging
+from typing import List
+from urllib.parse import quote_plus, urlencode
 
 import aiohttp
-import aiofiles
-import json
 
-from ...entrypoints.config import get_oauth_callback_URL
+from ...adapters import http_client, secrets_store
 from ...service_layer import exceptions
-from ...entrypoints import config
+from ...service_layer.resilience import (
+    ResiliencePolicies,
+    ResiliencePolicy,
+    raise_for_transient_status,
+    resilience_policies,
+)
 from . import schemas
+from .id_token import IdTokenVerifier, id_token_verifier
+from .settings import ProviderSettings, get_authorization_url_prefix, provider_settings
 from ...domain import model
 
+logger = logging.getLogger(__name__)
+
 
 class OAuthProvider:
-    def __init__(self, name, access_token=None):
+    """Provider settings are taken from config.yaml (compiled once, see settings.py),
+    or given as is: settings object, or code_url, scopes... along with client_id
+    and client_secret (provider made in code, e.g. in tests)
+
+    Instance keeps no per-request state: it's shared, see registry.py.
+    access_token is kept for compatibility, pass it to the calls instead"""
+
+    # urls the provider can't do without
+    required_urls = ("code", "token", "userinfo")
+
+    def __init__(
+        self,
+        name,
+        access_token=None,
+        http_clients: http_client.HTTPClientPool = None,
+        secrets: secrets_store.OAuthSecretsStore = None,
+        policies: ResiliencePolicies = None,
+        id_tokens: IdTokenVerifier = None,
+        settings: ProviderSettings = None,
+        *,
+        code_url: str = None,
+        scopes: List[str] = None,
+        token_url: str = None,
+        userinfo_url: str = None,
+        public_keys_url: str = None,
+        client_id: str = None,
+        client_secret: str = None,
+    ):
         self.name = name
         self.access_token = access_token
+        self.http_clients = http_clients or http_client.http_clients
+        if client_id or client_secret:
+            secrets = secrets_store.StaticSecrets(client_id, client_secret)
+        self.secrets = secrets or secrets_store.oauth_secrets
+        self.policies = policies or resilience_policies
+        self.id_tokens = id_tokens or id_token_verifier
+        if scopes is not None and settings is None:
+            urls = dict(
+                code=code_url,
+                token=token_url,
+                userinfo=userinfo_url,
+                public_keys=public_keys_url,
+            )
+            settings = ProviderSettings.create(name, scopes, urls)
+        self._settings = settings
+
+    @property
+    def settings(self) -> ProviderSettings:
+        if self._settings is None:
+            self._settings = provider_settings.get(self.name, self.required_urls)
+        return self._settings
+
+    @property
+    def scopes(self) -> List[str]:
+        return list(self.settings.scopes)
+
+    @property
+    def code_url(self) -> str:
+        return self.settings.code_url
+
+    @property
+    def token_url(self) -> str:
+        return self.settings.token_url
+
+    @property
+    def userinfo_url(self) -> str:
+        return self.settings.userinfo_url
+
+    @property
+    def public_keys_url(self) -> str:
+        return self.settings.public_keys_url
+
+    @property
+    def http_session(self) -> aiohttp.ClientSession:
+        return self.http_clients.get_session(self.name)
 
-    def _get_provider_params(self):
-        scopes, urls = config.get_oauth_params(self.name)
-        return scopes, urls
+    @property
+    def resilience(self) -> ResiliencePolicy:
+        return self.policies.get(self.name)
 
     async def _get_oauth_secrets(self):
-        async with aiofiles.open(f"client_secret_{self.name}.json") as f:
-            content = await f.read()
-        secrets = json.loads(content)["web"]
-        return secrets["client_id"], secrets["client_secret"]
+        return self.secrets.get(self.name)
 
     async def get_authorization_url(self, state_code):
         return await self._get_authorization_url(state_code)
@@ -34,8 +112,7 @@ class OAuthProvider:
         return await self._post(url=self._get_token_url(), data=data)
 
     def _get_token_url(self):
-        _, urls = self._get_provider_params()
-        return urls["token"]
+        return self.settings.token_url
 
     async def _get_data_for_token_request(self, grant):
         if grant.grant_type == "authorization_code":
@@ -59,65 +136,104 @@ class OAuthProvider:
         )
         return data
 
-    @staticmethod
-    def _get_oauth_callback_URL():
-        return get_oauth_callback_URL()
+    def _get_oauth_callback_URL(self):
+        return self.settings.callback_url
 
     async def _get_authorization_url(self, state_code):
-        params = {
-            "response_type": "code",
-            "client_id": await self._get_client_id(),
-            "redirect_uri": self._get_oauth_callback_URL(),
-            "scope": " ".join(self._get_scopes()),
-            "state": state_code,
-        }
-        uri = f"{self._get_code_url()}?{urlencode(params,)}"
-        return uri
+        prefix = get_authorization_url_prefix(
+            self._get_code_url(),
+            await self._get_client_id(),
+            self._get_oauth_callback_URL(),
+            self.settings.scope,
+        )
+        return prefix + quote_plus(state_code)
 
     def _get_code_url(self):
-        _, urls = self._get_provider_params()
-        return urls["code"]
+        return self.settings.code_url
 
     async def _get_client_id(self):
         client_id, _ = await self._get_oauth_secrets()
         return client_id
 
     def _get_scopes(self):
-        scopes, _ = self._get_provider_params()
-        return scopes
+        return self.scopes
 
     async def _post(self, url, data) -> aiohttp.ClientResponse.json:
-        return await async_post(url=url, data=data)
-
-    async def get_email(self):
-        return self._get_email()
+        # code is single-use: not retried, unless it wasn't sent at all
+        return await self.resilience.call(
+            lambda: async_post(url=url, data=data, session=self.http_session),
+            idempotent=False,
+        )
 
-    async def get_user_info(self) -> schemas.UserInfo:
-        return await self._get_user_info()
+    async def get_email(self, access_token: str = None):
+        return await self._get_email(access_token or self.access_token)
+
+    async def get_user_info(
+        self, access_token: str = None, id_token: str = None
+    ) -> schemas.UserInfo:
+        """User info from id_token issued along with the access token,
+        if it can be verified locally, otherwise requested from provider
+
+        Credentials are passed per call: one provider instance serves everyone"""
+        access_token = access_token or self.access_token
+        if id_token and self.id_tokens.supports(self.name):
+            try:
+                claims = await self.verify_id_token(id_token, access_token)
+            except exceptions.OAuthError as e:
+                logger.warning("%s id_token is not used: %s", self.name, e.detail)
+            else:
+                # unverified email could be anyone's: ask the provider then
+                if claims.get("email") and claims.get("email_verified") in (
+                    True,
+                    "true",
+                ):
+                    return schemas.UserInfo(email=claims["email"])
+        return await self._get_user_info(access_token)
+
+    async def verify_id_token(self, id_token: str, access_token: str = None) -> dict:
+        """Verified id_token claims, OAuthError if it's not genuine"""
+        return await self.id_tokens.verify(
+            self.name,
+            id_token,
+            audience=await self._get_client_id(),
+            access_token=access_token or self.access_token,
+        )
 
-    async def _get_email(self, token):
-        return await self._get_user_info()["email"]
+    async def _get_email(self, access_token):
+        return (await self._get_user_info(access_token))["email"]
 
-    async def _get_user_info(self):
-        return await async_get(
-            url=self._get_userinfo_url(),
-            headers={"Authorization": f"Bearer {self.access_token}"},
+    async def _get_user_info(self, access_token):
+        return await self.resilience.call(
+            lambda: async_get(
+                url=self._get_userinfo_url(),
+                headers={"Authorization": f"Bearer {access_token}"},
+                session=self.http_session,
+            )
         )
 
     def _get_userinfo_url(self):
-        _, urls = self._get_provider_params()
-        return urls["userinfo"]
-
-
-async def async_get(url, headers={}, params={}) -> aiohttp.ClientResponse:
-    async with aiohttp.ClientSession() as session:
-        if params:
-            url = f"{url}?{urlencode(params)}"
-        async with session.get(url=url, headers=headers) as resp:
-            return await resp.json()
-
-
-async def async_post(url, data) -> aiohttp.ClientResponse.json:
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url=url, data=data) as resp:
-            return await resp.json()
+        return self.settings.userinfo_url
+
+
+async def async_get(
+    url, headers={}, params={}, session: aiohttp.ClientSession = None
+) -> aiohttp.ClientResponse:
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await async_get(url, headers, params, session)
+    if params:
+        url = f"{url}?{urlencode(params)}"
+    async with session.get(url=url, headers=headers) as resp:
+        raise_for_transient_status(resp.status)
+        return await resp.json()
+
+
+async def async_post(
+    url, data, session: aiohttp.ClientSession = None
+) -> aiohttp.ClientResponse.json:
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await async_post(url, data, session)
+    async with session.post(url=url, data=data) as resp:
+        raise_for_transient_status(resp.status)
+        return await resp.json()
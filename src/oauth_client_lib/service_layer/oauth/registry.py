@@ -0,0 +1,124 @@
+"""Реестр провайдеров
+
+Один экземпляр провайдера на имя на всё время жизни процесса:
+пул HTTP-сессий, кэши, лимиты и настройки провайдера переиспользуются.
+Экземпляр не хранит состояния запроса (токен передаётся в вызов),
+поэтому его безопасно делить между одновременными запросами.
+
+Экземпляры создаются при старте приложения (open, см. entrypoints/fastapi_app.py)
+или при первом обращении.
+
+Свои провайдеры подключаются через entry points группы
+"oauth_client_lib.providers": имя - имя провайдера в config.yaml,
+объект - вызываемый без аргументов (например, класс-наследник OAuthProvider),
+возвращающий провайдер. Например, в setup.py пакета-плагина:
+
+    entry_points={
+        "oauth_client_lib.providers": ["github = my_package.github:GitHubProvider"]
+    }"""
+
+import importlib
+import logging
+import threading
+from importlib import metadata
+from typing import Callable, Dict, Iterable, Mapping, Union
+
+from ..exceptions import OAuthError
+from .provider import OAuthProvider
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "oauth_client_lib.providers"
+
+ProviderFactory = Callable[[], OAuthProvider]
+
+
+def import_factory(path: str) -> ProviderFactory:
+    """Factory by its "module:attribute" path"""
+    module, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def load_entry_points(group: str = ENTRY_POINT_GROUP) -> Dict[str, ProviderFactory]:
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        entry_points = entry_points.select(group=group)
+    else:  # python < 3.10
+        entry_points = entry_points.get(group, [])
+    factories = {}
+    for entry_point in entry_points:
+        try:
+            factories[entry_point.name] = entry_point.load()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("couldn't load provider plugin %s", entry_point.name)
+    return factories
+
+
+class ProviderRegistry:
+    def __init__(
+        self,
+        factories: Mapping[str, Union[ProviderFactory, str]] = None,
+        plugins: Callable[[], Dict[str, ProviderFactory]] = load_entry_points,
+    ):
+        """factories - built-in providers by name: factory or its "module:attribute"
+        path (imported on first use), plugins - loads custom ones,
+        they don't override built-in providers"""
+        self._factories = dict(factories or {})
+        self._load_plugins = plugins
+        self._plugins_loaded = False
+        self._instances = {}  # type: Dict[str, OAuthProvider]
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Union[ProviderFactory, str]):
+        """Add or replace provider, its instance is created anew"""
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._factories.pop(name, None)
+            self._instances.pop(name, None)
+
+    def __contains__(self, name: str) -> bool:
+        self._ensure_plugins()
+        return name in self._factories
+
+    def names(self):
+        self._ensure_plugins()
+        return list(self._factories)
+
+    def get(self, name: str) -> OAuthProvider:
+        """Shared provider instance, OAuthError if there is no such provider"""
+        provider = self._instances.get(name)
+        if provider is not None:
+            return provider
+        self._ensure_plugins()
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise OAuthError("Unknown provider name")
+                factory = self._factories[name]
+                if isinstance(factory, str):
+                    factory = import_factory(factory)
+                self._instances[name] = factory()
+            return self._instances[name]
+
+    def open(self, names: Iterable[str]):
+        """Create providers in advance, e.g. on app startup"""
+        for name in names:
+            self.get(name)
+
+    def clear(self):
+        """Forget created instances, e.g. between tests"""
+        with self._lock:
+            self._instances.clear()
+
+    def _ensure_plugins(self):
+        if self._plugins_loaded:
+            return
+        with self._lock:
+            if not self._plugins_loaded:
+                for name, factory in self._load_plugins().items():
+                    self._factories.setdefault(name, factory)
+                self._plugins_loaded = True
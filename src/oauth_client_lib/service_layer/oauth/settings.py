@@ -0,0 +1,120 @@
+"""Настройки провайдеров
+
+Параметры провайдера из config.yaml (scopes, urls) и адрес callback
+собираются один раз, при старте приложения (см. entrypoints/fastapi_app.py),
+в неизменяемый ProviderSettings: запрос их не разбирает заново.
+Ошибка в настройках останавливает старт, а не первый запрос.
+
+Префикс адреса авторизации (всё, кроме state) кодируется один раз
+для client_id и redirect_uri, запрос только дописывает state."""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from urllib.parse import urlencode, urlparse
+
+from ...entrypoints import config
+
+URL_NAMES = ("code", "token", "userinfo", "public_keys")
+
+
+class ProviderConfigError(ValueError):
+    """Provider's section of config.yaml is invalid"""
+
+
+@dataclass(frozen=True)
+class ProviderSettings:
+    name: str
+    scopes: Tuple[str, ...]
+    scope: str  # scopes joined, as sent to provider
+    callback_url: str
+    code_url: Optional[str] = None
+    token_url: Optional[str] = None
+    userinfo_url: Optional[str] = None
+    public_keys_url: Optional[str] = None
+
+    @classmethod
+    def create(
+        cls,
+        name: str,
+        scopes: Sequence[str],
+        urls: Dict[str, Optional[str]],
+        callback_url: str = None,
+        required_urls: Iterable[str] = (),
+    ) -> "ProviderSettings":
+        """Validated settings, ProviderConfigError if they are not"""
+        if not scopes or not all(isinstance(scope, str) for scope in scopes):
+            raise ProviderConfigError(f"{name}: scopes must be a list of strings")
+        urls = urls or {}
+        for url_name in required_urls:
+            if not urls.get(url_name):
+                raise ProviderConfigError(f"{name}: urls/{url_name} is required")
+        for url_name in URL_NAMES:
+            if urls.get(url_name) and not _is_http_url(urls[url_name]):
+                raise ProviderConfigError(f"{name}: urls/{url_name} must be http(s) URL")
+        if callback_url is None:
+            try:
+                callback_url = config.get_oauth_callback_URL()
+            except KeyError as e:
+                raise ProviderConfigError(f"{name}: {e} is not set") from e
+        return cls(
+            name=name,
+            scopes=tuple(scopes),
+            scope=" ".join(scopes),
+            callback_url=callback_url,
+            **{f"{url_name}_url": urls.get(url_name) for url_name in URL_NAMES},
+        )
+
+    @classmethod
+    def from_config(cls, name: str, required_urls: Iterable[str] = ()):
+        providers = config.get_config()["oauth"]["providers"]
+        if name not in providers:
+            raise ProviderConfigError(f"{name}: no oauth/providers/{name} section")
+        params = providers[name] or {}
+        return cls.create(
+            name, params.get("scopes"), params.get("urls"), required_urls=required_urls
+        )
+
+
+def _is_http_url(url: str) -> bool:
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
+
+
+@lru_cache(maxsize=64)
+def get_authorization_url_prefix(
+    code_url: str, client_id: str, redirect_uri: str, scope: str
+) -> str:
+    """Authorization URL up to state value: state is appended as is"""
+    params = {
+        "response_type": "code",
+        "client_id": client_id,
+        "redirect_uri": redirect_uri,
+        "scope": scope,
+    }
+    return f"{code_url}?{urlencode(params)}&state="
+
+
+class ProviderSettingsRegistry:
+    """Settings of configured providers, compiled once"""
+
+    def __init__(self):
+        self._settings = {}  # type: Dict[str, ProviderSettings]
+
+    def get(self, name: str, required_urls: Iterable[str] = ()) -> ProviderSettings:
+        if name not in self._settings:
+            self._settings[name] = ProviderSettings.from_config(name, required_urls)
+        return self._settings[name]
+
+    def compile(self, required_urls: Dict[str, Iterable[str]]):
+        """Compile settings of all providers at once: provider -> its required urls"""
+        self._settings = {
+            name: ProviderSettings.from_config(name, urls)
+            for name, urls in required_urls.items()
+        }
+
+    def clear(self):
+        self._settings.clear()
+
+
+provider_settings = ProviderSettingsRegistry()
@@ -3,19 +3,15 @@ from . import schemas
 
 
 class OAuthYandexProvider(OAuthProvider):
-    def __init__(
-        self,
-    ):
-        super().__init__(
-            "yandex",
-        )
+    def __init__(self, http_clients=None):
+        super().__init__("yandex", http_clients=http_clients)
 
-    async def _get_email(self):
-        return await self._get_user_info()["default_email"]
+    async def _get_email(self, access_token):
+        return (await self._get_user_info(access_token)).email
 
-    async def _get_user_info(self) -> schemas.UserInfo:
+    async def _get_user_info(self, access_token) -> schemas.UserInfo:
         """Parse YandexUserInfo as UserInfo"""
-        userinfo = schemas.YandexUserInfo(**await super()._get_user_info())
+        userinfo = schemas.YandexUserInfo(**await super()._get_user_info(access_token))
         return schemas.UserInfo(email=userinfo.default_email)
 
     async def _post(self, url, data) -> schemas.YandexUserInfo:
@@ -0,0 +1,138 @@
+"""Воркеры транзакционного outbox
+
+Сообщения, сохранённые единицей работы в outbox (см. adapters/outbox.py),
+обрабатываются шиной сообщений в фоне: /callback сохраняет код
+и сразу отвечает (202), токен запрашивается воркером,
+а клиент получает его по коду: GET /oauth/token?code=...
+
+- сообщения захватываются пачкой (SELECT ... FOR UPDATE SKIP LOCKED):
+  воркеры разных процессов и узлов не берут одно и то же сообщение;
+- ошибка - повтор с экспоненциальной задержкой (backoff),
+  после max_attempts попыток сообщение помечается dead;
+- упавший воркер не теряет сообщений: аренда (lease) истекает,
+  и сообщение захватывает другой;
+- метрики: счётчики обработанных, повторённых и мёртвых сообщений,
+  задержка (lag) от записи до обработки, размер и возраст очереди.
+
+Обработка - at least once: обработчик может выполниться повторно,
+если воркер упал после обработки, но до отметки о ней."""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from ..adapters import outbox
+from ..entrypoints import config
+from . import messagebus, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutboxStats:
+    processed: int = 0
+    retried: int = 0
+    dead: int = 0
+    lag: Optional[float] = None  # seconds, of the last processed message
+
+
+class OutboxWorker:
+    def __init__(
+        self,
+        session_factory=None,
+        uow_factory: Callable[[], unit_of_work.UnitOfWork] = None,
+        workers: int = 4,
+        batch_size: int = 10,
+        max_attempts: int = 5,
+        backoff: float = 1,
+        max_backoff: float = 300,
+        lease: float = 60,
+        poll_interval: float = 1,
+    ):
+        """workers - concurrent loops of run_forever,
+        backoff - seconds before the first retry, doubled every attempt,
+        lease - seconds claimed message isn't taken by other workers"""
+        self.session_factory = (
+            session_factory or unit_of_work.get_async_session_factory()
+        )
+        self.uow_factory = uow_factory or (
+            lambda: unit_of_work.AsyncSqlAlchemyUnitOfWork(
+                self.session_factory, outbox_messages=()
+            )
+        )
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.stats = OutboxStats()
+
+    async def run_once(self, now: datetime = None) -> int:
+        """Claim and process a batch, return number of claimed messages"""
+        async with self.session_factory() as session:
+            claimed = await outbox.claim(session, self.batch_size, self.lease, now)
+        for message in claimed:
+            await self._process(message)
+        return len(claimed)
+
+    async def _process(self, message: outbox.OutboxMessage):
+        try:
+            # not through the outbox again: uow_factory's one doesn't use it.
+            # Failed event handler is retried too, not only logged
+            await messagebus.handle(
+                message.message, self.uow_factory(), raise_event_errors=True
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            await self._fail(message, repr(e))
+            return
+        now = datetime.utcnow()
+        async with self.session_factory() as session:
+            await outbox.complete(session, message.id, now)
+        self.stats.processed += 1
+        self.stats.lag = (now - message.created).total_seconds()
+
+    async def _fail(self, message: outbox.OutboxMessage, error: str):
+        async with self.session_factory() as session:
+            if message.attempts >= self.max_attempts:
+                logger.error("outbox message %s is dead: %s", message.id, error)
+                await outbox.bury(session, message.id, error)
+                self.stats.dead += 1
+                return
+            delay = min(self.max_backoff, self.backoff * 2 ** (message.attempts - 1))
+            await outbox.retry(
+                session,
+                message.id,
+                error,
+                available_at=datetime.utcnow() + timedelta(seconds=delay),
+            )
+            self.stats.retried += 1
+
+    async def backlog(self, now: datetime = None):
+        """Pending messages count and age of the oldest one, seconds"""
+        async with self.session_factory() as session:
+            return await outbox.backlog(session, now)
+
+    async def run_forever(self):
+        await asyncio.gather(*[self._loop() for _ in range(self.workers)])
+
+    async def _loop(self):
+        while True:
+            try:
+                claimed = await self.run_once()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("outbox processing failed")
+                claimed = 0
+            if not claimed:
+                await asyncio.sleep(self.poll_interval)
+
+
+def get_outbox_worker(**kwargs) -> OutboxWorker:
+    params = config.get_outbox_params()
+    for key in ("enabled", "messages"):
+        params.pop(key, None)
+    params.update(kwargs)
+    return OutboxWorker(**params)
@@ -0,0 +1,167 @@
+"""Упреждающее обновление токенов
+
+Периодически находит авторизации, у которых активный токен истекает
+в ближайшие window секунд и есть активный refresh-грант,
+и обновляет токен через handlers.request_token заранее,
+не дожидаясь, пока клиент придёт с истёкшим токеном.
+
+Только авторизации, которыми пользовались (last_used, см.
+Authorization.mark_used) в последние max_idle дней, сколько бы лет
+им ни было: каждое обновление выдаёт свежий токен, и брошенная сессия
+иначе жила бы вечно. Неиспользуемые обновляются по требованию
+(клиент пришёл с истёкшим токеном), а брошенные - истекают,
+и их убирает sweeper.
+
+- параллельно не больше concurrency обменов;
+- перед каждым обменом - случайная пауза до jitter секунд,
+  чтобы не обращаться к провайдеру пачкой;
+- у каждого провайдера свой лимит частоты (TokenBucket);
+- работает только ведущий узел: тот, кто захватил leader lock
+  (advisory lock Postgres, см. adapters/locks.py)."""
+
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import func, select
+
+from ..adapters import orm
+from ..adapters.locks import AbstractLock, LocalLock, PostgresAdvisoryLock
+from ..domain import commands
+from ..entrypoints import config
+from . import handlers, unit_of_work
+from .oauth import providers
+from .throttling import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RefreshReport:
+    leader: bool = False
+    due: int = 0
+    refreshed: int = 0
+    failed: int = 0
+
+
+class RefreshScheduler:
+    def __init__(
+        self,
+        uow_factory: Callable[[], unit_of_work.UnitOfWork] = None,
+        session_factory=None,
+        lock: AbstractLock = None,
+        window: float = 300,
+        max_idle: float = 7,
+        interval: float = 60,
+        concurrency: int = 10,
+        jitter: float = 5,
+        batch_size: int = 1000,
+        rate_limits: Dict[str, float] = None,
+        get_provider: Callable = None,
+    ):
+        """window - seconds before expiry a token is refreshed,
+        max_idle - days, authorizations not used longer are not refreshed in advance,
+        rate_limits - provider name (or "default") -> exchanges per second,
+        get_provider - provider by name, shared provider instances by default"""
+        self.session_factory = (
+            session_factory or unit_of_work.get_async_session_factory()
+        )
+        self.uow_factory = uow_factory or (
+            lambda: unit_of_work.AsyncSqlAlchemyUnitOfWork(self.session_factory)
+        )
+        self.lock = lock or LocalLock()
+        self.window = timedelta(seconds=window)
+        self.max_idle = timedelta(days=max_idle)
+        self.interval = interval
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.batch_size = batch_size
+        self.rate_limits = dict(rate_limits or {})
+        self.get_provider = get_provider or providers.get
+        self._buckets = {}  # type: Dict[str, TokenBucket]
+
+    async def find_due(self, now: datetime) -> List[Tuple[str, str]]:
+        """(provider, refresh grant code) of tokens expiring within the window"""
+        query = (
+            select(orm.authorizations.c.provider, orm.grants.c.code)
+            .join(orm.grants, orm.grants.c.auth_id == orm.authorizations.c.id)
+            .join(orm.tokens, orm.tokens.c.auth_id == orm.authorizations.c.id)
+            .where(
+                orm.authorizations.c.is_active,
+                func.coalesce(
+                    orm.authorizations.c.last_used, orm.authorizations.c.created
+                )
+                > now - self.max_idle,
+                orm.grants.c.is_active,
+                orm.grants.c.grant_type == "refresh_token",
+                orm.tokens.c.is_active,
+                orm.tokens.c.expires_at < now + self.window,
+            )
+            # one row per grant, even if stale tokens are still active
+            .group_by(orm.authorizations.c.provider, orm.grants.c.code)
+            .order_by(func.min(orm.tokens.c.expires_at))
+            .limit(self.batch_size)
+        )
+        async with self.session_factory() as session:
+            return [tuple(row) for row in await session.execute(query)]
+
+    async def run_once(self, now: datetime = None) -> RefreshReport:
+        report = RefreshReport()
+        async with self.lock.held() as leader:
+            report.leader = leader
+            if not leader:
+                return report
+            due = await self.find_due(now or datetime.utcnow())
+            report.due = len(due)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            results = await asyncio.gather(
+                *[self._refresh(provider, code, semaphore) for provider, code in due]
+            )
+        report.refreshed = sum(results)
+        report.failed = report.due - report.refreshed
+        logger.info("token refresh done: %s", report)
+        return report
+
+    async def _refresh(self, provider: str, grant_code: str, semaphore) -> bool:
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        async with semaphore:
+            await self._get_bucket(provider).acquire()
+            try:
+                await handlers.request_token(
+                    commands.RequestToken(
+                        grant_code=grant_code, provider=self.get_provider(provider)
+                    ),
+                    self.uow_factory(),
+                )
+                return True
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("couldn't refresh token of %s authorization", provider)
+                return False
+
+    def _get_bucket(self, provider: str) -> TokenBucket:
+        if provider not in self._buckets:
+            rate = self.rate_limits.get(provider, self.rate_limits.get("default", 5))
+            self._buckets[provider] = TokenBucket(rate)
+        return self._buckets[provider]
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("token refresh failed")
+            await asyncio.sleep(self.interval)
+
+
+def get_refresh_scheduler(**kwargs) -> RefreshScheduler:
+    params = config.get_refresher_params()
+    params.pop("enabled", None)
+    if params.pop("leader_lock", "local") == "postgres":
+        params["lock"] = PostgresAdvisoryLock(
+            unit_of_work.get_async_session_factory().kw["bind"], "token_refresher"
+        )
+    params.update(kwargs)
+    return RefreshScheduler(**params)
@@ -0,0 +1,215 @@
+"""Защита от сбоев провайдеров
+
+Вызовы провайдера (обмен гранта на токен, userinfo) проходят через политику
+провайдера (секция resilience в config.yaml, переопределяется
+в oauth/providers/<provider>/resilience):
+- ограничение частоты (TokenBucket) и числа одновременных запросов;
+- таймаут вызова;
+- повторы с decorrelated jitter: только идемпотентные вызовы (userinfo),
+  обмен кода - только если соединение не было установлено;
+- автоматический выключатель (circuit breaker): после failure_threshold
+  сбоев подряд провайдер считается недоступным на reset_timeout секунд,
+  вызовы сразу завершаются OAuthError, не занимая воркеры;
+  затем пропускается один пробный вызов.
+
+Сбой - таймаут, ошибка соединения, ответ 429 или 5xx.
+Состояние и счётчики - ResiliencePolicy.stats()."""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import aiohttp
+
+from ..entrypoints import config
+from .exceptions import OAuthError
+from .throttling import TokenBucket
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class TransientHTTPError(Exception):
+    """Provider is overloaded or failing: 429 or 5xx"""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def raise_for_transient_status(status: int):
+    if status == 429 or status >= 500:
+        raise TransientHTTPError(status)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """failure_threshold - failures in a row to open the circuit,
+        reset_timeout - seconds the circuit stays open before a trial call"""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial = False
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._trial:
+            # the only trial call
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self):
+        self._state = CLOSED
+        self._failures = 0
+
+    def release_trial(self):
+        """Trial call ended with no verdict on provider (cancelled, our bug):
+        let the next call be the trial"""
+        self._trial = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._state = OPEN
+            self._opened_at = self._clock()
+
+
+class ResiliencePolicy:
+    """Rate limit, concurrency limit, timeout, retries and circuit breaker
+    of one provider"""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float = None,
+        burst: float = None,
+        max_in_flight: int = None,
+        timeout: float = None,
+        retries: int = 0,
+        backoff: float = 0.1,
+        max_backoff: float = 2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+    ):
+        """rate - calls per second (burst - up to), none - unlimited,
+        max_in_flight - calls at once, none - unlimited,
+        timeout - seconds per attempt,
+        retries - extra attempts of idempotent calls,
+        backoff, max_backoff - seconds, bounds of delay between attempts"""
+        self.name = name
+        self.bucket = TokenBucket(rate, burst, clock=clock, sleep=sleep) if rate else None
+        self.semaphore = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock)
+        self._sleep = sleep
+        self.in_flight = 0
+        self.counters = dict(calls=0, failures=0, retries=0, rejected=0)
+
+    async def call(self, call: Callable[[], Awaitable[T]], idempotent: bool = True) -> T:
+        """Make provider call, retry it if it's safe
+
+        OAuthError if the circuit is open or the call failed"""
+        delay = self.backoff
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.counters["rejected"] += 1
+                raise OAuthError(f"{self.name} is unavailable, try again later")
+            try:
+                result = await self._attempt(call)
+            except (asyncio.TimeoutError, aiohttp.ClientError, TransientHTTPError) as e:
+                self.counters["failures"] += 1
+                self.breaker.record_failure()
+                if attempt >= self.retries or not _is_retryable(e, idempotent):
+                    raise OAuthError(f"{self.name} request failed: {e!r}") from e
+            except BaseException:
+                # cancelled or failed on our side: the breaker must not
+                # wait forever for the outcome of its trial call
+                self.breaker.release_trial()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            attempt += 1
+            self.counters["retries"] += 1
+            # decorrelated jitter
+            delay = min(self.max_backoff, random.uniform(self.backoff, delay * 3))
+            await self._sleep(delay)
+
+    async def _attempt(self, call: Callable[[], Awaitable[T]]) -> T:
+        if self.bucket:
+            await self.bucket.acquire()
+        if self.semaphore:
+            await self.semaphore.acquire()
+        self.in_flight += 1
+        self.counters["calls"] += 1
+        try:
+            return await asyncio.wait_for(call(), self.timeout)
+        finally:
+            self.in_flight -= 1
+            if self.semaphore:
+                self.semaphore.release()
+
+    def stats(self) -> Dict[str, object]:
+        return dict(
+            self.counters,
+            name=self.name,
+            state=self.breaker.state,
+            in_flight=self.in_flight,
+        )
+
+
+def _is_retryable(error: Exception, idempotent: bool) -> bool:
+    # request didn't reach provider: safe to repeat anything
+    return idempotent or isinstance(error, aiohttp.ClientConnectorError)
+
+
+class ResiliencePolicies:
+    """Policy per provider, created on first use"""
+
+    def __init__(
+        self, get_params: Callable[[str], dict] = config.get_resilience_params
+    ):
+        self._get_params = get_params
+        self._policies = {}  # type: Dict[str, ResiliencePolicy]
+
+    def get(self, provider: str) -> ResiliencePolicy:
+        if provider not in self._policies:
+            self._policies[provider] = ResiliencePolicy(
+                provider, **self._get_params(provider)
+            )
+        return self._policies[provider]
+
+    def stats(self, provider: Optional[str] = None):
+        """One provider's stats, or all of them by provider name"""
+        if provider:
+            return self.get(provider).stats()
+        return {name: policy.stats() for name, policy in self._policies.items()}
+
+
+resilience_policies = ResiliencePolicies()
@@ -0,0 +1,53 @@
+"""Объединение одновременных запросов
+
+Если один и тот же запрос (по ключу) уже выполняется,
+новый не запускается: вызывающий ждёт и получает результат выполняющегося.
+Например, обмен refresh-токена: провайдер получает один запрос,
+а не по одному от каждого клиента, заметившего истёкший токен.
+
+В пределах процесса. Между процессами запросы разделяет блокировка
+(advisory lock Postgres, секция database/token_request_lock в config.yaml)."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from ..adapters.locks import AbstractLock, PostgresAdvisoryLock
+from ..entrypoints import config
+from . import unit_of_work
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}  # type: Dict[Hashable, asyncio.Task]
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls and not self._calls[key].done()
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable]) -> Any:
+        """Run call, or wait for the one already running with the same key
+
+        The call runs in its own task: cancelled caller, the one that
+        started it included, stops waiting, the others still get the result"""
+        if not self.in_flight(key):
+            task = asyncio.ensure_future(call())
+            # nobody waits: don't warn about never retrieved exception
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self._calls[key] = task
+        return await asyncio.shield(self._calls[key])
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+
+token_requests = SingleFlight()
+
+
+def get_token_request_lock(key: str) -> Optional[AbstractLock]:
+    """Cross-process lock for the token request, if configured"""
+    if config.get_token_request_lock() == "postgres":
+        return PostgresAdvisoryLock(
+            unit_of_work.get_async_session_factory().kw["bind"], key
+        )
+    return None
@@ -0,0 +1,160 @@
+"""Обслуживание таблиц авторизаций
+
+Периодически (задача asyncio в lifespan FastAPI или CLI, см. entrypoints/sweeper.py):
+- деактивирует истёкшие токены и брошенные авторизации
+  (обмен кода на токен так и не состоялся) - одним UPDATE на таблицу;
+- удаляет неактивные строки старше срока хранения (retention) пачками,
+  каждая пачка - отдельная короткая транзакция, долгих блокировок нет.
+
+Строки удаляются, а не архивируются: в них только одноразовые коды и токены."""
+
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, exists, select, update
+
+from ..adapters import orm
+from ..entrypoints import config
+from . import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SweepReport:
+    expired_tokens: int = 0
+    abandoned_authorizations: int = 0
+    purged_tokens: int = 0
+    purged_grants: int = 0
+    purged_authorizations: int = 0
+
+
+class Sweeper:
+    def __init__(
+        self,
+        session_factory=None,
+        state_ttl: float = 600,
+        retention: float = 30,
+        batch_size: int = 1000,
+        interval: float = 300,
+    ):
+        """state_ttl - seconds user has to come back with authorization code,
+        retention - days inactive rows are kept,
+        interval - seconds between sweeps (run_forever)"""
+        self.session_factory = (
+            session_factory or unit_of_work.get_async_session_factory()
+        )
+        self.state_ttl = timedelta(seconds=state_ttl)
+        self.retention = timedelta(days=retention)
+        self.batch_size = batch_size
+        self.interval = interval
+
+    async def sweep(self, now: datetime = None) -> SweepReport:
+        now = now or datetime.utcnow()
+        report = SweepReport()
+        report.expired_tokens, report.abandoned_authorizations = (
+            await self.deactivate_expired(now)
+        )
+        await self.purge(now - self.retention, report)
+        logger.info("sweep done: %s", asdict(report))
+        return report
+
+    async def deactivate_expired(self, now: datetime):
+        async with self.session_factory() as session:
+            expired_tokens = await session.execute(
+                update(orm.tokens)
+                .where(orm.tokens.c.is_active, orm.tokens.c.expires_at < now)
+                .values(is_active=False)
+            )
+            # code exchange never completed: no token, nothing to get one with.
+            # Used grants are purged, so they can't tell anything
+            abandoned = and_(
+                orm.authorizations.c.is_active,
+                orm.authorizations.c.created < now - self.state_ttl,
+                ~exists().where(orm.tokens.c.auth_id == orm.authorizations.c.id),
+                ~exists().where(
+                    orm.grants.c.auth_id == orm.authorizations.c.id,
+                    orm.grants.c.grant_type == "refresh_token",
+                    orm.grants.c.is_active,
+                ),
+            )
+            abandoned_ids = select(orm.authorizations.c.id).where(abandoned)
+            await session.execute(
+                update(orm.states)
+                .where(orm.states.c.is_active, orm.states.c.auth_id.in_(abandoned_ids))
+                .values(is_active=False)
+            )
+            abandoned_authorizations = await session.execute(
+                update(orm.authorizations).where(abandoned).values(is_active=False)
+            )
+            await session.commit()
+        return expired_tokens.rowcount, abandoned_authorizations.rowcount
+
+    async def purge(self, before: datetime, report: SweepReport):
+        """Delete inactive rows created before the date"""
+        for table, counter in [
+            (orm.tokens, "purged_tokens"),
+            (orm.grants, "purged_grants"),
+        ]:
+            inactive = select(table.c.id).where(
+                ~table.c.is_active, table.c.created < before
+            )
+            while True:
+                deleted = await self._delete_batch(table, table.c.id, inactive)
+                setattr(report, counter, getattr(report, counter) + deleted)
+                if deleted < self.batch_size:
+                    break
+
+        while True:
+            deleted = await self._purge_authorizations_batch(before)
+            report.purged_authorizations += deleted
+            if deleted < self.batch_size:
+                break
+
+    async def _delete_batch(self, table, column, ids) -> int:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                delete(table).where(column.in_(ids.limit(self.batch_size)))
+            )
+            await session.commit()
+        return result.rowcount
+
+    async def _purge_authorizations_batch(self, before: datetime) -> int:
+        """Inactive authorizations along with their states, grants and tokens"""
+        async with self.session_factory() as session:
+            ids = (
+                await session.scalars(
+                    select(orm.authorizations.c.id)
+                    .where(
+                        ~orm.authorizations.c.is_active,
+                        orm.authorizations.c.created < before,
+                    )
+                    .limit(self.batch_size)
+                )
+            ).all()
+            if not ids:
+                return 0
+            for table in (orm.states, orm.grants, orm.tokens):
+                await session.execute(delete(table).where(table.c.auth_id.in_(ids)))
+            await session.execute(
+                delete(orm.authorizations).where(orm.authorizations.c.id.in_(ids))
+            )
+            await session.commit()
+        return len(ids)
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("sweep failed")
+            await asyncio.sleep(self.interval)
+
+
+def get_sweeper(**kwargs) -> Sweeper:
+    params = config.get_sweeper_params()
+    params.pop("enabled", None)
+    params.update(kwargs)
+    return Sweeper(**params)
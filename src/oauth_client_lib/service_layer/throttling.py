@@ -0,0 +1,40 @@
+"""Ограничение частоты запросов к провайдерам"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+
+class TokenBucket:
+    """rate requests per second on average, bursts up to capacity"""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+    ):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        """Wait for a token"""
+        while not self.try_acquire():
+            await self._sleep((1 - self._tokens) / self.rate)
@@ -0,0 +1,204 @@
+"""Кэш bearer-токенов для /userinfo
+
+Ключ - SHA-256 токена доступа, значение - провайдер авторизации и UserInfo.
+Запись живёт не дольше самого токена (Token.created + expires_in)
+и не дольше ttl из config.yaml (секция cache/userinfo).
+Запись сбрасывается, когда токен отзывается:
+авторизация деактивирована или токен заменён новым
+(событие AccessTokenRevoked, см. handlers.forget_revoked_token).
+
+Если задан общий кэш (OAUTH_CACHE_URL, см. adapters/cache.py),
+записи хранятся и в нём: lookup/store/forget;
+отозванный токен закрывается надгробием на tombstone_ttl секунд,
+чтобы запись, прочитанная до отзыва, не вернулась в общий кэш.
+Тогда в памяти процесса запись живёт не дольше local_ttl,
+отзыв токена на другом узле виден здесь не позже чем через local_ttl."""
+
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from ..adapters.cache import (
+    TOMBSTONE,
+    AbstractCache,
+    bury,
+    get_shared_cache,
+    make_key,
+)
+from ..adapters.hashing import lookup_key
+from ..entrypoints import config
+
+
+@dataclass
+class CachedUserInfo:
+    provider: str
+    user_info: Any
+    expires_at: float
+
+
+class TokenCache:
+    """In-process TTL/LRU cache, optionally backed by shared cache"""
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        ttl: float = 300,
+        local_ttl: float = 5,
+        shared: AbstractCache = None,
+        tombstone_ttl: float = 10,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.shared = shared
+        self.tombstone_ttl = tombstone_ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # type: OrderedDict[bytes, CachedUserInfo]
+        # changed on every invalidation: lookups started before it are not cached
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+
+    def get(self, access_token: str) -> Optional[CachedUserInfo]:
+        key = lookup_key(access_token)
+        entry = self._entries.get(key)
+        if entry and entry.expires_at <= self._clock():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(
+        self,
+        access_token: str,
+        provider: str,
+        user_info: Any,
+        token_expires_at: datetime,
+        generation: int = None,
+    ):
+        """Cache user info until the token expires (but not longer than ttl)
+
+        generation - the cache generation taken before the token was looked up:
+        if any token was revoked since then, the result is not cached"""
+        if generation is not None and generation != self.generation:
+            return
+        expires_in = (token_expires_at - datetime.utcnow()).total_seconds()
+        self._set_local(lookup_key(access_token), provider, user_info, expires_in)
+
+    def _set_local(self, key: bytes, provider: str, user_info: Any, expires_in: float):
+        if expires_in <= 0:
+            return
+        ttl = min(self.ttl, self.local_ttl) if self.shared else self.ttl
+        self._entries[key] = CachedUserInfo(
+            provider=provider,
+            user_info=user_info,
+            expires_at=self._clock() + min(expires_in, ttl),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def lookup(self, access_token: str) -> Optional[CachedUserInfo]:
+        """get, then the shared cache"""
+        entry = self.get(access_token)
+        if entry or not self.shared:
+            return entry
+        cached = await self.shared.get(make_key("userinfo", access_token))
+        if not cached or cached == TOMBSTONE:
+            return None
+        cached = json.loads(cached)
+        key = lookup_key(access_token)
+        self._set_local(
+            key,
+            cached["provider"],
+            cached["user_info"],
+            cached["expires_at"] - time.time(),
+        )
+        entry = self._entries.get(key)
+        if entry:
+            self.shared_hits += 1
+        return entry
+
+    async def store(
+        self,
+        access_token: str,
+        provider: str,
+        user_info: Any,
+        token_expires_at: datetime,
+        generation: int = None,
+    ):
+        """set, and the shared cache"""
+        self.set(access_token, provider, user_info, token_expires_at, generation)
+        if not self.shared or generation not in (None, self.generation):
+            return
+        expires_in = (token_expires_at - datetime.utcnow()).total_seconds()
+        if expires_in <= 0:
+            return
+        cached = {
+            "provider": provider,
+            "user_info": jsonable_encoder(user_info),
+            "expires_at": time.time() + expires_in,
+        }
+        # not over the tombstone of the token revoked meanwhile
+        await self.shared.add(
+            make_key("userinfo", access_token),
+            json.dumps(cached),
+            min(expires_in, self.ttl),
+        )
+
+    async def forget(self, access_token: str):
+        """invalidate, and the shared cache"""
+        self.invalidate(access_token)
+        if self.shared:
+            await bury(
+                self.shared, [make_key("userinfo", access_token)], self.tombstone_ttl
+            )
+
+    def invalidate(self, access_token: str):
+        self.generation += 1
+        self._entries.pop(lookup_key(access_token), None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_hits": self.shared_hits,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+
+_token_cache = {}
+
+
+def get_token_cache() -> TokenCache:
+    """Default cache, created on first use from cache/userinfo section"""
+    if "cache" not in _token_cache:
+        _token_cache["cache"] = TokenCache(
+            shared=get_shared_cache(), **config.get_cache_params("userinfo")
+        )
+    return _token_cache["cache"]
+
+
+def __getattr__(name):
+    # module attribute kept for compatibility
+    if name == "token_cache":
+        return get_token_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,12 +3,22 @@ from __future__ import annotations
 
 import abc
 
-from sqlalchemy import create_engine
+from typing import Dict, Iterable, List, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.session import Session
 
 from ..entrypoints import config
-from ..adapters import repository
+from ..adapters import database, orm, outbox, repository
+from ..adapters.cache import AbstractCache, get_shared_cache
+from ..adapters.cached_repository import CachedRepository
+from ..adapters.state_store import (
+    SignedStateStore,
+    StateStore,
+    StateStoreRepository,
+    get_default_state_store,
+)
 
 
 class AbstractUnitOfWork(abc.ABC):
@@ -19,12 +29,18 @@ class AbstractUnitOfWork(abc.ABC):
 
     def __exit__(self, *args):
         self.rollback()
+        _discard_uncommitted_events(self)
 
     def commit(self):
         self._commit()
+        _keep_committed_events(self)
 
     def collect_new_events(self):
-        for obj in self.authorizations.seen:
+        # not entered, e.g. failed to: nothing is seen
+        authorizations = getattr(self, "authorizations", None)
+        if authorizations is None:
+            return
+        for obj in authorizations.seen:
             while obj.events:
                 yield obj.events.pop(0)
 
@@ -37,21 +53,88 @@ class AbstractUnitOfWork(abc.ABC):
         raise NotImplementedError
 
 
-DEFAULT_SESSION_FACTORY = sessionmaker(
-    bind=create_engine(
-        config.get_postgres_uri(),
-        isolation_level="REPEATABLE READ",
-    )
-)
+def _keep_committed_events(uow):
+    """Events of committed changes are handled after the unit of work is over"""
+    uow._committed_events = {
+        id(event) for obj in uow.authorizations.seen for event in obj.events
+    }
+
+
+def _discard_uncommitted_events(uow):
+    """Changes are rolled back, events appended along with them are dropped:
+    e.g. RequestToken of a grant that wasn't saved"""
+    committed = getattr(uow, "_committed_events", set())
+    for obj in uow.authorizations.seen:
+        obj.events[:] = [event for event in obj.events if id(event) in committed]
+    uow._committed_events = set()
+
+
+_session_factories = {}
+
+
+def get_session_factory() -> sessionmaker:
+    """Default session factory, the engine is created on first use"""
+    if "sync" not in _session_factories:
+        orm.start_mappers()
+        _session_factories["sync"] = sessionmaker(
+            bind=database.create_engine(
+                config.get_postgres_uri(), config.get_engine_params()
+            ),
+            # aggregate is used after commit: no reload SELECTs
+            expire_on_commit=False,
+        )
+    return _session_factories["sync"]
+
+
+def get_pool_stats() -> Dict[str, dict]:
+    """Connection pool metrics of default engines created so far:
+    sync, async -> see adapters/database.py"""
+    stats = {}
+    for name, session_factory in _session_factories.items():
+        metrics = database.get_pool_metrics(session_factory.kw["bind"].pool)
+        if metrics:
+            stats[name] = metrics.stats()
+    return stats
+
+
+_isolated_session_factories = {}
+
+
+def isolated_session_factory(session_factory, isolation_level: str = None):
+    """Session factory bound to the same engine (and pool) with isolation_level:
+    it applies when the session checks out a connection, on its first query,
+    so a unit of work that isn't queried doesn't take a connection"""
+    if not isolation_level:
+        return session_factory
+    key = (session_factory, isolation_level)
+    if key not in _isolated_session_factories:
+        kw = dict(session_factory.kw)
+        kw["bind"] = kw["bind"].execution_options(isolation_level=isolation_level)
+        _isolated_session_factories[key] = type(session_factory)(
+            class_=session_factory.class_, **kw
+        )
+    return _isolated_session_factories[key]
 
 
 class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
-    def __init__(self, session_factory=DEFAULT_SESSION_FACTORY):
-        self.session_factory = session_factory
+    def __init__(
+        self, session_factory=None, load_strategy=None, isolation_level: str = None
+    ):
+        """isolation_level - of this unit of work's transaction,
+        engine's one by default"""
+        self.session_factory = session_factory or get_session_factory()
+        self.load_strategy = load_strategy
+        self.isolation_level = isolation_level
 
     def __enter__(self):
-        self.session = self.session_factory()  # type: Session
-        self.authorizations = repository.SQLAlchemyRepository(self.session)
+        # the model is mapped for sessions of any factory, not only the default one
+        orm.start_mappers()
+        self.session = isolated_session_factory(
+            self.session_factory, self.isolation_level
+        )()  # type: Session
+        self.authorizations = repository.SQLAlchemyRepository(
+            self.session, self.load_strategy
+        )
         return super().__enter__()
 
     def __exit__(self, *args):
@@ -63,3 +146,182 @@ class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
 
     def rollback(self):
         self.session.rollback()
+
+
+class AbstractAsyncUnitOfWork(abc.ABC):
+    authorizations: repository.AbstractAsyncRepository
+
+    async def __aenter__(self) -> AbstractAsyncUnitOfWork:
+        return self
+
+    async def __aexit__(self, *args):
+        await self.rollback()
+        _discard_uncommitted_events(self)
+
+    async def commit(self):
+        await self.authorizations.flush()
+        await self._commit()
+        _keep_committed_events(self)
+        await self.authorizations.committed()
+
+    def collect_new_events(self):
+        # not entered, e.g. failed to: nothing is seen
+        authorizations = getattr(self, "authorizations", None)
+        if authorizations is None:
+            return
+        for obj in authorizations.seen:
+            while obj.events:
+                yield obj.events.pop(0)
+
+    @abc.abstractmethod
+    async def _commit(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def rollback(self):
+        raise NotImplementedError
+
+
+class SyncUnitOfWorkAdapter(AbstractAsyncUnitOfWork):
+    """Run sync unit of work through async interface of handlers"""
+
+    def __init__(self, uow: AbstractUnitOfWork):
+        self.uow = uow
+
+    async def __aenter__(self):
+        self.uow.__enter__()
+        self.authorizations = repository.SyncRepositoryAdapter(self.uow.authorizations)
+        return await super().__aenter__()
+
+    async def __aexit__(self, *args):
+        self.uow.__exit__(*args)
+
+    async def _commit(self):
+        self.uow.commit()
+
+    async def rollback(self):
+        self.uow.rollback()
+
+
+UnitOfWork = Union[AbstractUnitOfWork, AbstractAsyncUnitOfWork]
+
+
+def as_async(uow: UnitOfWork) -> AbstractAsyncUnitOfWork:
+    """Handlers await unit of work: wrap sync one if provided"""
+    if hasattr(uow, "__aenter__"):
+        return uow
+    return SyncUnitOfWorkAdapter(uow)
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    """Default async session factory, the engine is created on first use"""
+    if "async" not in _session_factories:
+        orm.start_mappers()
+        _session_factories["async"] = async_sessionmaker(
+            bind=database.create_async_engine(
+                config.get_postgres_async_uri(), config.get_engine_params()
+            ),
+            # aggregate is used after commit: no lazy refresh in async session
+            expire_on_commit=False,
+        )
+    return _session_factories["async"]
+
+
+def __getattr__(name):
+    # module attributes kept for compatibility, engines are created on access
+    if name == "DEFAULT_SESSION_FACTORY":
+        return get_session_factory()
+    if name == "DEFAULT_ASYNC_SESSION_FACTORY":
+        return get_async_session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class AsyncSqlAlchemyUnitOfWork(AbstractAsyncUnitOfWork):
+    def __init__(
+        self,
+        session_factory=None,
+        load_strategy=None,
+        cache: AbstractCache = None,
+        state_store: Union[StateStore, SignedStateStore] = None,
+        outbox_messages: Iterable[str] = None,
+        isolation_level: str = None,
+    ):
+        """cache - shared cache for authorization lookups,
+        state_store - store for authorizations waiting for code,
+        by default both are set by OAUTH_CACHE_URL (if any),
+        outbox_messages - names of messages saved to outbox on commit
+        instead of being handled, outbox section of config by default,
+        isolation_level - of this unit of work's transaction,
+        engine's one by default"""
+        self.session_factory = session_factory or get_async_session_factory()
+        self.load_strategy = load_strategy
+        self.cache = cache or get_shared_cache()
+        self.state_store = state_store or get_default_state_store()
+        self.outbox_messages = frozenset(
+            config.get_outbox_messages() if outbox_messages is None else outbox_messages
+        )
+        self.isolation_level = isolation_level
+        self._spawned = []  # type: List[AsyncSqlAlchemyUnitOfWork]
+
+    def spawn(self) -> AsyncSqlAlchemyUnitOfWork:
+        """Unit of work with the same params and its own session,
+        for work running concurrently with this one.
+        Its new events are collected by this unit of work"""
+        uow = AsyncSqlAlchemyUnitOfWork(
+            self.session_factory,
+            self.load_strategy,
+            self.cache,
+            self.state_store,
+            self.outbox_messages,
+            self.isolation_level,
+        )
+        self._spawned.append(uow)
+        return uow
+
+    def collect_new_events(self):
+        yield from super().collect_new_events()
+        for uow in self._spawned:
+            yield from uow.collect_new_events()
+
+    async def __aenter__(self):
+        # the model is mapped for sessions of any factory, not only the default one
+        orm.start_mappers()
+        self.session = isolated_session_factory(
+            self.session_factory, self.isolation_level
+        )()  # type: AsyncSession
+        self.authorizations = repository.AsyncSQLAlchemyRepository(
+            self.session, self.load_strategy
+        )
+        if self.cache:
+            self.authorizations = CachedRepository(
+                self.authorizations,
+                self.cache,
+                **config.get_cache_params("authorizations"),
+            )
+        if self.state_store:
+            self.authorizations = StateStoreRepository(
+                self.authorizations, self.state_store
+            )
+        return await super().__aenter__()
+
+    async def __aexit__(self, *args):
+        await super().__aexit__(*args)
+        await self.session.close()
+
+    async def _commit(self):
+        if self.outbox_messages:
+            # same transaction: message is saved if and only if aggregate is
+            await outbox.add(self.session, self._take_outbox_messages())
+        await self.session.commit()
+
+    def _take_outbox_messages(self):
+        messages = []
+        for auth in self.authorizations.seen:
+            for message in list(auth.events):
+                if type(message).__name__ in self.outbox_messages:
+                    auth.events.remove(message)
+                    messages.append(message)
+        return messages
+
+    async def rollback(self):
+        await self.session.rollback()
@@ -45,3 +45,27 @@ async def test_oauth_callback_happy(
 
     assert r.ok
     assert r.json() == {"access_token": "test_access_token_for_grant_auth_code"}
+
+
+@pytest.mark.asyncio
+async def test_token_is_polled_by_code(
+    auth_wStateGrantToken: model.Authorization, uow: AbstractUnitOfWork, client
+):
+    uow.authorizations.add(auth_wStateGrantToken)
+    r = client.get("http://testserver/oauth/token?code=auth_code")
+
+    assert r.status_code == 200
+    assert r.json() == {"access_token": "test_access_token_for_grant_auth_code"}
+
+
+@pytest.mark.asyncio
+async def test_token_requested_in_background_is_pending(
+    auth_wStateGrant: model.Authorization, uow: AbstractUnitOfWork, client
+):
+    """Outbox worker hasn't requested the token yet"""
+    uow.authorizations.add(auth_wStateGrant)
+    r = client.get("http://testserver/oauth/token?code=auth_code")
+
+    assert r.status_code == 202
+    assert r.headers["Location"].endswith("/oauth/token?code=auth_code")
+    assert r.json()["location"] == r.headers["Location"]
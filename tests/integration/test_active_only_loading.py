@@ -0,0 +1,63 @@
+"""Only active grants and active unexpired tokens are loaded with the aggregate"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from oauth_client_lib.domain import model
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+ALL_JOINED = {"state": "joined", "grants": "joined", "tokens": "joined"}
+
+
+def token_history(refresh_cycles):
+    """Authorization refreshed many times: one active token, the rest is history"""
+    now = datetime.utcnow()
+    tokens = [
+        model.Token(f"old_{i}", is_active=False, created=now - timedelta(hours=i))
+        for i in range(refresh_cycles)
+    ]
+    tokens.append(model.Token("expired", created=now - timedelta(hours=2)))
+    tokens.append(model.Token("current"))
+    grants = [
+        model.Grant("refresh_token", f"old_refresh_{i}", is_active=False)
+        for i in range(refresh_cycles)
+    ]
+    grants.append(model.Grant("refresh_token", "refresh"))
+    return model.Authorization(
+        state=model.State("state_code"), grants=grants, tokens=tokens
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("load_strategy", [None, ALL_JOINED], ids=["default", "joined"])
+async def test_history_is_not_loaded(async_session_factory, load_strategy):
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory, load_strategy)
+    async with uow:
+        uow.authorizations.add(token_history(refresh_cycles=100))
+        await uow.commit()
+
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory, load_strategy)
+    async with uow:
+        auth = await uow.authorizations.get(grant_code="refresh")
+
+        assert [token.access_token for token in auth.tokens] == ["current"]
+        assert [grant.code for grant in auth.grants] == ["refresh"]
+        assert auth.get_active_token().access_token == "current"
+
+
+@pytest.mark.asyncio
+async def test_expires_at_is_stored(async_session_factory):
+    created = datetime(2026, 10, 18, 12, 0)
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        uow.authorizations.add(
+            model.Authorization(
+                state=model.State(),
+                tokens=[model.Token("token", expires_in=60, created=created)],
+            )
+        )
+        await uow.commit()
+
+    async with async_session_factory() as session:
+        token = await session.get(model.Token, 1)
+        assert token.expires_at == created + timedelta(seconds=60)
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from oauth_client_lib.domain import commands
+from oauth_client_lib.service_layer import handlers, messagebus
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_refreshed_in_bulk_with_report(
+    async_session_factory, fake_provider, authorization, add_authorizations
+):
+    await add_authorizations(
+        *[authorization(f"code{i}") for i in range(5)],
+        authorization("inactive", is_active=False),
+    )
+    provider = fake_provider
+    provider.failing = {"code3"}
+    statements = []
+    engine = async_session_factory.kw["bind"].sync_engine
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        [report] = await messagebus.handle(
+            commands.RefreshTokens(
+                grant_codes=[f"code{i}" for i in range(5)] + ["inactive", "unknown"],
+                provider=provider,
+                batch_size=4,
+            ),
+            AsyncSqlAlchemyUnitOfWork(async_session_factory),
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert [(r.grant_code, r.ok) for r in report] == [
+        ("code0", True),
+        ("code1", True),
+        ("code2", True),
+        ("code3", False),
+        ("code4", True),
+        ("inactive", False),
+        ("unknown", False),
+    ]
+    assert report[0].access_token == "test_access_token_for_grant_code0"
+    assert "provider is down" in report[3].error
+    assert report[6].error == "No active authorization found"
+    # a lookup per batch, then every found grant is loaded for its own transaction
+    loads = [s for s in statements if s.lstrip().startswith("SELECT authorizations")]
+    assert len([s for s in loads if " IN (" in s]) == 2
+    assert len(loads) == 2 + 5
+
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        auth = await uow.authorizations.get(grant_code="next_code1")
+        token = auth.get_active_token()
+        assert token.access_token == "test_access_token_for_grant_code1"
+        # failed one keeps its grant and token
+        auth = await uow.authorizations.get(grant_code="code3")
+        assert auth.get_active_token().access_token == "token_code3"
+
+
+@pytest.mark.asyncio
+async def test_bulk_refresh_is_coalesced_with_token_request(
+    async_session_factory, fake_provider, authorization, add_authorizations
+):
+    await add_authorizations(authorization("code0"))
+    provider = fake_provider
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+
+    [report], access_token = await asyncio.gather(
+        messagebus.handle(
+            commands.RefreshTokens(grant_codes=["code0"], provider=provider), uow
+        ),
+        handlers.request_token(
+            commands.RequestToken(grant_code="code0", provider=provider),
+            uow.spawn(),
+        ),
+    )
+
+    assert provider.grants == ["code0"]
+    assert report[0].access_token == access_token
+    assert access_token == "test_access_token_for_grant_code0"
@@ -0,0 +1,152 @@
+"""Authorization lookups through the shared cache (see adapters/cache.py)"""
+import pytest
+from sqlalchemy import update
+
+from oauth_client_lib.adapters import cached_repository, orm
+from oauth_client_lib.adapters.cache import TOMBSTONE, InMemoryCache, make_key
+from oauth_client_lib.domain import model
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+
+@pytest.fixture
+def cache(clock):
+    return InMemoryCache(clock=clock)
+
+
+@pytest.fixture
+def uow(async_session_factory, cache):
+    return lambda: AsyncSqlAlchemyUnitOfWork(async_session_factory, cache=cache)
+
+
+async def add_authorization(uow, access_token="access_token"):
+    auth = model.Authorization(
+        state=model.State("state_code"),
+        grants=[model.Grant("authorization_code", "auth_code")],
+        tokens=[model.Token(access_token)],
+        provider_name="google",
+    )
+    async with uow() as u:
+        u.authorizations.add(auth)
+        await u.commit()
+
+
+def test_snapshot_keeps_aggregate():
+    auth = model.Authorization(
+        state=model.State("state_code"),
+        grants=[model.Grant("authorization_code", "auth_code")],
+        tokens=[model.Token("access_token", expires_in=60)],
+        provider_name="google",
+    )
+
+    restored = cached_repository.loads(cached_repository.dumps(auth))
+
+    assert restored.provider == "google"
+    assert restored.state.state == "state_code"
+    assert restored.get_active_grant().code == "auth_code"
+    token = restored.get_token("access_token")
+    assert token.expires_in == auth.tokens[0].expires_in
+    assert token.created == auth.tokens[0].created
+    assert token.is_valid
+
+
+@pytest.mark.asyncio
+async def test_authorization_found_by_token_is_served_from_cache(uow, selects, clock):
+    await add_authorization(uow)
+    # just added: not cached while the tombstone lives
+    clock.now += 10
+
+    async with uow() as u:
+        assert await u.authorizations.get(token="access_token")
+    selects.clear()
+
+    async with uow() as u:
+        auth = await u.authorizations.get(token="access_token")
+        assert auth.provider == "google"
+        assert auth.get_active_token().access_token == "access_token"
+    assert selects == []
+
+
+@pytest.mark.asyncio
+async def test_cached_authorization_is_attached_and_invalidated_on_commit(
+    uow, cache, clock
+):
+    await add_authorization(uow)
+    clock.now += 10
+    async with uow() as u:
+        await u.authorizations.get(token="access_token")
+
+    async with uow() as u:
+        auth = await u.authorizations.get(token="access_token")
+        auth.deactivate()
+        await u.commit()
+    assert await cache.get(make_key("auth:token", "access_token")) == TOMBSTONE
+
+    async with uow() as u:
+        assert await u.authorizations.get(token="access_token") is None
+        assert await u.authorizations.get(state_code="state_code") is None
+
+
+@pytest.mark.asyncio
+async def test_missing_authorization_is_remembered_until_commit(uow, selects):
+    async with uow() as u:
+        assert await u.authorizations.get(token="access_token") is None
+        assert await u.authorizations.get(grant_code="auth_code") is None
+    selects.clear()
+
+    async with uow() as u:
+        assert await u.authorizations.get(token="access_token") is None
+        assert await u.authorizations.get(grant_code="auth_code") is None
+    assert selects == []
+
+    await add_authorization(uow)
+    async with uow() as u:
+        assert await u.authorizations.get(token="access_token")
+        assert await u.authorizations.get(grant_code="auth_code")
+
+
+@pytest.mark.asyncio
+async def test_snapshot_read_before_commit_isnt_cached(uow, cache, clock):
+    await add_authorization(uow)
+    clock.now += 10
+
+    async with uow() as reader:
+        lookup = reader.authorizations.repository._get_by_token
+
+        async def read_then_other_worker_deactivates(token):
+            auth = await lookup(token)
+            async with uow() as writer:
+                (await writer.authorizations.get(token=token)).deactivate()
+                await writer.commit()
+            return auth
+
+        reader.authorizations.repository._get_by_token = (
+            read_then_other_worker_deactivates
+        )
+        assert await reader.authorizations.get(token="access_token")
+
+    # the stale active snapshot didn't take the tombstone's place
+    assert await cache.get(make_key("auth:token", "access_token")) == TOMBSTONE
+    clock.now += 10
+    async with uow() as u:
+        assert await u.authorizations.get(token="access_token") is None
+
+
+@pytest.mark.asyncio
+async def test_authorization_to_be_changed_is_read_from_database(
+    uow, async_session_factory, clock
+):
+    await add_authorization(uow)
+    clock.now += 10
+    async with uow() as u:
+        assert await u.authorizations.get(token="access_token")
+    # changed behind the cache's back: the snapshot is stale
+    async with async_session_factory() as session:
+        await session.execute(update(orm.tokens).values(is_active=False))
+        await session.commit()
+
+    async with uow() as u:
+        cached = await u.authorizations.get(token="access_token")
+        assert cached.get_token("access_token").is_active
+    async with uow() as u:
+        auth = await u.authorizations.get(token="access_token", for_update=True)
+        assert auth.get_token("access_token") is None
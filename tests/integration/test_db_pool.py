@@ -0,0 +1,131 @@
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from oauth_client_lib.adapters import database
+from oauth_client_lib.entrypoints import config
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+
+def test_postgres_engine_options():
+    params = dict(
+        isolation_level="REPEATABLE READ",
+        pool_size=5,
+        max_overflow=0,
+        pool_pre_ping=True,
+        pool_recycle=None,
+        statement_timeout=5000,
+    )
+
+    options = database.engine_options("postgresql+psycopg2://u@host/db", params)
+    async_options = database.engine_options("postgresql+asyncpg://u@host/db", params)
+
+    assert options["isolation_level"] == "REPEATABLE READ"
+    assert options["pool_size"] == 5
+    assert options["max_overflow"] == 0
+    assert options["pool_pre_ping"] is True
+    assert "pool_recycle" not in options
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+    assert async_options["connect_args"] == {
+        "server_settings": {"statement_timeout": "5000"}
+    }
+    assert options["poolclass"].metrics.max_overflow == 0
+
+
+def test_in_memory_sqlite_keeps_its_pool():
+    options = database.engine_options("sqlite://", dict(pool_size=5))
+
+    assert "pool_size" not in options
+    assert "poolclass" not in options
+
+
+def test_pool_metrics(tmp_path):
+    engine = database.create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        dict(pool_size=1, max_overflow=0, pool_timeout=0.05),
+    )
+    metrics = database.get_pool_metrics(engine.pool)
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert metrics.stats()["in_use"] == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    with engine.connect():
+        pass
+
+    stats = metrics.stats()
+    assert stats["checkouts"] == 2
+    assert stats["connects"] == 1
+    assert stats["waits"] == 1
+    assert stats["wait_time"] >= 0.05
+    assert stats["timeouts"] == 1
+    assert stats["in_use"] == 0
+    assert stats["max_in_use"] == 1
+    engine.dispose()
+
+
+def test_pool_metrics_survive_dispose(tmp_path):
+    engine = database.create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    metrics = database.get_pool_metrics(engine.pool)
+    engine.dispose()
+
+    with engine.connect():
+        pass
+
+    assert database.get_pool_metrics(engine.pool) is metrics
+    assert metrics.stats()["checkouts"] == 1
+    assert metrics.stats()["in_use"] == 0
+
+
+def test_engine_params_are_overridden_by_environment(monkeypatch):
+    monkeypatch.setattr(
+        config,
+        "_config",
+        {"database": {"engine": {"pool_size": 10, "pool_pre_ping": False}}},
+    )
+    monkeypatch.setenv("OAUTH_DB_POOL_SIZE", "20")
+    monkeypatch.setenv("OAUTH_DB_POOL_PRE_PING", "True")
+    monkeypatch.setenv("OAUTH_DB_READ_ISOLATION_LEVEL", "READ COMMITTED")
+
+    params = config.get_engine_params()
+
+    assert params["pool_size"] == 20
+    assert params["pool_pre_ping"] is True
+    assert params["isolation_level"] == "REPEATABLE READ"
+    assert config.get_read_isolation_level() == "READ COMMITTED"
+
+
+@pytest.mark.asyncio
+async def test_uow_runs_at_its_own_isolation_level(async_session_factory):
+    uow = AsyncSqlAlchemyUnitOfWork(
+        async_session_factory,
+        cache=None,
+        state_store=None,
+        outbox_messages=[],
+        isolation_level="READ UNCOMMITTED",
+    )
+
+    async with uow:
+        connection = await uow.session.connection()
+        assert await connection.get_isolation_level() == "READ UNCOMMITTED"
+
+
+@pytest.mark.asyncio
+async def test_uow_takes_no_connection_until_queried(tmp_path, async_session_factory):
+    engine = database.create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}")
+    metrics = database.get_pool_metrics(engine.pool)
+    uow = AsyncSqlAlchemyUnitOfWork(
+        async_sessionmaker(bind=engine),
+        cache=None,
+        state_store=None,
+        outbox_messages=[],
+        isolation_level="READ UNCOMMITTED",
+    )
+
+    async with uow:
+        assert metrics.stats()["checkouts"] == 0
+        connection = await uow.session.connection()
+        assert await connection.get_isolation_level() == "READ UNCOMMITTED"
+    assert metrics.stats()["checkouts"] == 1
+    await engine.dispose()
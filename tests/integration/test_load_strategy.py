@@ -0,0 +1,49 @@
+"""Handlers make a known number of SELECTs: the aggregate is loaded
+by load strategy and nothing is lazy-loaded or reloaded after commit"""
+
+import pytest
+
+from oauth_client_lib.domain import commands, events
+from oauth_client_lib.service_layer import handlers
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+ALL_JOINED = {"state": "joined", "grants": "joined", "tokens": "joined"}
+ALL_SELECTIN = {"state": "selectin", "grants": "selectin", "tokens": "selectin"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "load_strategy, selects_per_lookup",
+    [(None, 3), (ALL_JOINED, 1), (ALL_SELECTIN, 4)],
+    ids=["default", "joined", "selectin"],
+)
+async def test_select_count_per_handler(
+    async_session_factory, selects, fake_provider, load_strategy, selects_per_lookup
+):
+    def uow():
+        return AsyncSqlAlchemyUnitOfWork(async_session_factory, load_strategy)
+
+    state_code = await handlers.create_authorization(
+        commands.CreateAuthorization(source_url="origin", provider=fake_provider),
+        uow(),
+    )
+    assert len(selects) == 0
+
+    await handlers.auth_code_recieved(
+        events.AuthCodeRecieved(state_code=state_code, grant_code="auth_code"), uow()
+    )
+    assert len(selects) == selects_per_lookup
+
+    selects.clear()
+    access_token = await handlers.request_token(
+        commands.RequestToken(grant_code="auth_code", provider=fake_provider), uow()
+    )
+    assert access_token == "test_access_token_for_grant_auth_code"
+    assert len(selects) == selects_per_lookup
+
+    selects.clear()
+    await handlers.request_token(
+        commands.RequestToken(grant_code="next_auth_code", provider=fake_provider),
+        uow(),
+    )
+    assert len(selects) == selects_per_lookup
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from oauth_client_lib.adapters import outbox
+from oauth_client_lib.domain import events, model
+from oauth_client_lib.service_layer import messagebus, oauth
+from oauth_client_lib.service_layer.outbox import OutboxWorker
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+
+@pytest.fixture
+def provider(fake_provider):
+    oauth.providers.register("fake_provider", lambda: fake_provider)
+    yield fake_provider
+    oauth.providers.unregister("fake_provider")
+
+
+@pytest.fixture
+def worker(async_session_factory):
+    return OutboxWorker(async_session_factory, max_attempts=2, backoff=60)
+
+
+def make_uow(async_session_factory):
+    return AsyncSqlAlchemyUnitOfWork(
+        async_session_factory, outbox_messages=["RequestToken"]
+    )
+
+
+async def start_authorization(async_session_factory):
+    uow = make_uow(async_session_factory)
+    async with uow:
+        uow.authorizations.add(
+            model.Authorization(
+                state=model.State("state_code"), provider_name="fake_provider"
+            )
+        )
+        await uow.commit()
+
+
+async def callback(async_session_factory):
+    return await messagebus.handle(
+        events.AuthCodeRecieved(state_code="state_code", grant_code="code"),
+        make_uow(async_session_factory),
+    )
+
+
+async def outbox_rows(async_session_factory):
+    async with async_session_factory() as session:
+        return [
+            tuple(row)
+            for row in await session.execute(
+                text("SELECT message_type, status, attempts FROM outbox")
+            )
+        ]
+
+
+async def get_active_token(async_session_factory):
+    uow = make_uow(async_session_factory)
+    async with uow:
+        auth = await uow.authorizations.get(grant_code="code")
+        token = auth.get_active_token()
+        return token.access_token if token else None
+
+
+@pytest.mark.asyncio
+async def test_token_request_is_saved_to_outbox_with_the_grant(
+    async_session_factory, provider
+):
+    await start_authorization(async_session_factory)
+
+    assert await callback(async_session_factory) == []
+
+    assert await outbox_rows(async_session_factory) == [("RequestToken", "pending", 0)]
+    assert provider.grants == []
+    assert await get_active_token(async_session_factory) is None
+
+
+@pytest.mark.asyncio
+async def test_worker_processes_outbox_message(async_session_factory, provider, worker):
+    await start_authorization(async_session_factory)
+    await callback(async_session_factory)
+
+    assert await worker.run_once() == 1
+
+    assert provider.grants == ["code"]
+    access_token = await get_active_token(async_session_factory)
+    assert access_token == "test_access_token_for_grant_code"
+    assert await outbox_rows(async_session_factory) == [("RequestToken", "done", 1)]
+    assert worker.stats.processed == 1
+    assert await worker.backlog() == (0, None)
+    assert await worker.run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_message_is_retried_after_backoff_then_dead(
+    async_session_factory, provider, worker
+):
+    provider.failures = 2
+    await start_authorization(async_session_factory)
+    await callback(async_session_factory)
+
+    assert await worker.run_once() == 1
+    assert await outbox_rows(async_session_factory) == [("RequestToken", "pending", 1)]
+    assert worker.stats.retried == 1
+    # not before backoff
+    assert await worker.run_once() == 0
+
+    later = datetime.utcnow() + timedelta(seconds=61)
+    assert await worker.run_once(now=later) == 1
+    assert await outbox_rows(async_session_factory) == [("RequestToken", "dead", 2)]
+    assert worker.stats.dead == 1
+    assert provider.grants == []
+
+
+@pytest.mark.asyncio
+async def test_claimed_message_is_not_taken_until_lease_expires(
+    async_session_factory, provider, worker
+):
+    await start_authorization(async_session_factory)
+    await callback(async_session_factory)
+    async with async_session_factory() as session:
+        [claimed] = await outbox.claim(session, limit=10, lease=60)
+    assert claimed.message.grant_code == "code"
+
+    # crashed worker: message is pending, but leased
+    assert await worker.run_once() == 0
+    count, age = await worker.backlog()
+    assert count == 1 and age >= 0
+
+    later = datetime.utcnow() + timedelta(seconds=61)
+    assert await worker.run_once(now=later) == 1
+    assert provider.grants == ["code"]
+
+
+@pytest.mark.asyncio
+async def test_message_whose_event_handler_fails_is_retried(
+    async_session_factory, worker, monkeypatch
+):
+    async def failing_handler(event, uow):
+        raise RuntimeError("handler failed")
+
+    monkeypatch.setitem(
+        messagebus.EVENT_HANDLERS, events.AccessTokenRevoked, [failing_handler]
+    )
+    async with async_session_factory() as session:
+        await outbox.add(session, [events.AccessTokenRevoked("access_token")])
+        await session.commit()
+
+    assert await worker.run_once() == 1
+
+    assert await outbox_rows(async_session_factory) == [
+        ("AccessTokenRevoked", "pending", 1)
+    ]
+    assert worker.stats.retried == 1
+    assert worker.stats.processed == 0
+    async with async_session_factory() as session:
+        [error] = (await session.execute(text("SELECT last_error FROM outbox"))).one()
+    assert "handler failed" in error
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from oauth_client_lib.adapters.locks import LocalLock
+from oauth_client_lib.service_layer import dependencies
+from oauth_client_lib.service_layer.refresher import RefreshScheduler
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+
+@pytest.fixture
+def provider(fake_provider):
+    return fake_provider
+
+
+@pytest.fixture
+def scheduler(async_session_factory, provider):
+    return RefreshScheduler(
+        session_factory=async_session_factory,
+        window=300,
+        jitter=0,
+        rate_limits={"default": 100},
+        get_provider=lambda name: provider,
+    )
+
+
+@pytest.mark.asyncio
+async def test_tokens_expiring_within_window_are_refreshed(
+    scheduler, provider, async_session_factory, authorization, add_authorizations
+):
+    await add_authorizations(
+        authorization("soon", expires_in=60), authorization("later", expires_in=3600)
+    )
+
+    report = await scheduler.run_once()
+
+    assert (report.due, report.refreshed, report.failed) == (1, 1, 0)
+    assert provider.grants == ["soon"]
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        auth = await uow.authorizations.get(grant_code="next_soon")
+        token = auth.get_active_token()
+        assert token.access_token == "test_access_token_for_grant_soon"
+
+    assert (await scheduler.run_once()).due == 0
+
+
+@pytest.mark.asyncio
+async def test_only_leader_refreshes(scheduler, authorization, add_authorizations):
+    lock = LocalLock()
+    scheduler.lock = lock
+    await add_authorizations(authorization("soon", expires_in=60))
+
+    async with lock.held():
+        report = await scheduler.run_once()
+
+    assert not report.leader
+    assert report.due == 0
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_is_kept_if_provider_does_not_rotate_it(
+    scheduler, provider, authorization, add_authorizations
+):
+    async def request_token(grant):
+        provider.grants.append(grant.code)
+        return {"access_token": f"access_token_{len(provider.grants)}", "expires_in": 60}
+
+    provider.request_token = request_token
+    await add_authorizations(authorization("refresh", expires_in=60))
+
+    await scheduler.run_once()
+    await scheduler.run_once()
+
+    assert provider.grants == ["refresh", "refresh"]
+
+
+@pytest.mark.asyncio
+async def test_unused_authorizations_are_not_refreshed_in_advance(
+    scheduler, provider, authorization, add_authorizations
+):
+    scheduler.max_idle = timedelta(days=7)
+    await add_authorizations(
+        authorization(
+            "abandoned", expires_in=60, created=datetime.utcnow() - timedelta(days=8)
+        )
+    )
+
+    report = await scheduler.run_once()
+
+    assert report.due == 0
+    assert provider.grants == []
+
+
+@pytest.mark.asyncio
+async def test_old_authorization_in_use_is_refreshed_in_advance(
+    scheduler,
+    provider,
+    async_session_factory,
+    monkeypatch,
+    authorization,
+    add_authorizations,
+):
+    async def get_user_info(access_token, id_token=None):
+        return {"email": "user@test.com"}
+
+    provider.get_user_info = get_user_info
+    monkeypatch.setattr(dependencies, "get_provider", lambda **kwargs: provider)
+    scheduler.max_idle = timedelta(days=7)
+    await add_authorizations(
+        authorization(
+            "long_lived", expires_in=60, created=datetime.utcnow() - timedelta(days=8)
+        )
+    )
+
+    await dependencies.get_user_info(
+        "token_long_lived", AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    )
+    report = await scheduler.run_once()
+
+    assert report.due == 1
+    assert provider.grants == ["long_lived"]
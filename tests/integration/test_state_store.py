@@ -0,0 +1,103 @@
+"""Authorizations waiting for code are kept in the state store (see adapters/state_store.py)"""
+from types import SimpleNamespace
+
+import time
+
+import pytest
+from sqlalchemy import text
+
+from oauth_client_lib.adapters.cache import InMemoryCache
+from oauth_client_lib.adapters.state_store import SignedStateStore, StateStore
+from oauth_client_lib.domain import commands, events
+from oauth_client_lib.service_layer import exceptions, handlers
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+
+@pytest.fixture
+def clock(clock):
+    # signed state carries its creation time, the model checks it against real time
+    clock.now = time.time()
+    return clock
+
+
+@pytest.fixture(params=["store", "signed", "encrypted"])
+def uow(request, async_session_factory, clock):
+    cache = InMemoryCache(clock=clock)
+    if request.param == "store":
+        store = StateStore(cache, ttl=600)
+    else:
+        encryption_key = "key" if request.param == "encrypted" else None
+        store = SignedStateStore(
+            "secret", cache, ttl=600, encryption_key=encryption_key, clock=clock
+        )
+    return lambda: AsyncSqlAlchemyUnitOfWork(async_session_factory, state_store=store)
+
+
+async def count_rows(async_session_factory, table):
+    async with async_session_factory() as session:
+        return (await session.execute(text(f"SELECT count(*) FROM {table}"))).scalar()
+
+
+async def create_authorization(uow):
+    return await handlers.create_authorization(
+        commands.CreateAuthorization(
+            source_url="origin", provider=SimpleNamespace(name="fake_provider")
+        ),
+        uow(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_authorization_is_saved_only_when_code_arrives(uow, async_session_factory):
+    state_code = await create_authorization(uow)
+    assert await count_rows(async_session_factory, "authorizations") == 0
+    assert await count_rows(async_session_factory, "states") == 0
+
+    await handlers.auth_code_recieved(
+        events.AuthCodeRecieved(state_code=state_code, grant_code="auth_code"), uow()
+    )
+
+    async with uow() as u:
+        auth = await u.authorizations.get(grant_code="auth_code")
+        assert auth.provider == "fake_provider"
+        assert auth.state.state == state_code
+        assert not auth.state.is_active
+
+
+@pytest.mark.asyncio
+async def test_state_replay_deactivates_authorization(uow):
+    state_code = await create_authorization(uow)
+    evt = events.AuthCodeRecieved(state_code=state_code, grant_code="auth_code")
+    await handlers.auth_code_recieved(evt, uow())
+
+    with pytest.raises(exceptions.InactiveState):
+        await handlers.auth_code_recieved(evt, uow())
+
+    async with uow() as u:
+        assert await u.authorizations.get(grant_code="auth_code") is None
+
+
+@pytest.mark.asyncio
+async def test_abandoned_state_expires(uow, clock, async_session_factory):
+    state_code = await create_authorization(uow)
+
+    clock.now += 600
+    with pytest.raises(exceptions.InvalidState):
+        await handlers.auth_code_recieved(
+            events.AuthCodeRecieved(state_code=state_code, grant_code="auth_code"),
+            uow(),
+        )
+    assert await count_rows(async_session_factory, "authorizations") == 0
+
+
+@pytest.mark.asyncio
+async def test_signed_state_is_verified_without_database(async_session_factory, clock):
+    store = SignedStateStore("secret", InMemoryCache(clock=clock), clock=clock)
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory, state_store=store)
+    state_code = await create_authorization(lambda: uow)
+
+    payload = store.decode(state_code)
+    assert payload["p"] == "fake_provider"
+    assert SignedStateStore("other secret", InMemoryCache()).decode(state_code) is None
+    assert store.decode(state_code[:-2] + "AA") is None
+    assert store.decode("garbage") is None
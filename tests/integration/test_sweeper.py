@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from oauth_client_lib.domain import model
+from oauth_client_lib.service_layer.sweeper import Sweeper
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+
+@pytest.fixture
+def sweeper(async_session_factory):
+    return Sweeper(async_session_factory, state_ttl=600, retention=30, batch_size=2)
+
+
+def make_token(access_token, created, expires_in=3600, is_active=True):
+    return model.Token(
+        access_token, expires_in=expires_in, is_active=is_active, created=created
+    )
+
+
+async def rows(async_session_factory, sql):
+    async with async_session_factory() as session:
+        return [tuple(row) for row in await session.execute(text(sql))]
+
+
+@pytest.mark.asyncio
+async def test_expired_tokens_and_abandoned_authorizations_are_deactivated(
+    sweeper, async_session_factory, add_authorizations
+):
+    authorized = model.Authorization(
+        state=model.State("state_code"),
+        grants=[model.Grant("authorization_code", "code")],
+        tokens=[
+            make_token("expired", NOW - timedelta(hours=2)),
+            make_token("valid", NOW - timedelta(minutes=30)),
+        ],
+        created=NOW - timedelta(hours=2),
+    )
+    abandoned = model.Authorization(
+        state=model.State("abandoned"), created=NOW - timedelta(minutes=11)
+    )
+    waiting = model.Authorization(
+        state=model.State("waiting"), created=NOW - timedelta(minutes=9)
+    )
+    await add_authorizations(authorized, abandoned, waiting)
+
+    report = await sweeper.sweep(now=NOW)
+
+    assert report.expired_tokens == 1
+    assert report.abandoned_authorizations == 1
+    assert await rows(
+        async_session_factory, "SELECT access_token, is_active FROM tokens ORDER BY id"
+    ) == [("expired", 0), ("valid", 1)]
+    assert await rows(
+        async_session_factory, "SELECT state, is_active FROM states ORDER BY id"
+    ) == [("state_code", 1), ("abandoned", 0), ("waiting", 1)]
+
+
+@pytest.mark.asyncio
+async def test_inactive_rows_are_purged_after_retention(
+    sweeper, async_session_factory, add_authorizations
+):
+    old = NOW - timedelta(days=31)
+    active = model.Authorization(
+        state=model.State("state_code"),
+        grants=[model.Grant("authorization_code", "code", is_active=False)],
+        tokens=[
+            make_token(f"old_{i}", old, is_active=False) for i in range(5)
+        ]
+        + [make_token("recent", NOW - timedelta(days=1), is_active=False)],
+        created=old,
+    )
+    active.grants[0].created = old
+    inactive = [
+        model.Authorization(state=model.State(f"s{i}"), is_active=False, created=old)
+        for i in range(3)
+    ]
+    await add_authorizations(active, *inactive)
+
+    report = await sweeper.sweep(now=NOW)
+
+    assert report.purged_tokens == 5
+    assert report.purged_grants == 1
+    assert report.purged_authorizations == 3
+    assert await rows(async_session_factory, "SELECT access_token FROM tokens") == [
+        ("recent",)
+    ]
+    assert await rows(async_session_factory, "SELECT state FROM states") == [
+        ("state_code",)
+    ]
+    assert await rows(async_session_factory, "SELECT count(*) FROM authorizations") == [
+        (1,)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_authorization_with_purged_code_keeps_its_live_token(
+    sweeper, async_session_factory, add_authorizations
+):
+    old = NOW - timedelta(days=40)
+    auth = model.Authorization(
+        state=model.State("state_code"),
+        grants=[model.Grant("authorization_code", "code", is_active=False)],
+        tokens=[make_token("long_lived", old, expires_in=365 * 24 * 3600)],
+        created=old,
+    )
+    auth.grants[0].created = old
+    await add_authorizations(auth)
+
+    first = await sweeper.sweep(now=NOW)
+    second = await sweeper.sweep(now=NOW)
+
+    assert first.purged_grants == 1
+    assert second.abandoned_authorizations == 0
+    assert second.purged_authorizations == 0
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        auth = await uow.authorizations.get(token="long_lived")
+        assert auth.get_token("long_lived").is_valid
+
+
+@pytest.mark.asyncio
+async def test_authorization_whose_code_exchange_failed_is_abandoned(
+    sweeper, async_session_factory, add_authorizations
+):
+    auth = model.Authorization(
+        state=model.State("state_code"),
+        grants=[model.Grant("authorization_code", "code")],
+        created=NOW - timedelta(minutes=11),
+    )
+    await add_authorizations(auth)
+
+    report = await sweeper.sweep(now=NOW)
+
+    assert report.abandoned_authorizations == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from oauth_client_lib.adapters.locks import LocalLock
+from oauth_client_lib.domain import commands, model
+from oauth_client_lib.service_layer import handlers
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+
+class SlowProvider:
+    name = "fake_provider"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def request_token(self, grant):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {
+            "access_token": f"access_token_{self.calls}",
+            "refresh_token": f"refresh_{self.calls}",
+        }
+
+
+@pytest_asyncio.fixture
+async def refresh_code(async_session_factory):
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        uow.authorizations.add(
+            model.Authorization(
+                state=model.State("state_code"),
+                grants=[model.Grant("refresh_token", "refresh")],
+                provider_name="fake_provider",
+            )
+        )
+        await uow.commit()
+    return "refresh"
+
+
+def request_token(async_session_factory, provider, refresh_code):
+    return commands.RequestToken(grant_code=refresh_code, provider=provider), (
+        AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_make_one_exchange(async_session_factory, refresh_code):
+    provider = SlowProvider()
+
+    access_tokens = await asyncio.gather(
+        *[
+            handlers.request_token(
+                *request_token(async_session_factory, provider, refresh_code)
+            )
+            for _ in range(10)
+        ]
+    )
+
+    assert provider.calls == 1
+    assert access_tokens == ["access_token_1"] * 10
+
+
+@pytest.mark.asyncio
+async def test_other_process_token_is_taken_while_waiting_for_lock(
+    async_session_factory, refresh_code, monkeypatch
+):
+    """Coalescing across processes: both hold the same lock,
+    neither sees the other one's in-process call"""
+    lock = LocalLock()
+    monkeypatch.setattr(handlers, "get_token_request_lock", lambda key: lock)
+    provider = SlowProvider()
+
+    access_tokens = await asyncio.gather(
+        *[
+            handlers._request_token_exclusively(
+                *request_token(async_session_factory, provider, refresh_code),
+                key="grant:refresh",
+            )
+            for _ in range(2)
+        ]
+    )
+
+    assert provider.calls == 1
+    assert access_tokens == ["access_token_1"] * 2
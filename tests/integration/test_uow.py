@@ -1,12 +1,23 @@
 import pytest
+from types import SimpleNamespace
+
 from src.oauth_client_lib.service_layer.unit_of_work import (
     AbstractUnitOfWork,
     SqlAlchemyUnitOfWork,
 )
 from src.oauth_client_lib.domain import model
+from oauth_client_lib.adapters.hashing import lookup_key
+from oauth_client_lib.domain import commands, events
+from oauth_client_lib.service_layer import handlers
+from oauth_client_lib.service_layer.unit_of_work import AsyncSqlAlchemyUnitOfWork
 
 from datetime import datetime
 from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import clear_mappers
+
+from oauth_client_lib.domain.model import Authorization, Grant, State
+from src.oauth_client_lib.adapters.orm import start_mappers
 
 
 def insert_authorization(session, id, created=datetime.utcnow(), is_active=True):
@@ -21,9 +32,15 @@ def insert_authorization(session, id, created=datetime.utcnow(), is_active=True)
 def insert_state(session, auth_id, code, created=datetime.utcnow(), is_active=True):
     session.execute(
         text(
-            "INSERT INTO states (auth_id, state, created, is_active) VALUES (:auth_id, :code, :created, :is_active)"
+            "INSERT INTO states (auth_id, state, state_hash, created, is_active) VALUES (:auth_id, :code, :code_hash, :created, :is_active)"
+        ),
+        dict(
+            auth_id=auth_id,
+            code=code,
+            code_hash=lookup_key(code),
+            created=created,
+            is_active=is_active,
         ),
-        dict(auth_id=auth_id, code=code, created=created, is_active=is_active),
     )
 
 
@@ -52,6 +69,152 @@ def test_rolls_back_uncommitted_work_by_default(session_factory):
     assert rows == []
 
 
+@pytest.mark.asyncio
+async def test_async_uow_can_retrieve_authorization(async_session_factory):
+    async with async_session_factory() as session:
+        await session.run_sync(insert_authorization, id=1)
+        await session.run_sync(insert_state, auth_id=1, code="test_state_code")
+        await session.commit()
+
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        auth = await uow.authorizations.get(state_code="test_state_code")
+        await uow.commit()
+
+    assert auth.state.state == "test_state_code"
+    assert auth.grants == []
+
+
+@pytest.mark.asyncio
+async def test_async_uow_maps_model_for_its_own_session_factory(async_session_factory):
+    """Library users' sessions: not made by the default factory"""
+    clear_mappers()
+    try:
+        uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+        async with uow:
+            uow.authorizations.add(Authorization(state=State("state")))
+            await uow.commit()
+    finally:
+        # as conftest did
+        start_mappers()
+
+    async with async_session_factory() as session:
+        rows = list(await session.execute(text('SELECT * FROM "states"')))
+    assert len(rows) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_uow_rolls_back_uncommitted_work_by_default(async_session_factory):
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        await uow.session.run_sync(insert_authorization, id=1)
+
+    async with async_session_factory() as session:
+        rows = list(await session.execute(text('SELECT * FROM "authorizations"')))
+    assert rows == []
+
+
+@pytest.mark.asyncio
+async def test_handlers_persist_authorization_with_async_uow(async_session_factory):
+    cmd = commands.CreateAuthorization(
+        source_url="origin", provider=SimpleNamespace(name="fake_provider")
+    )
+    state_code = await handlers.create_authorization(
+        cmd, AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    )
+    evt = events.AuthCodeRecieved(state_code=state_code, grant_code="auth_code")
+    await handlers.auth_code_recieved(
+        evt, AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    )
+
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        auth = await uow.authorizations.get(grant_code="auth_code")
+        assert auth.provider == "fake_provider"
+        assert not auth.state.is_active
+        assert auth.get_active_grant().code == "auth_code"
+
+
+@pytest.mark.asyncio
+async def test_lookup_columns_store_sha256_of_codes(async_session_factory):
+    grant = model.Grant(grant_type="authorization_code", code="auth_code")
+    token = model.Token(access_token="access_token")
+    auth = model.Authorization(
+        state=model.State("state_code"), grants=[grant], tokens=[token]
+    )
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        uow.authorizations.add(auth)
+        await uow.commit()
+
+    async with async_session_factory() as session:
+        [(state_hash, code_hash, access_token_hash)] = await session.execute(
+            text(
+                "SELECT state_hash, code_hash, access_token_hash FROM states "
+                "JOIN grants ON grants.auth_id = states.auth_id "
+                "JOIN tokens ON tokens.auth_id = states.auth_id"
+            )
+        )
+    assert state_hash == lookup_key("state_code")
+    assert code_hash == lookup_key("auth_code")
+    assert access_token_hash == lookup_key("access_token")
+
+    async with uow:
+        assert await uow.authorizations.get(token="access_token")
+        assert await uow.authorizations.get(grant_code="auth_code")
+        assert await uow.authorizations.get(state_code="state_code")
+
+
+@pytest.mark.asyncio
+async def test_lookup_column_follows_changed_value(async_session_factory):
+    auth = model.Authorization(
+        state=model.State("state_code"),
+        tokens=[model.Token(access_token="access_token")],
+    )
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        uow.authorizations.add(auth)
+        await uow.commit()
+
+    async with uow:
+        auth = await uow.authorizations.get(token="access_token", for_update=True)
+        auth.tokens[0].access_token = "changed_access_token"
+        await uow.commit()
+
+    async with async_session_factory() as session:
+        [(access_token_hash,)] = await session.execute(
+            text("SELECT access_token_hash FROM tokens")
+        )
+    assert access_token_hash == lookup_key("changed_access_token")
+
+
+@pytest.mark.asyncio
+async def test_code_of_active_grant_is_unique(async_session_factory):
+    def refresh_grant():
+        return Grant(grant_type="refresh_token", code="refresh_code")
+
+    uow = AsyncSqlAlchemyUnitOfWork(async_session_factory)
+    async with uow:
+        uow.authorizations.add(
+            Authorization(state=State("state_code"), grants=[refresh_grant()])
+        )
+        await uow.commit()
+
+    # provider returned the same refresh token again
+    async with uow:
+        auth = await uow.authorizations.get(grant_code="refresh_code", for_update=True)
+        auth.get_active_grant().deactivate()
+        auth.grants.append(refresh_grant())
+        await uow.commit()
+
+    with pytest.raises(IntegrityError):
+        async with uow:
+            uow.authorizations.add(
+                Authorization(state=State("other"), grants=[refresh_grant()])
+            )
+            await uow.commit()
+
+
 @pytest.mark.asyncio
 async def test_get_authorization_by_access_token(
     uow: AbstractUnitOfWork, token: model.Token, auth_wStateGrantToken
@@ -0,0 +1,48 @@
+import pytest
+
+from oauth_client_lib.adapters.cache import InMemoryCache, RedisCache
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        return InMemoryCache()
+    return RedisCache(fakeredis.aioredis.FakeRedis())
+
+
+@pytest.mark.asyncio
+async def test_cache_sets_gets_and_deletes(cache):
+    assert await cache.get("key") is None
+
+    await cache.set("key", "value", ttl=60)
+    assert await cache.get("key") == "value"
+
+    await cache.delete("key", "missing")
+    assert await cache.get("key") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_adds_only_absent_key(cache):
+    assert await cache.add("key", "first", ttl=60)
+    assert not await cache.add("key", "second", ttl=60)
+    assert await cache.get("key") == "first"
+
+
+@pytest.mark.asyncio
+async def test_in_memory_value_expires(clock):
+    cache = InMemoryCache(clock=clock)
+    await cache.set("key", "value", ttl=10)
+
+    clock.now = 10
+    assert await cache.get("key") is None
+    assert await cache.add("key", "new", ttl=10)
+
+
+@pytest.mark.asyncio
+async def test_value_is_popped_once(cache):
+    await cache.set("key", "value", ttl=60)
+
+    assert await cache.pop("key") == "value"
+    assert await cache.pop("key") is None
@@ -0,0 +1,60 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from oauth_client_lib.adapters.secrets_store import OAuthSecretsStore, StaticSecrets
+from oauth_client_lib.service_layer.oauth.google_client import GoogleClient
+
+SCOPES = ["https://www.googleapis.com/auth/userinfo.email", "openid"]
+REDIRECT_URI = "https://test-client/api/oauth/callback"
+
+
+@pytest.fixture
+def google_client(tmp_path):
+    secrets = OAuthSecretsStore(
+        path_template=str(tmp_path / "client_secret_{provider}.json"),
+        environ={
+            "OAUTH_GOOGLE_CLIENT_ID": "test_client_id",
+            "OAUTH_GOOGLE_CLIENT_SECRET": "test_client_secret",
+        },
+    )
+    return GoogleClient(secrets=secrets)
+
+
+def test_flow_is_built_once(google_client: GoogleClient):
+    flow = google_client.get_flow(SCOPES, REDIRECT_URI)
+    assert google_client.get_flow(SCOPES, REDIRECT_URI) is flow
+    assert google_client.get_flow(SCOPES, "https://other/callback") is not flow
+
+
+def test_flow_rebuilt_after_secrets_change(google_client: GoogleClient):
+    flow = google_client.get_flow(SCOPES, REDIRECT_URI)
+    google_client.secrets.reload()
+    assert google_client.get_flow(SCOPES, REDIRECT_URI) is flow
+
+    google_client.secrets._environ["OAUTH_GOOGLE_CLIENT_SECRET"] = "rotated_secret"
+    google_client.secrets.reload()
+    assert google_client.get_flow(SCOPES, REDIRECT_URI) is not flow
+
+
+def test_flow_is_kept_for_static_secrets():
+    """StaticSecrets returns a new config dict every call"""
+    google_client = GoogleClient(
+        secrets=StaticSecrets("test_client_id", "test_client_secret")
+    )
+    flow = google_client.get_flow(SCOPES, REDIRECT_URI)
+    assert google_client.get_flow(SCOPES, REDIRECT_URI) is flow
+
+
+def test_authorization_url_keeps_requests_apart(google_client: GoogleClient):
+    first = google_client.get_authorization_url(SCOPES, REDIRECT_URI, state="first")
+    second = google_client.get_authorization_url(SCOPES, REDIRECT_URI, state="second")
+
+    first_query = parse_qs(urlsplit(first).query)
+    second_query = parse_qs(urlsplit(second).query)
+    assert first_query["state"] == ["first"]
+    assert second_query["state"] == ["second"]
+    assert first_query["client_id"] == ["test_client_id"]
+    assert first_query["redirect_uri"] == [REDIRECT_URI]
+    assert "code_challenge" not in first_query
+
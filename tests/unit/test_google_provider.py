@@ -0,0 +1,136 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+from oauth_client_lib.adapters.secrets_store import OAuthSecretsStore
+from oauth_client_lib.domain import commands, model
+from oauth_client_lib.service_layer import handlers
+from oauth_client_lib.service_layer.oauth import OAuthGoogleProvider
+from oauth_client_lib.service_layer.unit_of_work import AbstractUnitOfWork
+
+ROUND_TRIP = 0.2
+
+
+class FakeResponse:
+    status = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    async def json(self):
+        return self.payload
+
+
+class FakeGoogleSession:
+    """Google stand-in: every call takes one round trip"""
+
+    def __init__(self):
+        self.requests = []
+
+    @asynccontextmanager
+    async def post(self, url, data):
+        self.requests.append((url, data))
+        await asyncio.sleep(ROUND_TRIP)
+        yield FakeResponse(
+            {
+                "access_token": f"google_token_for_{data['code']}",
+                "expires_in": 3599,
+                "refresh_token": f"google_refresh_for_{data['code']}",
+                "scope": "openid",
+                "token_type": "Bearer",
+                "id_token": "",
+            }
+        )
+
+    @asynccontextmanager
+    async def get(self, url, headers):
+        self.requests.append((url, headers))
+        await asyncio.sleep(ROUND_TRIP)
+        yield FakeResponse({"id": "1", "email": "test@gmail.com"})
+
+
+class FakeHTTPClientPool:
+    def __init__(self, session):
+        self.session = session
+
+    def get_session(self, provider):
+        return self.session
+
+
+@pytest.fixture
+def google_session():
+    return FakeGoogleSession()
+
+
+@pytest.fixture
+def google_provider(google_session, tmp_path, monkeypatch):
+    monkeypatch.setenv("API_HOST", "https://test-client")
+    secrets = OAuthSecretsStore(
+        path_template=str(tmp_path / "client_secret_{provider}.json"),
+        environ={
+            "OAUTH_GOOGLE_CLIENT_ID": "test_client_id",
+            "OAUTH_GOOGLE_CLIENT_SECRET": "test_client_secret",
+        },
+    )
+    return OAuthGoogleProvider(
+        http_clients=FakeHTTPClientPool(google_session), secrets=secrets
+    )
+
+
+@pytest.mark.asyncio
+async def test_token_requested_from_google_token_uri(
+    google_provider: OAuthGoogleProvider, google_session: FakeGoogleSession
+):
+    grant = model.Grant(grant_type="authorization_code", code="auth_code")
+    result = await google_provider.request_token(grant=grant)
+
+    assert result["access_token"] == "google_token_for_auth_code"
+    [(url, data)] = google_session.requests
+    assert url == "https://oauth2.googleapis.com/token"
+    assert data == {
+        "code": "auth_code",
+        "redirect_uri": "https://test-client/api/oauth/callback",
+        "client_id": "test_client_id",
+        "client_secret": "test_client_secret",
+        "grant_type": "authorization_code",
+    }
+
+
+@pytest.mark.asyncio
+async def test_user_info(google_provider: OAuthGoogleProvider):
+    google_provider.access_token = "google_token"
+    user_info = await google_provider.get_user_info()
+    assert user_info.email == "test@gmail.com"
+
+
+@pytest.mark.asyncio
+async def test_simultaneous_callbacks_take_one_round_trip(
+    google_provider: OAuthGoogleProvider, uow: AbstractUnitOfWork
+):
+    """N token exchanges at once must not wait for each other"""
+    callbacks = 20
+    codes = [f"code_{i}" for i in range(callbacks)]
+    for code in codes:
+        uow.authorizations.add(
+            model.Authorization(
+                state=model.State(),
+                grants=[model.Grant(grant_type="authorization_code", code=code)],
+                provider_name="google",
+            )
+        )
+
+    started = time.perf_counter()
+    access_tokens = await asyncio.gather(
+        *(
+            handlers.request_token(
+                commands.RequestToken(grant_code=code, provider=google_provider), uow
+            )
+            for code in codes
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    assert access_tokens == [f"google_token_for_{code}" for code in codes]
+    assert elapsed < 2 * ROUND_TRIP
@@ -92,6 +92,25 @@ class TestBusinessRestrictions:
         assert not grant_authCode.is_active
         assert not token.is_active
 
+    @pytest.mark.asyncio
+    async def test_token_isnt_requested_if_grant_isnt_saved(
+        self, uow: AbstractUnitOfWork, state, grant_authCode, auth_wState, monkeypatch
+    ):
+        def failing_commit():
+            raise ConnectionError("commit failed")
+
+        monkeypatch.setattr(uow, "_commit", failing_commit)
+        uow.authorizations.add(auth_wState)
+        evt = events.AuthCodeRecieved(
+            state_code=state.state,
+            grant_code=grant_authCode.code,
+        )
+
+        results = await messagebus.handle(evt, uow)
+
+        assert results == []
+        assert auth_wState.events == []
+
     @pytest.mark.asyncio
     async def test_wrong_stateCode_raises_InvalidState_exception(
         self, uow: AbstractUnitOfWork, state, auth_wState, test_provider
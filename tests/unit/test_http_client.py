@@ -0,0 +1,37 @@
+import pytest
+
+from oauth_client_lib.adapters.http_client import HTTPClientPool
+
+
+def get_params(provider):
+    return {
+        "connector": {"limit": 5, "keepalive_timeout": 15},
+        "timeout": {"total": 1},
+    }
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_one_session_per_provider():
+    pool = HTTPClientPool(get_params=get_params)
+    google = pool.get_session("google")
+    yandex = pool.get_session("yandex")
+
+    assert pool.get_session("google") is google
+    assert google is not yandex
+    assert google.connector.limit == 5
+    assert google.timeout.total == 1
+
+    await pool.close()
+    assert google.closed
+    assert yandex.closed
+
+
+@pytest.mark.asyncio
+async def test_pool_recreates_closed_session():
+    pool = HTTPClientPool(get_params=get_params)
+    await pool.open(["google"])
+    session = pool.get_session("google")
+    await session.close()
+
+    assert pool.get_session("google") is not session
+    await pool.close()
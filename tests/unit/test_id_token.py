@@ -0,0 +1,242 @@
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from oauth_client_lib.adapters.jwks import JWKSCache
+from oauth_client_lib.service_layer.exceptions import OAuthError
+from oauth_client_lib.service_layer.oauth.id_token import IdTokenVerifier
+from oauth_client_lib.service_layer.oauth.provider import OAuthProvider
+from oauth_client_lib.service_layer.resilience import (
+    ResiliencePolicies,
+    TransientHTTPError,
+)
+
+JWKS_URL = "https://provider.test/certs"
+ISSUER = "https://provider.test"
+
+
+class SigningKey:
+    def __init__(self, kid):
+        self.kid = kid
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.jwk = dict(jwk.construct(public_pem, "RS256").to_dict(), kid=kid)
+
+    def sign(self, access_token=None, **claims):
+        now = int(time.time())
+        claims = dict(
+            {
+                "iss": ISSUER,
+                "aud": "client_id",
+                "sub": "1",
+                "email": "user@test.com",
+                "email_verified": True,
+                "iat": now,
+                "exp": now + 3600,
+            },
+            **claims,
+        )
+        return jwt.encode(
+            claims,
+            self.pem,
+            algorithm="RS256",
+            headers={"kid": self.kid},
+            access_token=access_token,
+        )
+
+
+class FakeJWKSEndpoint:
+    def __init__(self, *keys, max_age=None):
+        self.keys = list(keys)
+        self.max_age = max_age
+        self.requests = 0
+        self.error = None
+
+    async def __call__(self, url):
+        assert url == JWKS_URL
+        self.requests += 1
+        if self.error:
+            raise self.error
+        return {"keys": [key.jwk for key in self.keys]}, self.max_age
+
+
+def get_params(provider):
+    return {"public_keys": JWKS_URL, "issuers": [ISSUER]}
+
+
+@pytest.fixture(scope="module")
+def key():
+    return SigningKey("key1")
+
+
+def make_verifier(endpoint, clock):
+    return IdTokenVerifier(
+        JWKSCache(endpoint, min_refresh_interval=60, clock=clock),
+        get_params=get_params,
+        policies=ResiliencePolicies(lambda provider: {}),
+    )
+
+
+@pytest.mark.asyncio
+async def test_keys_are_fetched_once_and_token_verified_locally(key, clock):
+    endpoint = FakeJWKSEndpoint(key)
+    verifier = make_verifier(endpoint, clock)
+
+    for _ in range(3):
+        claims = await verifier.verify(
+            "fake", key.sign("access_token"), "client_id", access_token="access_token"
+        )
+        assert claims["email"] == "user@test.com"
+    assert endpoint.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_keys_are_refetched_after_max_age(key, clock):
+    endpoint = FakeJWKSEndpoint(key, max_age=100)
+    verifier = make_verifier(endpoint, clock)
+    await verifier.verify("fake", key.sign(), "client_id")
+
+    clock.now += 100
+    await verifier.verify("fake", key.sign(), "client_id")
+    assert endpoint.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_refreshes_keys_but_not_too_often(key, clock):
+    endpoint = FakeJWKSEndpoint(key)
+    verifier = make_verifier(endpoint, clock)
+    await verifier.verify("fake", key.sign(), "client_id")
+
+    # provider rotated its keys
+    new_key = SigningKey("key2")
+    endpoint.keys.append(new_key)
+    clock.now += 60
+    await verifier.verify("fake", new_key.sign(), "client_id")
+    assert endpoint.requests == 2
+
+    unknown = SigningKey("forged")
+    for _ in range(3):
+        with pytest.raises(OAuthError):
+            await verifier.verify("fake", unknown.sign(), "client_id")
+    assert endpoint.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_is_oauth_error_and_isnt_repeated_at_once(key, clock):
+    endpoint = FakeJWKSEndpoint(key)
+    endpoint.error = TransientHTTPError(503)
+    verifier = make_verifier(endpoint, clock)
+
+    for _ in range(3):
+        with pytest.raises(OAuthError):
+            await verifier.verify("fake", key.sign(), "client_id")
+    assert endpoint.requests == 1
+
+    endpoint.error = None
+    clock.now += 60
+    await verifier.verify("fake", key.sign(), "client_id")
+    assert endpoint.requests == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "claims, audience, access_token",
+    [
+        ({}, "other_client_id", "access_token"),
+        ({"iss": "https://evil.test"}, "client_id", "access_token"),
+        ({"exp": int(time.time()) - 10}, "client_id", "access_token"),
+        ({}, "client_id", "other_access_token"),
+    ],
+)
+async def test_invalid_claims_are_rejected(key, clock, claims, audience, access_token):
+    verifier = make_verifier(FakeJWKSEndpoint(key), clock)
+
+    with pytest.raises(OAuthError):
+        await verifier.verify(
+            "fake", key.sign("access_token", **claims), audience, access_token
+        )
+
+
+@pytest.mark.asyncio
+async def test_symmetric_algorithm_is_rejected(key, clock):
+    verifier = make_verifier(FakeJWKSEndpoint(key), clock)
+    forged = jwt.encode(
+        {"iss": ISSUER, "aud": "client_id"}, "secret", headers={"kid": "key1"}
+    )
+
+    with pytest.raises(OAuthError):
+        await verifier.verify("fake", forged, "client_id")
+
+
+class FakeSecrets:
+    def get(self, provider):
+        return "client_id", "client_secret"
+
+
+class UserInfoProvider(OAuthProvider):
+    def __init__(self, id_tokens):
+        super().__init__("fake", secrets=FakeSecrets(), id_tokens=id_tokens)
+        self.userinfo_requests = 0
+
+    async def _get_user_info(self, access_token):
+        self.userinfo_requests += 1
+        return {"email": "from@userinfo.com"}
+
+
+@pytest.mark.asyncio
+async def test_user_info_comes_from_id_token_without_provider_call(key, clock):
+    provider = UserInfoProvider(make_verifier(FakeJWKSEndpoint(key), clock))
+
+    user_info = await provider.get_user_info(
+        "access_token", id_token=key.sign("access_token")
+    )
+
+    assert user_info.email == "user@test.com"
+    assert provider.userinfo_requests == 0
+
+
+@pytest.mark.asyncio
+async def test_user_info_is_requested_if_id_token_is_not_genuine(key, clock):
+    provider = UserInfoProvider(make_verifier(FakeJWKSEndpoint(key), clock))
+
+    user_info = await provider.get_user_info(
+        "access_token", id_token=key.sign("access_token", aud="other")
+    )
+
+    assert user_info == {"email": "from@userinfo.com"}
+    assert provider.userinfo_requests == 1
+
+
+@pytest.mark.asyncio
+async def test_user_info_is_requested_if_email_is_not_verified(key, clock):
+    provider = UserInfoProvider(make_verifier(FakeJWKSEndpoint(key), clock))
+
+    user_info = await provider.get_user_info(
+        "access_token", id_token=key.sign("access_token", email_verified=False)
+    )
+
+    assert user_info == {"email": "from@userinfo.com"}
+    assert provider.userinfo_requests == 1
+
+
+@pytest.mark.asyncio
+async def test_user_info_is_requested_if_public_keys_are_unavailable(key, clock):
+    endpoint = FakeJWKSEndpoint(key)
+    endpoint.error = TransientHTTPError(503)
+    provider = UserInfoProvider(make_verifier(endpoint, clock))
+
+    user_info = await provider.get_user_info(
+        "access_token", id_token=key.sign("access_token")
+    )
+
+    assert user_info == {"email": "from@userinfo.com"}
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+CHECK = """
+import sys
+import {module}
+print(",".join(sys.modules))
+config = sys.modules.get("oauth_client_lib.entrypoints.config")
+print(config is not None and config._config is not None)
+"""
+
+
+def import_in_fresh_interpreter(module, cwd):
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK.format(module=module)],
+        cwd=str(cwd),
+        env=dict(
+            os.environ, PYTHONPATH=os.pathsep.join(map(os.path.abspath, sys.path))
+        ),
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    modules, config_loaded = result.stdout.splitlines()
+    return modules.split(","), config_loaded == "True"
+
+
+@pytest.mark.parametrize(
+    "module", ["oauth_client_lib", "oauth_client_lib.entrypoints.fastapi_app"]
+)
+def test_import_loads_nothing_but_code(module, tmp_path):
+    # no config.yaml in CWD
+    modules, config_loaded = import_in_fresh_interpreter(module, tmp_path)
+
+    assert not [
+        name
+        for name in modules
+        if name.split(".")[0] in ("google_auth_oauthlib", "googleapiclient", "yaml")
+    ]
+    assert not config_loaded
+
+
+def test_package_import_loads_no_dependencies(tmp_path):
+    """Database, HTTP and JWT libraries are loaded along with what uses them"""
+    modules, _ = import_in_fresh_interpreter("oauth_client_lib", tmp_path)
+
+    assert not [
+        name
+        for name in modules
+        if name.split(".")[0] in ("sqlalchemy", "aiohttp", "jose", "fastapi")
+    ]
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from oauth_client_lib.adapters.locks import PostgresAdvisoryLock
+
+
+class FakeConnection:
+    def __init__(self, error=None, acquired=True):
+        self.error = error
+        self.acquired = acquired
+        self.statements = []
+        self.closed = False
+
+    async def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        if "pg_advisory_lock" in str(statement) and self.error:
+            raise self.error
+
+    async def scalar(self, statement, params=None):
+        self.statements.append(str(statement))
+        return self.acquired
+
+    async def commit(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeEngine:
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def connect(self):
+        return self.connection
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [asyncio.CancelledError(), RuntimeError("timeout")])
+async def test_connection_is_returned_if_waiting_for_lock_fails(error):
+    connection = FakeConnection(error=error)
+    lock = PostgresAdvisoryLock(FakeEngine(connection), "grant", wait_timeout=30)
+
+    with pytest.raises(type(error)):
+        await lock.acquire(wait=True)
+
+    assert connection.closed
+    assert "SET LOCAL statement_timeout = 0" in connection.statements
+    assert "SET LOCAL lock_timeout = 30000" in connection.statements
+
+
+@pytest.mark.asyncio
+async def test_connection_is_held_while_lock_is_held():
+    connection = FakeConnection()
+    lock = PostgresAdvisoryLock(FakeEngine(connection), "grant")
+
+    async with lock.held() as acquired:
+        assert acquired
+        assert not connection.closed
+    assert connection.closed
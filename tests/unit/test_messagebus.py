@@ -0,0 +1,140 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+import pytest
+
+from oauth_client_lib.domain import commands, events
+from oauth_client_lib.entrypoints import config
+from oauth_client_lib.service_layer import messagebus, unit_of_work
+
+
+@dataclass
+class SomethingHappened(events.Event):
+    name: str = ""
+
+
+@dataclass
+class DoSomething(commands.Command):
+    name: str = ""
+
+
+class FakeUnitOfWork:
+    def __init__(self):
+        self.events = []
+
+    def collect_new_events(self):
+        while self.events:
+            yield self.events.pop(0)
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    calls = []
+
+    async def slow_handler(evt, uow):
+        calls.append(("slow", uow))
+        await asyncio.sleep(0.1)
+        uow.events.append(DoSomething(name="after slow"))
+
+    async def failing_handler(evt, uow):
+        calls.append(("failing", uow))
+        await asyncio.sleep(0.1)
+        raise RuntimeError("handler failed")
+
+    async def another_handler(evt, uow):
+        calls.append(("another", uow))
+        await asyncio.sleep(0.05)
+        uow.events.append(DoSomething(name="after another"))
+
+    async def do_something(cmd, uow):
+        return cmd.name
+
+    monkeypatch.setitem(
+        messagebus.EVENT_HANDLERS,
+        SomethingHappened,
+        [slow_handler, failing_handler, another_handler],
+    )
+    monkeypatch.setitem(messagebus.COMMAND_HANDLERS, DoSomething, do_something)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_event_handlers_run_concurrently_in_own_units_of_work(bus):
+    started = time.monotonic()
+
+    results = await messagebus.handle_concurrently(
+        SomethingHappened(), FakeUnitOfWork, concurrency=10
+    )
+
+    assert time.monotonic() - started < 0.2
+    assert len({id(uow) for _, uow in bus}) == 3
+    # failing handler didn't stop the others, results are in handlers order
+    assert results == ["after slow", "after another"]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited(bus):
+    started = time.monotonic()
+
+    await messagebus.handle_concurrently(SomethingHappened(), FakeUnitOfWork, concurrency=1)
+
+    assert time.monotonic() - started >= 0.25
+
+
+@pytest.mark.asyncio
+async def test_sequential_mode_returns_same_results(bus):
+    results = await messagebus.handle(SomethingHappened(), FakeUnitOfWork())
+
+    assert results == ["after slow", "after another"]
+
+
+class NotEnteredUnitOfWork(unit_of_work.AbstractAsyncUnitOfWork):
+    async def _commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+@pytest.fixture
+def failing_to_enter(monkeypatch):
+    async def failing_handler(evt, uow):
+        raise RuntimeError("couldn't enter unit of work")
+
+    monkeypatch.setitem(messagebus.EVENT_HANDLERS, SomethingHappened, [failing_handler])
+
+
+@pytest.mark.asyncio
+async def test_handler_error_isnt_masked_by_unit_of_work_not_entered(
+    failing_to_enter,
+):
+    results = await messagebus.handle_concurrently(
+        SomethingHappened(), NotEnteredUnitOfWork
+    )
+
+    assert results == []
+
+
+@pytest.mark.asyncio
+async def test_handler_error_is_raised_despite_unit_of_work_not_entered(
+    failing_to_enter,
+):
+    with pytest.raises(RuntimeError, match="couldn't enter"):
+        await messagebus.handle(
+            SomethingHappened(), NotEnteredUnitOfWork(), raise_event_errors=True
+        )
+
+
+def test_concurrent_mode_uses_injected_units_of_work(client, uow, monkeypatch):
+    monkeypatch.setattr(
+        config, "get_messagebus_params", lambda: {"mode": "concurrent"}
+    )
+
+    response = client.get(
+        "/oauth/redirect", params={"provider": "fake_provider"}, follow_redirects=False
+    )
+
+    assert response.status_code == 307
+    [auth] = uow.authorizations.seen
+    assert auth.state.state in response.headers["location"]
@@ -1,3 +1,6 @@
+from datetime import datetime, timedelta
+
+from src.oauth_client_lib.domain import events
 from src.oauth_client_lib.domain import model
 
 
@@ -22,3 +25,20 @@ def test_when_authorization_deactivates_it_also_deactivates_its_state_grants_and
     assert not state.is_active
     assert not grant.is_active
     assert not token.is_active
+
+
+def test_deactivated_authorization_tells_its_tokens_are_revoked():
+    state, grant, token, auth = create_auth_data()
+
+    auth.deactivate()
+
+    assert auth.events == [events.AccessTokenRevoked(access_token="test_token")]
+
+
+def test_use_is_remembered_no_more_often_than_resolution():
+    created = datetime(2026, 1, 1)
+    auth = model.Authorization(state=model.State("state"), created=created)
+
+    assert not auth.mark_used(now=created + timedelta(minutes=30))
+    assert auth.mark_used(now=created + timedelta(hours=2))
+    assert auth.last_used == created + timedelta(hours=2)
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from oauth_client_lib.service_layer.exceptions import OAuthError
+from oauth_client_lib.service_layer.oauth import OAuthProvider
+from oauth_client_lib.service_layer.oauth.registry import ProviderRegistry
+
+
+class FakeProvider(OAuthProvider):
+    def __init__(self, name="fake_provider"):
+        super().__init__(name)
+
+    async def _get_user_info(self, access_token):
+        await asyncio.sleep(0)
+        return {"email": f"{access_token}@test.com"}
+
+
+def no_plugins():
+    return {}
+
+
+def test_provider_is_created_once():
+    created = []
+
+    def factory():
+        created.append(FakeProvider())
+        return created[-1]
+
+    registry = ProviderRegistry({"fake_provider": factory}, plugins=no_plugins)
+    registry.open(["fake_provider"])
+
+    assert registry.get("fake_provider") is registry.get("fake_provider")
+    assert len(created) == 1
+
+
+def test_unknown_provider():
+    registry = ProviderRegistry({}, plugins=no_plugins)
+
+    assert "unknown" not in registry
+    with pytest.raises(OAuthError):
+        registry.get("unknown")
+
+
+def test_plugins_are_loaded_but_do_not_override_built_in_providers():
+    registry = ProviderRegistry(
+        {"fake_provider": FakeProvider},
+        plugins=lambda: {
+            "fake_provider": lambda: FakeProvider("overridden"),
+            "plugin": lambda: FakeProvider("plugin"),
+        },
+    )
+
+    assert registry.names() == ["fake_provider", "plugin"]
+    assert registry.get("fake_provider").name == "fake_provider"
+    assert registry.get("plugin").name == "plugin"
+
+
+@pytest.mark.asyncio
+async def test_shared_provider_serves_concurrent_users():
+    provider = ProviderRegistry({"fake_provider": FakeProvider}, plugins=no_plugins).get(
+        "fake_provider"
+    )
+
+    user_infos = await asyncio.gather(
+        *[provider.get_user_info(access_token=f"user{i}") for i in range(5)]
+    )
+
+    assert [u["email"] for u in user_infos] == [f"user{i}@test.com" for i in range(5)]
@@ -0,0 +1,76 @@
+from dataclasses import FrozenInstanceError
+from urllib.parse import urlencode
+
+import pytest
+
+from oauth_client_lib.service_layer.oauth import OAuthProvider
+from oauth_client_lib.service_layer.oauth.settings import (
+    ProviderConfigError,
+    ProviderSettings,
+    ProviderSettingsRegistry,
+)
+
+URLS = {
+    "code": "https://provider.test/auth",
+    "token": "https://provider.test/token",
+    "userinfo": "https://provider.test/userinfo",
+}
+
+
+def make_settings(scopes=("email", "openid"), urls=URLS, **kwargs):
+    return ProviderSettings.create(
+        "fake_provider",
+        list(scopes),
+        urls,
+        callback_url="https://client.test/api/oauth/callback",
+        **kwargs,
+    )
+
+
+def test_settings_are_compiled_once_and_immutable():
+    settings = make_settings()
+
+    assert settings.scope == "email openid"
+    assert settings.code_url == "https://provider.test/auth"
+    with pytest.raises(FrozenInstanceError):
+        settings.scope = "email"
+
+
+@pytest.mark.parametrize(
+    "scopes, urls",
+    [
+        ([], URLS),
+        (["email"], dict(URLS, token=None)),
+        (["email"], dict(URLS, userinfo="provider.test/userinfo")),
+    ],
+)
+def test_invalid_settings_are_rejected(scopes, urls):
+    with pytest.raises(ProviderConfigError):
+        make_settings(scopes, urls, required_urls=OAuthProvider.required_urls)
+
+
+def test_unknown_provider_fails_at_compile():
+    with pytest.raises(ProviderConfigError):
+        ProviderSettingsRegistry().compile({"unknown": ()})
+
+
+@pytest.mark.asyncio
+async def test_authorization_url_is_prefix_plus_state():
+    provider = OAuthProvider(
+        "fake_provider",
+        settings=make_settings(),
+        client_id="client id",
+        client_secret="secret",
+    )
+
+    url = await provider.get_authorization_url("state/code")
+
+    assert url == "https://provider.test/auth?" + urlencode(
+        {
+            "response_type": "code",
+            "client_id": "client id",
+            "redirect_uri": "https://client.test/api/oauth/callback",
+            "scope": "email openid",
+            "state": "state/code",
+        }
+    )
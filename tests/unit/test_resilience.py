@@ -0,0 +1,130 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from oauth_client_lib.service_layer.exceptions import OAuthError
+from oauth_client_lib.service_layer.resilience import (
+    CircuitBreaker,
+    ResiliencePolicies,
+    ResiliencePolicy,
+    TransientHTTPError,
+)
+
+
+class FlakyCall:
+    def __init__(self, *errors, result="ok"):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+def make_policy(clock, **kwargs):
+    kwargs = dict(dict(retries=2, backoff=0.1, max_backoff=1), **kwargs)
+    return ResiliencePolicy("fake", clock=clock, sleep=clock.sleep, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_idempotent_call_is_retried_with_bounded_jitter(clock):
+    policy = make_policy(clock)
+    call = FlakyCall(TransientHTTPError(503), aiohttp.ServerDisconnectedError())
+
+    assert await policy.call(call) == "ok"
+
+    assert call.calls == 3
+    assert len(clock.sleeps) == 2
+    assert all(0.1 <= delay <= 1 for delay in clock.sleeps)
+    assert policy.stats()["retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_non_idempotent_call_is_not_retried(clock):
+    policy = make_policy(clock)
+    call = FlakyCall(TransientHTTPError(500))
+
+    with pytest.raises(OAuthError):
+        await policy.call(call, idempotent=False)
+    assert call.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_call_times_out():
+    async def slow():
+        await asyncio.sleep(1)
+
+    policy = ResiliencePolicy("fake", timeout=0.01)
+    with pytest.raises(OAuthError):
+        await policy.call(slow)
+    assert policy.stats()["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast_then_lets_trial_call(clock):
+    policy = make_policy(clock, retries=0, failure_threshold=2, reset_timeout=30)
+    for _ in range(2):
+        with pytest.raises(OAuthError):
+            await policy.call(FlakyCall(TransientHTTPError(429)))
+    assert policy.stats()["state"] == "open"
+
+    call = FlakyCall()
+    with pytest.raises(OAuthError):
+        await policy.call(call)
+    assert call.calls == 0
+    assert policy.stats()["rejected"] == 1
+
+    clock.now += 30
+    assert await policy.call(call) == "ok"
+    assert policy.stats()["state"] == "closed"
+
+
+def test_failed_trial_call_opens_circuit_again(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [asyncio.CancelledError, ValueError])
+async def test_interrupted_trial_call_doesnt_block_circuit(error, clock):
+    policy = make_policy(clock, retries=0, failure_threshold=1, reset_timeout=30)
+    with pytest.raises(OAuthError):
+        await policy.call(FlakyCall(TransientHTTPError(503)))
+    clock.now += 30
+
+    with pytest.raises(error):
+        await policy.call(FlakyCall(error()))
+
+    assert await policy.call(FlakyCall()) == "ok"
+    assert policy.stats()["state"] == "closed"
+
+
+@pytest.mark.asyncio
+async def test_calls_in_flight_are_limited():
+    policy = ResiliencePolicy("fake", max_in_flight=2)
+    in_flight = []
+
+    async def call():
+        in_flight.append(policy.in_flight)
+        await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[policy.call(call) for _ in range(5)])
+    assert max(in_flight) == 2
+
+
+def test_policy_per_provider_from_params():
+    policies = ResiliencePolicies(get_params=lambda name: {"retries": len(name)})
+
+    assert policies.get("google") is policies.get("google")
+    assert policies.get("yandex").retries == 6
+    assert set(policies.stats()) == {"google", "yandex"}
@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+from oauth_client_lib.adapters.secrets_store import OAuthSecretsStore
+from oauth_client_lib.service_layer import exceptions
+
+
+def write_secrets(path, client_id, client_secret, mtime=None):
+    path.write_text(
+        json.dumps({"web": {"client_id": client_id, "client_secret": client_secret}})
+    )
+    if mtime:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def secrets_file(tmp_path):
+    path = tmp_path / "client_secret_test.json"
+    write_secrets(path, "file_id", "file_secret", mtime=1_000_000)
+    return path
+
+
+def create_store(secrets_file, environ=None):
+    return OAuthSecretsStore(
+        path_template=str(secrets_file.parent / "client_secret_{provider}.json"),
+        environ=environ or {},
+        check_interval=0,
+    )
+
+
+def test_secrets_are_read_once_while_file_unchanged(secrets_file, monkeypatch):
+    store = create_store(secrets_file)
+    assert store.get("test") == ("file_id", "file_secret")
+
+    def fail_open(*args, **kwargs):
+        raise AssertionError("secrets file must not be reopened")
+
+    monkeypatch.setattr("builtins.open", fail_open)
+    assert store.get("test") == ("file_id", "file_secret")
+
+
+def test_secrets_reloaded_when_file_changes(secrets_file):
+    store = create_store(secrets_file)
+    assert store.get("test") == ("file_id", "file_secret")
+
+    write_secrets(secrets_file, "new_id", "new_secret", mtime=2_000_000)
+    assert store.get("test") == ("new_id", "new_secret")
+
+
+def test_explicit_reload(secrets_file):
+    store = create_store(secrets_file)
+    store.get("test")
+
+    # same mtime and size: only explicit reload notices the change
+    write_secrets(secrets_file, "file_iD", "file_sEcret", mtime=1_000_000)
+    assert store.get("test") == ("file_id", "file_secret")
+
+    store.reload("test")
+    assert store.get("test") == ("file_iD", "file_sEcret")
+
+
+def test_environment_secrets_without_file(tmp_path):
+    store = create_store(
+        tmp_path / "missing.json",
+        environ={
+            "OAUTH_GOOGLE_API_CLIENT_ID": "env_id",
+            "OAUTH_GOOGLE_API_CLIENT_SECRET": "env_secret",
+        },
+    )
+    assert store.get("google-api") == ("env_id", "env_secret")
+
+
+def test_environment_overrides_file(secrets_file):
+    store = create_store(secrets_file, environ={"OAUTH_TEST_CLIENT_SECRET": "env_secret"})
+    assert store.get("test") == ("file_id", "env_secret")
+
+
+def test_no_secrets_raises_OAuthError(tmp_path):
+    store = create_store(tmp_path / "missing.json")
+    with pytest.raises(exceptions.OAuthError):
+        store.get("test")
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from oauth_client_lib.service_layer.single_flight import SingleFlight
+
+
+class SlowCall:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return f"result_{self.calls}"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_made_once():
+    single_flight, call = SingleFlight(), SlowCall()
+
+    results = await asyncio.gather(*[single_flight.do("key", call) for _ in range(3)])
+
+    assert results == ["result_1"] * 3
+    assert not single_flight.in_flight("key")
+    assert await single_flight.do("key", call) == "result_2"
+
+
+@pytest.mark.asyncio
+async def test_waiters_get_result_when_leader_is_cancelled():
+    single_flight, call = SingleFlight(), SlowCall()
+    leader = asyncio.ensure_future(single_flight.do("key", call))
+    await asyncio.sleep(0)
+    waiter = asyncio.ensure_future(single_flight.do("key", call))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+
+    assert await waiter == "result_1"
+    assert leader.cancelled()
+    assert call.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_error_is_raised_to_every_caller():
+    single_flight = SingleFlight()
+
+    async def failing_call():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider is down")
+
+    results = await asyncio.gather(
+        *[single_flight.do("key", failing_call) for _ in range(2)],
+        return_exceptions=True,
+    )
+
+    assert [type(e) for e in results] == [RuntimeError, RuntimeError]
+    assert not single_flight.in_flight("key")
@@ -0,0 +1,32 @@
+import pytest
+
+from oauth_client_lib.adapters.locks import LocalLock
+from oauth_client_lib.service_layer.throttling import TokenBucket
+
+
+def test_bucket_allows_burst_up_to_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=3, clock=clock)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock.now += 1
+    assert bucket.try_acquire()
+
+
+@pytest.mark.asyncio
+async def test_bucket_waits_for_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=1, clock=clock, sleep=clock.sleep)
+
+    for _ in range(5):
+        await bucket.acquire()
+
+    assert clock.now == pytest.approx(2)
+
+
+@pytest.mark.asyncio
+async def test_local_lock_is_held_by_one():
+    lock = LocalLock()
+    async with lock.held() as first:
+        async with lock.held() as second:
+            assert first and not second
+    async with lock.held() as again:
+        assert again
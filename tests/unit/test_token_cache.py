@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.oauth_client_lib.adapters.cache import InMemoryCache
+from src.oauth_client_lib.domain import events
+from src.oauth_client_lib.service_layer import messagebus
+from src.oauth_client_lib.service_layer.token_cache import TokenCache, token_cache
+
+
+def in_an_hour():
+    return datetime.utcnow() + timedelta(hours=1)
+
+
+def test_cached_user_info_is_returned_and_counted():
+    cache = TokenCache()
+
+    assert cache.get("token") is None
+    cache.set("token", "google", {"id": "1"}, in_an_hour())
+    entry = cache.get("token")
+
+    assert entry.provider == "google"
+    assert entry.user_info == {"id": "1"}
+    assert cache.stats() == {
+        "hits": 1, "misses": 1, "shared_hits": 0, "evictions": 0, "size": 1
+    }
+
+
+def test_entry_lives_no_longer_than_token_and_ttl(clock):
+    cache = TokenCache(ttl=300, clock=clock)
+    cache.set("short", "google", {}, datetime.utcnow() + timedelta(seconds=10))
+    cache.set("long", "google", {}, in_an_hour())
+    cache.set("expired", "google", {}, datetime.utcnow() - timedelta(seconds=1))
+
+    clock.now = 11
+    assert cache.get("short") is None
+    assert cache.get("long")
+    assert cache.get("expired") is None
+
+    clock.now = 301
+    assert cache.get("long") is None
+
+
+def test_least_recently_used_token_is_evicted():
+    cache = TokenCache(maxsize=2)
+    cache.set("first", "google", {}, in_an_hour())
+    cache.set("second", "google", {}, in_an_hour())
+    cache.get("first")
+    cache.set("third", "google", {}, in_an_hour())
+
+    assert cache.get("second") is None
+    assert cache.get("first")
+    assert cache.get("third")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lookup_started_before_invalidation_is_not_cached():
+    cache = TokenCache()
+    generation = cache.generation
+    cache.invalidate("token")
+    cache.set("token", "google", {}, in_an_hour(), generation=generation)
+
+    assert cache.get("token") is None
+
+
+@pytest.mark.asyncio
+async def test_revoked_token_is_forgotten(uow):
+    token_cache.set("revoked", "google", {}, in_an_hour())
+
+    await messagebus.handle(events.AccessTokenRevoked(access_token="revoked"), uow)
+
+    assert token_cache.get("revoked") is None
+
+
+@pytest.mark.asyncio
+async def test_user_info_is_shared_between_processes():
+    shared = InMemoryCache()
+    worker, other_worker = TokenCache(shared=shared), TokenCache(shared=shared)
+
+    await worker.store("token", "google", {"email": "a@b.c"}, in_an_hour())
+    entry = await other_worker.lookup("token")
+
+    assert entry.provider == "google"
+    assert entry.user_info == {"email": "a@b.c"}
+    assert other_worker.stats()["shared_hits"] == 1
+
+    await worker.forget("token")
+    other_worker.clear()
+    assert await other_worker.lookup("token") is None
+
+
+@pytest.mark.asyncio
+async def test_user_info_read_before_revocation_on_other_worker_isnt_shared():
+    shared = InMemoryCache()
+    worker, other_worker = TokenCache(shared=shared), TokenCache(shared=shared)
+
+    # worker looked the token up, other worker revoked it meanwhile
+    generation = worker.generation
+    await other_worker.forget("token")
+    await worker.store(
+        "token", "google", {"email": "a@b.c"}, in_an_hour(), generation=generation
+    )
+
+    assert await other_worker.lookup("token") is None